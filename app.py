@@ -1,1153 +1,4640 @@
-import requests, threading, os, json, time, urllib.parse, sys, asyncio
-from flask import Flask, request, Response, render_template_string
-
-try:
-    from telegram.ext import (
-        ApplicationBuilder, CommandHandler, MessageHandler,
-        ContextTypes, filters, CallbackQueryHandler
-    )
-    from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-    TELEGRAM_AVAILABLE = True
-except ImportError:
-    TELEGRAM_AVAILABLE = False
-    print("⚠️ Warning: python-telegram-bot not installed. Telegram bot features disabled.")
-
-# ========================
-# CONFIGURATION
-# ========================
-BOT_TOKEN = os.environ.get("BOT_TOKEN", "8419010897:AAFBf7NBkWcDk9JYvCCUsjyQpFy6RqW3Ozg")
-PORT = int(os.environ.get("PORT", 8080))
-
-# Get Render external URL or use a placeholder for local testing
-RENDER_EXTERNAL_URL = os.environ.get("RENDER_EXTERNAL_URL", "")
-PUBLIC_URL = RENDER_EXTERNAL_URL if RENDER_EXTERNAL_URL else f"http://localhost:{PORT}"
-RAW_URL = f"{PUBLIC_URL}/raw"
-
-# Enhanced data storage with metadata
-SAVED_DATA = ""
-DATA_METADATA = {
-    "last_updated": "",
-    "size": 0,
-    "format": "text",
-    "author": "",
-    "views": 0
-}
-
-# History tracking (last 10 updates)
-DATA_HISTORY = []
-
-# User sessions
-user_sessions = {}
-
-# Server thread control
-server_thread = None
-server_running = False
-
-# ========================
-# UTILITY FUNCTIONS
-# ========================
-def safe_encode_header(value):
-    """Safely encode header values to avoid encoding issues"""
-    if not value:
-        return ""
-    # Remove emojis and non-ASCII characters for header safety
-    import re
-    # Keep only ASCII characters for headers
-    safe_value = re.sub(r'[^\x00-\x7F]+', '', str(value))
-    return safe_value[:50]  # Limit header length
-
-def detect_format(text):
-    """Detect the format of the input text"""
-    text = text.strip()
-    if text.startswith('{') and text.endswith('}'):
-        try:
-            json.loads(text)
-            return "json"
-        except:
-            pass
-    elif text.startswith('<') and text.endswith('>'):
-        return "xml/html"
-    elif '```' in text:
-        return "code"
-    return "text"
-
-def is_public_url(url):
-    """Check if URL is publicly accessible (not localhost)"""
-    return url and 'localhost' not in url and '127.0.0.1' not in url
-
-# ========================
-# SERVER (Enhanced Endpoints)
-# ========================
-app = Flask(__name__)
-
-@app.route("/")
-def home():
-    """HTML interface for viewing raw data"""
-    # Increment view counter
-    DATA_METADATA["views"] = DATA_METADATA.get("views", 0) + 1
-    
-    html_template = """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>📁 RAW Data Viewer</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <meta charset="UTF-8">
-        <style>
-            :root {
-                --primary: #667eea;
-                --secondary: #764ba2;
-                --success: #10b981;
-                --info: #3b82f6;
-                --warning: #f59e0b;
-                --danger: #ef4444;
-            }
-            
-            * {
-                margin: 0;
-                padding: 0;
-                box-sizing: border-box;
-            }
-            
-            body {
-                font-family: 'Segoe UI', system-ui, sans-serif;
-                background: linear-gradient(135deg, var(--primary) 0%, var(--secondary) 100%);
-                min-height: 100vh;
-                color: #333;
-                padding: 20px;
-            }
-            
-            .container {
-                max-width: 1200px;
-                margin: 0 auto;
-            }
-            
-            header {
-                text-align: center;
-                margin-bottom: 30px;
-                padding: 20px;
-                background: rgba(255, 255, 255, 0.95);
-                border-radius: 20px;
-                box-shadow: 0 10px 30px rgba(0, 0, 0, 0.1);
-            }
-            
-            h1 {
-                color: var(--primary);
-                font-size: 2.5rem;
-                margin-bottom: 10px;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                gap: 15px;
-            }
-            
-            h1::before {
-                content: '📁';
-                font-size: 3rem;
-            }
-            
-            .subtitle {
-                color: #666;
-                font-size: 1.1rem;
-                margin-bottom: 20px;
-            }
-            
-            .dashboard {
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-                gap: 20px;
-                margin-bottom: 30px;
-            }
-            
-            .card {
-                background: rgba(255, 255, 255, 0.95);
-                padding: 25px;
-                border-radius: 15px;
-                box-shadow: 0 5px 20px rgba(0, 0, 0, 0.08);
-                transition: transform 0.3s, box-shadow 0.3s;
-            }
-            
-            .card:hover {
-                transform: translateY(-5px);
-                box-shadow: 0 15px 30px rgba(0, 0, 0, 0.15);
-            }
-            
-            .card h3 {
-                color: var(--primary);
-                margin-bottom: 15px;
-                display: flex;
-                align-items: center;
-                gap: 10px;
-            }
-            
-            .stat-grid {
-                display: grid;
-                grid-template-columns: repeat(2, 1fr);
-                gap: 15px;
-            }
-            
-            .stat-item {
-                text-align: center;
-                padding: 15px;
-                background: rgba(102, 126, 234, 0.1);
-                border-radius: 10px;
-            }
-            
-            .stat-value {
-                font-size: 1.8rem;
-                font-weight: bold;
-                color: var(--primary);
-                display: block;
-            }
-            
-            .stat-label {
-                font-size: 0.9rem;
-                color: #666;
-                margin-top: 5px;
-            }
-            
-            .data-container {
-                background: rgba(255, 255, 255, 0.95);
-                border-radius: 15px;
-                padding: 30px;
-                margin-bottom: 30px;
-                box-shadow: 0 5px 20px rgba(0, 0, 0, 0.08);
-            }
-            
-            pre {
-                background: #f8f9fa;
-                padding: 20px;
-                border-radius: 10px;
-                overflow-x: auto;
-                font-family: 'Monaco', 'Menlo', 'Ubuntu Mono', monospace;
-                font-size: 14px;
-                line-height: 1.5;
-                max-height: 500px;
-                overflow-y: auto;
-                border: 1px solid #e9ecef;
-                white-space: pre-wrap;
-                word-wrap: break-word;
-            }
-            
-            .empty-data {
-                text-align: center;
-                color: #666;
-                padding: 40px;
-                font-size: 1.2rem;
-            }
-            
-            .empty-data::before {
-                content: '📭';
-                font-size: 3rem;
-                display: block;
-                margin-bottom: 15px;
-            }
-            
-            .actions {
-                display: flex;
-                flex-wrap: wrap;
-                gap: 15px;
-                justify-content: center;
-                margin-top: 30px;
-            }
-            
-            .btn {
-                padding: 12px 24px;
-                border: none;
-                border-radius: 10px;
-                font-size: 1rem;
-                font-weight: 600;
-                cursor: pointer;
-                transition: all 0.3s;
-                text-decoration: none;
-                display: inline-flex;
-                align-items: center;
-                gap: 10px;
-                color: white;
-            }
-            
-            .btn-primary {
-                background: var(--primary);
-            }
-            
-            .btn-primary:hover {
-                background: #5a6fd8;
-                transform: translateY(-2px);
-            }
-            
-            .btn-success {
-                background: var(--success);
-            }
-            
-            .btn-success:hover {
-                background: #0da271;
-                transform: translateY(-2px);
-            }
-            
-            .btn-info {
-                background: var(--info);
-            }
-            
-            .btn-info:hover {
-                background: #2563eb;
-                transform: translateY(-2px);
-            }
-            
-            .btn-warning {
-                background: var(--warning);
-            }
-            
-            .btn-warning:hover {
-                background: #e59409;
-                transform: translateY(-2px);
-            }
-            
-            footer {
-                text-align: center;
-                margin-top: 40px;
-                color: rgba(255, 255, 255, 0.8);
-                font-size: 0.9rem;
-            }
-            
-            .copy-btn {
-                position: absolute;
-                top: 10px;
-                right: 10px;
-                background: var(--primary);
-                color: white;
-                border: none;
-                padding: 8px 15px;
-                border-radius: 5px;
-                cursor: pointer;
-                font-size: 0.9rem;
-            }
-            
-            .url-display {
-                background: #f8f9fa;
-                padding: 15px;
-                border-radius: 10px;
-                margin: 20px 0;
-                position: relative;
-                border: 1px solid #e9ecef;
-                font-family: monospace;
-                word-break: break-all;
-            }
-            
-            @media (max-width: 768px) {
-                h1 {
-                    font-size: 2rem;
-                }
-                
-                .dashboard {
-                    grid-template-columns: 1fr;
-                }
-                
-                .btn {
-                    width: 100%;
-                    justify-content: center;
-                }
-                
-                .actions {
-                    flex-direction: column;
-                }
-            }
-        </style>
-        <script>
-            function copyToClipboard(text) {
-                navigator.clipboard.writeText(text).then(() => {
-                    alert('URL copied to clipboard!');
-                });
-            }
-            
-            function downloadData() {
-                const data = `{{ data|safe }}`;
-                const blob = new Blob([data], { type: 'text/plain' });
-                const url = window.URL.createObjectURL(blob);
-                const a = document.createElement('a');
-                a.href = url;
-                a.download = 'raw_data_{{ timestamp }}.txt';
-                document.body.appendChild(a);
-                a.click();
-                document.body.removeChild(a);
-                window.URL.revokeObjectURL(url);
-            }
-        </script>
-    </head>
-    <body>
-        <div class="container">
-            <header>
-                <h1>RAW Data Viewer</h1>
-                <p class="subtitle">Store, share, and access your data with a permanent URL</p>
-            </header>
-            
-            <div class="dashboard">
-                <div class="card">
-                    <h3>📊 Statistics</h3>
-                    <div class="stat-grid">
-                        <div class="stat-item">
-                            <span class="stat-value">{{ metadata.size }}</span>
-                            <span class="stat-label">Bytes</span>
-                        </div>
-                        <div class="stat-item">
-                            <span class="stat-value">{{ metadata.views }}</span>
-                            <span class="stat-label">Views</span>
-                        </div>
-                        <div class="stat-item">
-                            <span class="stat-value">{{ metadata.format }}</span>
-                            <span class="stat-label">Format</span>
-                        </div>
-                        <div class="stat-item">
-                            <span class="stat-value">{{ history_count }}</span>
-                            <span class="stat-label">History</span>
-                        </div>
-                    </div>
-                </div>
-                
-                <div class="card">
-                    <h3>📅 Information</h3>
-                    <p><strong>Last Updated:</strong><br>{{ metadata.last_updated }}</p>
-                    {% if metadata.author %}
-                    <p style="margin-top: 10px;"><strong>Author:</strong><br>{{ metadata.author }}</p>
-                    {% endif %}
-                    <p style="margin-top: 10px;"><strong>Status:</strong><br>
-                        <span style="color: var(--success); font-weight: bold;">● Active</span>
-                    </p>
-                </div>
-                
-                <div class="card">
-                    <h3>🔗 Quick Links</h3>
-                    <div class="url-display">
-                        {{ raw_url }}
-                        <button class="copy-btn" onclick="copyToClipboard('{{ raw_url }}')">Copy</button>
-                    </div>
-                    <p style="margin-top: 15px; font-size: 0.9rem; color: #666;">
-                        Use this URL to access your data from anywhere
-                    </p>
-                </div>
-            </div>
-            
-            <div class="data-container">
-                <h3 style="margin-bottom: 20px; display: flex; align-items: center; gap: 10px;">
-                    📄 Stored Data
-                    <span style="font-size: 0.9rem; color: #666; font-weight: normal;">
-                        ({{ metadata.size }} bytes)
-                    </span>
-                </h3>
-                
-                {% if data %}
-                <pre>{{ data }}</pre>
-                {% else %}
-                <div class="empty-data">
-                    No data stored yet. {% if telegram_available %}Send data via Telegram bot{% else %}Use API{% endif %} to get started!
-                </div>
-                {% endif %}
-            </div>
-            
-            <div class="actions">
-                <button class="btn btn-primary" onclick="downloadData()">
-                    <span>📥</span> Download Data
-                </button>
-                <a href="{{ raw_url }}" class="btn btn-success" target="_blank">
-                    <span>🔗</span> Open RAW URL
-                </a>
-                <a href="{{ raw_url }}?format=json" class="btn btn-info" target="_blank">
-                    <span>📊</span> JSON Format
-                </a>
-                <a href="/stats" class="btn btn-warning">
-                    <span>📈</span> Detailed Stats
-                </a>
-                {% if telegram_available %}
-                <a href="https://t.me/{{ bot_username }}" class="btn btn-primary" target="_blank">
-                    <span>🤖</span> Telegram Bot
-                </a>
-                {% endif %}
-            </div>
-            
-            <footer>
-                <p>Powered by Flask | {{ timestamp }}</p>
-                <p style="margin-top: 5px; font-size: 0.8rem;">
-                    Data is stored permanently until cleared
-                </p>
-            </footer>
-        </div>
-    </body>
-    </html>
-    """
-    
-    current_time = time.strftime("%Y-%m-%d %H:%M:%S")
-    return render_template_string(
-        html_template,
-        data=SAVED_DATA,
-        metadata=DATA_METADATA,
-        raw_url=RAW_URL,
-        timestamp=current_time,
-        history_count=len(DATA_HISTORY),
-        telegram_available=TELEGRAM_AVAILABLE,
-        bot_username="raw_data_viewer_bot"  # Replace with your bot username
-    )
-
-@app.route("/raw", methods=["GET"])
-def read_raw():
-    """Enhanced raw endpoint with format options"""
-    format_type = request.args.get('format', 'text')
-    
-    if format_type == 'json':
-        return Response(
-            json.dumps({
-                "data": SAVED_DATA,
-                "metadata": DATA_METADATA,
-                "history_count": len(DATA_HISTORY),
-                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-            }, indent=2),
-            mimetype="application/json",
-            headers={"Access-Control-Allow-Origin": "*"}
-        )
-    elif format_type == 'html':
-        return f"<pre>{SAVED_DATA}</pre>"
-    else:
-        return Response(
-            SAVED_DATA,
-            mimetype="text/plain",
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Cache-Control": "no-cache, no-store, must-revalidate",
-                "Pragma": "no-cache",
-                "Expires": "0"
-            }
-        )
-
-@app.route("/raw", methods=["POST"])
-def write_raw():
-    """Enhanced write endpoint with metadata"""
-    global SAVED_DATA, DATA_METADATA, DATA_HISTORY
-    
-    try:
-        # Get data from request
-        data = request.data.decode("utf-8")
-        
-        # Save to history (keep last 10)
-        if SAVED_DATA:
-            DATA_HISTORY.append({
-                "data": SAVED_DATA[:100] + "..." if len(SAVED_DATA) > 100 else SAVED_DATA,
-                "timestamp": DATA_METADATA["last_updated"],
-                "size": DATA_METADATA["size"]
-            })
-            if len(DATA_HISTORY) > 10:
-                DATA_HISTORY.pop(0)
-        
-        # Update data
-        SAVED_DATA = data
-        
-        # Get author safely
-        author = safe_encode_header(request.headers.get('X-Author', 'Unknown'))
-        
-        # Update metadata
-        DATA_METADATA.update({
-            "last_updated": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "size": len(SAVED_DATA),
-            "format": detect_format(SAVED_DATA),
-            "author": author,
-            "views": DATA_METADATA.get("views", 0)
-        })
-        
-        return json.dumps({
-            "status": "success",
-            "message": "Data updated successfully",
-            "metadata": DATA_METADATA,
-            "url": RAW_URL
-        })
-    except Exception as e:
-        return json.dumps({
-            "status": "error",
-            "message": str(e)
-        }), 400
-
-@app.route("/stats")
-def stats():
-    """Statistics endpoint"""
-    stats_data = {
-        "current_size": len(SAVED_DATA),
-        "history_entries": len(DATA_HISTORY),
-        "metadata": DATA_METADATA,
-        "access_url": RAW_URL,
-        "web_interface": PUBLIC_URL,
-        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-        "server_status": "running",
-        "telegram_bot": "available" if TELEGRAM_AVAILABLE else "not_available"
-    }
-    return json.dumps(stats_data, indent=2)
-
-@app.route("/health")
-def health():
-    """Health check endpoint"""
-    return json.dumps({
-        "status": "healthy",
-        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-        "data_exists": bool(SAVED_DATA),
-        "public_url": is_public_url(PUBLIC_URL),
-        "telegram_bot": "available" if TELEGRAM_AVAILABLE else "not_available"
-    })
-
-@app.route("/update", methods=["POST"])
-def update_data():
-    """Simple API endpoint to update data"""
-    global SAVED_DATA, DATA_METADATA
-    
-    try:
-        data = request.get_data(as_text=True)
-        if not data:
-            return json.dumps({"status": "error", "message": "No data provided"}), 400
-        
-        SAVED_DATA = data
-        DATA_METADATA.update({
-            "last_updated": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "size": len(SAVED_DATA),
-            "format": detect_format(SAVED_DATA),
-            "author": request.headers.get('X-Author', 'API'),
-            "views": DATA_METADATA.get("views", 0)
-        })
-        
-        return json.dumps({
-            "status": "success",
-            "message": "Data updated via API",
-            "url": RAW_URL,
-            "size": len(SAVED_DATA)
-        })
-    except Exception as e:
-        return json.dumps({"status": "error", "message": str(e)}), 500
-
-def run_server():
-    """Run Flask server in a separate thread"""
-    global server_running
-    print(f"🌐 Starting Flask server on port {PORT}...")
-    print(f"📡 Server URL: {PUBLIC_URL}")
-    print(f"🔗 RAW Endpoint: {RAW_URL}")
-    print(f"📊 Statistics: {PUBLIC_URL}/stats")
-    print(f"🏥 Health Check: {PUBLIC_URL}/health")
-    
-    server_running = True
-    app.run(host="0.0.0.0", port=PORT, debug=False, use_reloader=False)
-
-# ========================
-# TELEGRAM BOT FUNCTIONS
-# ========================
-if TELEGRAM_AVAILABLE:
-    async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Start command with inline keyboard"""
-        user_id = update.effective_user.id
-        username = update.effective_user.username or update.effective_user.first_name
-        user_sessions[user_id] = {
-            "waiting_for_data": False,
-            "username": username
-        }
-        
-        # Create keyboard dynamically based on whether URL is public
-        keyboard = [
-            [
-                InlineKeyboardButton("📝 Update Data", callback_data="update_data"),
-                InlineKeyboardButton("📊 View Data", callback_data="view_data")
-            ],
-            [
-                InlineKeyboardButton("🔗 Get Raw Link", callback_data="get_link"),
-                InlineKeyboardButton("📈 Statistics", callback_data="stats")
-            ],
-            [
-                InlineKeyboardButton("❓ Help", callback_data="help"),
-                InlineKeyboardButton("🔄 History", callback_data="history")
-            ]
-        ]
-        
-        # Only add web interface button if URL is public
-        if is_public_url(PUBLIC_URL):
-            keyboard.append([
-                InlineKeyboardButton("🌐 Web Interface", url=PUBLIC_URL)
-            ])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        welcome_text = (
-            f"🤖 **Welcome to RAW Data Bot, {username}!**\n\n"
-            "✨ **Features:**\n"
-            "• 📝 Store any text/data permanently\n"
-            "• 🔗 Get a public RAW link\n"
-            "• 📊 View data statistics\n"
-            "• 📜 Data history tracking\n"
-        )
-        
-        # Add web interface info if available
-        if is_public_url(PUBLIC_URL):
-            welcome_text += "• 🌐 Beautiful web interface\n\n"
-        else:
-            welcome_text += "\n"
-        
-        welcome_text += "💡 *Select an option below:*"
-        
-        await update.message.reply_text(
-            welcome_text,
-            reply_markup=reply_markup,
-            parse_mode="Markdown"
-        )
-
-    async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle inline keyboard button clicks"""
-        query = update.callback_query
-        await query.answer()
-        
-        user_id = query.from_user.id
-        
-        if query.data == "update_data":
-            user_sessions[user_id]["waiting_for_data"] = True
-            await query.edit_message_text(
-                "📝 **Send me the data/text you want to store:**\n\n"
-                "You can send:\n"
-                "• 📄 Plain text\n"
-                "• 📊 JSON data\n"
-                "• ⚙️ Configuration files\n"
-                "• 💻 Code snippets\n"
-                "• 🔗 URLs or lists\n\n"
-                "💡 *Type /cancel to abort.*",
-                parse_mode="Markdown"
-            )
-        
-        elif query.data == "view_data":
-            if SAVED_DATA:
-                # Create a more informative preview
-                lines = SAVED_DATA.split('\n')
-                preview_lines = lines[:5]  # Show first 5 lines
-                preview = '\n'.join(preview_lines)
-                
-                if len(lines) > 5:
-                    preview += f"\n[... and {len(lines) - 5} more lines]"
-                
-                # Format info
-                format_icon = {
-                    "json": "📊",
-                    "code": "💻",
-                    "xml/html": "🔖",
-                    "text": "📄"
-                }.get(DATA_METADATA.get("format", "text"), "📄")
-                
-                message_text = (
-                    f"{format_icon} **Stored Data Preview:**\n\n"
-                    f"```\n{preview}\n```\n\n"
-                    f"📏 **Size:** {len(SAVED_DATA):,} bytes\n"
-                    f"⏰ **Last Updated:** {DATA_METADATA.get('last_updated', 'Never')}\n"
-                    f"👤 **Author:** {DATA_METADATA.get('author', 'Unknown')}\n"
-                    f"👁️ **Views:** {DATA_METADATA.get('views', 0)}\n\n"
-                    f"🔗 **RAW URL:** `{RAW_URL}`"
-                )
-                
-                # Add web interface link only if public
-                if is_public_url(PUBLIC_URL):
-                    message_text += f"\n🌐 **Web:** `{PUBLIC_URL}`"
-                
-                await query.edit_message_text(
-                    message_text,
-                    parse_mode="Markdown",
-                    disable_web_page_preview=True
-                )
-            else:
-                await query.edit_message_text(
-                    "📭 **No data stored yet!**\n\n"
-                    "Use the *'Update Data'* button to store your first data.",
-                    parse_mode="Markdown"
-                )
-        
-        elif query.data == "get_link":
-            message_text = f"🔗 **Permanent RAW Links:**\n\n📄 **Text Format:**\n`{RAW_URL}`\n\n📊 **JSON Format:**\n`{RAW_URL}?format=json`\n\n"
-            
-            if is_public_url(PUBLIC_URL):
-                message_text += f"🌐 **Web Interface:**\n`{PUBLIC_URL}`\n\n📊 **Statistics:**\n`{PUBLIC_URL}/stats`\n\n"
-            
-            message_text += "💡 *Click or copy the links to access your data!*"
-            
-            await query.edit_message_text(
-                message_text,
-                parse_mode="Markdown"
-            )
-        
-        elif query.data == "stats":
-            stats_text = (
-                f"📊 **Statistics:**\n\n"
-                f"• 📏 **Data Size:** {DATA_METADATA.get('size', 0):,} bytes\n"
-                f"• 📝 **Format:** {DATA_METADATA.get('format', 'text')}\n"
-                f"• ⏰ **Last Updated:** {DATA_METADATA.get('last_updated', 'Never')}\n"
-                f"• 📜 **History Entries:** {len(DATA_HISTORY)}\n"
-                f"• 👤 **Author:** {DATA_METADATA.get('author', 'Not specified')}\n"
-                f"• 👁️ **Total Views:** {DATA_METADATA.get('views', 0)}\n\n"
-                f"🔗 **RAW URL:** `{RAW_URL}`"
-            )
-            
-            await query.edit_message_text(stats_text, parse_mode="Markdown", disable_web_page_preview=True)
-        
-        elif query.data == "history":
-            if DATA_HISTORY:
-                history_text = "📜 **Last 10 Updates:**\n\n"
-                for i, entry in enumerate(reversed(DATA_HISTORY), 1):
-                    history_text += f"**{i}. {entry['timestamp']}**\n"
-                    history_text += f"   📏 Size: {entry['size']:,} bytes\n"
-                    history_text += f"   📄 Preview: {entry['data'][:50]}...\n\n"
-            else:
-                history_text = "📭 No history available yet. Update some data first!"
-            
-            await query.edit_message_text(history_text, parse_mode="Markdown")
-        
-        elif query.data == "help":
-            help_text = (
-                "❓ **Help Guide**\n\n"
-                "**Commands:**\n"
-                "/start - Show main menu\n"
-                "/cancel - Cancel current operation\n"
-                "/link - Get all RAW links\n"
-                "/stats - View statistics\n"
-                "/clear - Clear all data\n"
-                "/health - Check server status\n\n"
-                "**Features:**\n"
-                "• 📝 Store any text/data permanently\n"
-                "• 🔗 Public RAW URL for sharing\n"
-                "• 📊 Multiple format outputs (JSON, Text, HTML)\n"
-                "• 📜 Data history tracking\n"
-                "• 📈 Real-time statistics\n"
-            )
-            
-            if is_public_url(PUBLIC_URL):
-                help_text += "• 🌐 Beautiful web interface\n\n"
-            else:
-                help_text += "\n"
-            
-            help_text += (
-                "**Tips:**\n"
-                "• Use inline keyboard for easy navigation\n"
-                "• Links work in any browser\n"
-                "• No size limits (within reason)\n"
-                "• Data persists until cleared\n\n"
-                "**Need Help?**\nContact the bot admin"
-            )
-            
-            await query.edit_message_text(help_text, parse_mode="Markdown")
-        
-        elif query.data == "menu":
-            # Return to main menu
-            keyboard = [
-                [
-                    InlineKeyboardButton("📝 Update Data", callback_data="update_data"),
-                    InlineKeyboardButton("📊 View Data", callback_data="view_data")
-                ],
-                [
-                    InlineKeyboardButton("🔗 Get Raw Link", callback_data="get_link"),
-                    InlineKeyboardButton("📈 Statistics", callback_data="stats")
-                ],
-                [
-                    InlineKeyboardButton("❓ Help", callback_data="help"),
-                    InlineKeyboardButton("🔄 History", callback_data="history")
-                ]
-            ]
-            
-            # Only add web interface button if URL is public
-            if is_public_url(PUBLIC_URL):
-                keyboard.append([
-                    InlineKeyboardButton("🌐 Web Interface", url=PUBLIC_URL)
-                ])
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                "📋 **Main Menu**\n\n"
-                "Select an option:",
-                reply_markup=reply_markup,
-                parse_mode="Markdown"
-            )
-
-    async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle user messages"""
-        user_id = update.effective_user.id
-        
-        if user_id in user_sessions and user_sessions[user_id].get("waiting_for_data"):
-            # User is sending data to store
-            text = update.message.text
-            
-            if text == "/cancel":
-                user_sessions[user_id]["waiting_for_data"] = False
-                await update.message.reply_text("❌ Operation cancelled.")
-                return
-            
-            # Send data to server with safe headers
-            headers = {
-                "X-Author": safe_encode_header(update.effective_user.first_name),
-                "Content-Type": "text/plain; charset=utf-8"
-            }
-            
-            try:
-                # Use localhost for internal communication
-                internal_url = f"http://localhost:{PORT}/raw"
-                response = requests.post(internal_url, data=text.encode("utf-8"), headers=headers)
-                
-                if response.status_code == 200:
-                    # Success
-                    user_sessions[user_id]["waiting_for_data"] = False
-                    
-                    response_data = response.json()
-                    
-                    # Create keyboard dynamically
-                    keyboard = [
-                        [
-                            InlineKeyboardButton("🔗 Get Links", callback_data="get_link"),
-                            InlineKeyboardButton("📊 View Stats", callback_data="stats")
-                        ],
-                        [
-                            InlineKeyboardButton("📄 View Data", callback_data="view_data"),
-                            InlineKeyboardButton("🔄 Update Again", callback_data="update_data")
-                        ]
-                    ]
-                    
-                    # Only add web interface button if URL is public
-                    if is_public_url(PUBLIC_URL):
-                        keyboard.append([
-                            InlineKeyboardButton("🌐 Web Interface", url=PUBLIC_URL)
-                        ])
-                    
-                    reply_markup = InlineKeyboardMarkup(keyboard)
-                    
-                    success_message = (
-                        "✅ **Data stored successfully!** 🎉\n\n"
-                        f"📏 **Size:** {len(text):,} bytes\n"
-                        f"📝 **Format:** {detect_format(text)}\n"
-                        f"⏰ **Timestamp:** {time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                        f"🔗 **URL:** `{RAW_URL}`\n\n"
-                    )
-                    
-                    if not is_public_url(PUBLIC_URL):
-                        success_message += "💡 *Note: Web interface requires public URL (deploy to Render/Heroku)*\n\n"
-                    
-                    success_message += "💡 *Choose your next action:*"
-                    
-                    await update.message.reply_text(
-                        success_message,
-                        reply_markup=reply_markup,
-                        parse_mode="Markdown"
-                    )
-                else:
-                    await update.message.reply_text(
-                        f"❌ **Error storing data!**\n"
-                        f"Status Code: {response.status_code}\n"
-                        f"Error: {response.text}",
-                        parse_mode="Markdown"
-                    )
-            except Exception as e:
-                await update.message.reply_text(
-                    f"❌ **Connection Error!**\n"
-                    f"Error: {str(e)}\n\n"
-                    f"Make sure the server is running on port {PORT}.",
-                    parse_mode="Markdown"
-                )
-        else:
-            # Regular message - show main menu
-            keyboard = [[InlineKeyboardButton("📋 Main Menu", callback_data="menu")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await update.message.reply_text(
-                "🤖 **RAW Data Bot**\n\n"
-                "Type /start to begin or use the button below:",
-                reply_markup=reply_markup,
-                parse_mode="Markdown"
-            )
-
-    async def link_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Direct link command"""
-        message_text = f"🔗 **Available Links:**\n\n📄 **RAW Text:** `{RAW_URL}`\n📊 **JSON View:** `{RAW_URL}?format=json`\n"
-        
-        if is_public_url(PUBLIC_URL):
-            message_text += f"🌐 **Web Interface:** `{PUBLIC_URL}`\n📊 **Statistics:** `{PUBLIC_URL}/stats`\n\n"
-        else:
-            message_text += "\n"
-        
-        message_text += "💡 *Click or copy to access your data!*"
-        
-        await update.message.reply_text(
-            message_text,
-            parse_mode="Markdown"
-        )
-
-    async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Direct stats command"""
-        stats_text = (
-            f"📊 **Current Statistics:**\n\n"
-            f"• 📏 **Data Size:** {len(SAVED_DATA):,} bytes\n"
-            f"• 📝 **Format:** {DATA_METADATA.get('format', 'text')}\n"
-            f"• ⏰ **Last Updated:** {DATA_METADATA.get('last_updated', 'Never')}\n"
-            f"• 📦 **Storage:** {'📭 Empty' if not SAVED_DATA else '✅ Contains data'}\n"
-            f"• 📜 **History:** {len(DATA_HISTORY)} past entries\n"
-            f"• 👁️ **Views:** {DATA_METADATA.get('views', 0)}\n\n"
-            f"🔗 **RAW URL:** `{RAW_URL}`"
-        )
-        
-        if is_public_url(PUBLIC_URL):
-            stats_text += f"\n🌐 **Web:** `{PUBLIC_URL}`"
-        
-        await update.message.reply_text(stats_text, parse_mode="Markdown", disable_web_page_preview=True)
-
-    async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Clear all data with confirmation"""
-        user_id = update.effective_user.id
-        
-        if user_id not in user_sessions:
-            user_sessions[user_id] = {"confirm_clear": True}
-        else:
-            user_sessions[user_id]["confirm_clear"] = True
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("✅ Yes, Clear All", callback_data="confirm_clear"),
-                InlineKeyboardButton("❌ No, Cancel", callback_data="cancel_clear")
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            "⚠️ **Warning: This will clear ALL stored data!**\n\n"
-            f"📏 Current size: {len(SAVED_DATA):,} bytes\n"
-            f"📜 History entries: {len(DATA_HISTORY)}\n\n"
-            "Are you sure you want to continue?",
-            reply_markup=reply_markup,
-            parse_mode="Markdown"
-        )
-
-    async def health_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Health check command"""
-        health_status = {
-            "bot": "✅ Running",
-            "server": "✅ Running" if server_running else "⚠️ Unknown",
-            "data": f"✅ {len(SAVED_DATA):,} bytes" if SAVED_DATA else "📭 Empty",
-            "history": f"📜 {len(DATA_HISTORY)} entries",
-            "uptime": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "public_url": "✅ Available" if is_public_url(PUBLIC_URL) else "⚠️ Local only"
-        }
-        
-        health_text = "🏥 **Health Check:**\n\n"
-        for key, value in health_status.items():
-            health_text += f"• **{key.title()}:** {value}\n"
-        
-        health_text += f"\n🔗 **Server:** {PUBLIC_URL}"
-        
-        await update.message.reply_text(health_text, parse_mode="Markdown")
-
-    async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Cancel current operation"""
-        user_id = update.effective_user.id
-        if user_id in user_sessions:
-            user_sessions[user_id]["waiting_for_data"] = False
-            user_sessions[user_id].pop("confirm_clear", None)
-        await update.message.reply_text("❌ Current operation cancelled.")
-
-    async def clear_confirmation_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle clear confirmation"""
-        query = update.callback_query
-        await query.answer()
-        
-        if query.data == "confirm_clear":
-            global SAVED_DATA, DATA_METADATA, DATA_HISTORY
-            
-            # Save to history before clearing
-            if SAVED_DATA:
-                DATA_HISTORY.append({
-                    "data": "[CLEARED BY USER]",
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-                    "size": 0,
-                    "action": "cleared"
-                })
-            
-            old_size = len(SAVED_DATA)
-            SAVED_DATA = ""
-            DATA_METADATA = {
-                "last_updated": time.strftime("%Y-%m-%d %H:%M:%S"),
-                "size": 0,
-                "format": "empty",
-                "author": "",
-                "views": 0
-            }
-            
-            await query.edit_message_text(
-                f"🗑️ **All data cleared successfully!**\n\n"
-                f"📏 Cleared: {old_size:,} bytes\n"
-                f"⏰ Time: {time.strftime('%H:%M:%S')}\n\n"
-                f"💡 *Use /start to store new data.*",
-                parse_mode="Markdown"
-            )
-        
-        elif query.data == "cancel_clear":
-            await query.edit_message_text("❌ Clear operation cancelled.")
-
-# ========================
-# MAIN ENTRY POINT
-# ========================
-def main():
-    """Main entry point - runs both server and bot"""
-    print("🚀 Starting RAW Data Service...")
-    print("=" * 50)
-    
-    # Check if we should run Telegram bot
-    run_telegram_bot = TELEGRAM_AVAILABLE and BOT_TOKEN
-    
-    # Start Flask server in background thread
-    global server_thread
-    server_thread = threading.Thread(target=run_server)
-    server_thread.daemon = True
-    server_thread.start()
-    
-    # Give server time to start
-    print("⏳ Waiting for server to start...")
-    time.sleep(3)
-    
-    if run_telegram_bot:
-        print("🤖 Starting Telegram Bot...")
-        try:
-            # Create and run Telegram bot in main thread
-            app_ = ApplicationBuilder().token(BOT_TOKEN).build()
-            
-            # Command handlers
-            app_.add_handler(CommandHandler("start", start))
-            app_.add_handler(CommandHandler("link", link_command))
-            app_.add_handler(CommandHandler("stats", stats_command))
-            app_.add_handler(CommandHandler("clear", clear_command))
-            app_.add_handler(CommandHandler("health", health_command))
-            app_.add_handler(CommandHandler("cancel", cancel_command))
-            
-            # Callback query handlers
-            app_.add_handler(CallbackQueryHandler(button_handler, pattern="^(update_data|view_data|get_link|stats|help|history|menu)$"))
-            app_.add_handler(CallbackQueryHandler(clear_confirmation_handler, pattern="^(confirm_clear|cancel_clear)$"))
-            
-            # Message handler
-            app_.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-            
-            print("✅ Telegram bot configured successfully!")
-            print("📱 Bot is now running. Send /start to your bot to begin.")
-            
-            # Run bot in main thread (this is blocking)
-            app_.run_polling()
-            
-        except Exception as e:
-            print(f"❌ Failed to start Telegram bot: {e}")
-            print("ℹ️  Web interface and API are still available")
-            # Keep Flask server running
-            try:
-                while True:
-                    time.sleep(1)
-            except KeyboardInterrupt:
-                print("\n👋 Shutting down...")
-    else:
-        if not TELEGRAM_AVAILABLE:
-            print("ℹ️  Telegram bot not available (python-telegram-bot not installed)")
-        elif not BOT_TOKEN or BOT_TOKEN == "8419010897:AAFBf7NBkWcDk9JYvCCUsjyQpFy6RqW3Ozg":
-            print("⚠️  Telegram bot token not configured. Using web interface only.")
-        print("🌐 Web interface is running at:", PUBLIC_URL)
-        print("📊 Statistics:", f"{PUBLIC_URL}/stats")
-        
-        # Keep Flask server running
-        try:
-            while True:
-                time.sleep(1)
-        except KeyboardInterrupt:
-            print("\n👋 Shutting down...")
-
-if __name__ == "__main__":
+from __future__ import annotations  # Handler annotations name telegram types, imported lazily
+import time
+_STARTED = time.perf_counter()  # Startup phases are timed from here
+import threading, os, json, urllib.parse, sys, re, hashlib, gzip, sqlite3
+import multiprocessing, signal, socket, tempfile, codecs, csv, io, configparser, zlib, bisect
+import selectors, heapq, resource, hmac, gc, functools, shutil, importlib, importlib.util, http.client
+import array, itertools, operator, base64, math
+from collections import Counter, OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from types import MappingProxyType
+from flask import Flask, Request, request, Response
+from werkzeug.http import http_date, is_resource_modified, quote_etag, unquote_etag
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+# python-telegram-bot takes longer to import than the rest of the app put
+# together, so it is only located here; import_telegram() loads it when a bot
+# actually runs. Other heavy optional modules (brotli, zstandard, yaml) are
+# loaded by optional_module() on first use.
+TELEGRAM_AVAILABLE = importlib.util.find_spec("telegram") is not None
+if not TELEGRAM_AVAILABLE:
+    print("⚠️ Warning: python-telegram-bot not installed. Telegram bot features disabled.")
+
+# Optional faster encoder for the cached JSON responses
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ========================
+# CONFIGURATION
+# ========================
+BOT_TOKEN = os.environ.get("BOT_TOKEN", "8419010897:AAFBf7NBkWcDk9JYvCCUsjyQpFy6RqW3Ozg")
+PORT = int(os.environ.get("PORT", 8080))
+
+# Get Render external URL or use a placeholder for local testing
+RENDER_EXTERNAL_URL = os.environ.get("RENDER_EXTERNAL_URL", "")
+PUBLIC_URL = RENDER_EXTERNAL_URL if RENDER_EXTERNAL_URL else f"http://localhost:{PORT}"
+RAW_URL = f"{PUBLIC_URL}/raw"
+
+# Telegram updates: "polling" (default) long-polls getUpdates; "webhook" registers
+# {PUBLIC_URL}/telegram/<secret> and receives updates on the HTTP server.
+# TELEGRAM_API_URL points the bot at another Bot API server (e.g. a local stand-in).
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET") or hashlib.sha256(f"webhook:{BOT_TOKEN}".encode()).hexdigest()
+WEBHOOK_MAX_SIZE = 1024 * 1024
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "")
+
+# Durable storage: "sqlite" (default) or "memory" to keep nothing across restarts
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "sqlite")
+STORAGE_PATH = os.environ.get("STORAGE_PATH", "raw_data.db")
+
+# Encryption at rest (needs the cryptography package): a comma-separated list
+# of <id>:<base64 AES key> entries. The first key seals everything written;
+# all of them can open what is stored. To rotate, put a new key first and
+# restart: a background job re-seals, REENCRYPT_BATCH rows at a time, what
+# was stored under older keys (or before encryption was enabled), after
+# which the old keys can be dropped.
+ENCRYPTION_KEYS = os.environ.get("ENCRYPTION_KEYS", "")
+REENCRYPT_BATCH = 64
+
+# Production mode: pre-fork this many HTTP worker processes on one listening
+# socket (1 = a single process on Flask's built-in server). Needs sqlite storage.
+WORKERS = int(os.environ.get("WORKERS", 1))
+
+# Every version of a document is kept (deduplicated) up to this many per document
+HISTORY_VERSIONS = int(os.environ.get("HISTORY_VERSIONS", 1000))
+
+# View counts are written to storage at most this often (seconds)
+VIEWS_CHECKPOINT_INTERVAL = float(os.environ.get("VIEWS_CHECKPOINT_INTERVAL", 30))
+
+# Documents are addressed as /raw/<key>; plain /raw is the default document.
+# Keys must fit in Telegram callback data ("doc:" + key <= 64 bytes).
+DEFAULT_KEY = "default"
+KEY_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,60}$")
+# Names taken by fixed routes under /raw/ (GET /raw/watch is the change feed)
+RESERVED_KEYS = frozenset({"watch"})
+
+# Formats are sniffed from at most this many characters at each end of the text
+SNIFF_CHARS = 4096
+
+# The dashboard viewer embeds the first DASHBOARD_PREVIEW_LINES lines and
+# fetches further pages of that many as they scroll into view. Previews are
+# capped at PREVIEW_MAX_BYTES so one huge line costs no more than many short ones
+DASHBOARD_PREVIEW_LINES = int(os.environ.get("DASHBOARD_PREVIEW_LINES", 200))
+PREVIEW_MAX_BYTES = 64 * 1024
+
+# GET /raw?path=a.b[3].c (or a JSON Pointer) serves one subtree of a JSON
+# document, or up to MAX_JSON_PATHS of them when ?path= is repeated. The
+# payload is parsed once per version and serialized subtrees are cached up
+# to JSON_PATH_CACHE_SIZE bytes per document.
+MAX_JSON_PATHS = 64
+JSON_PATH_CACHE_SIZE = int(os.environ.get("JSON_PATH_CACHE_SIZE", 16 * 1024 * 1024))
+
+# Streaming responses write at most this many bytes per chunk
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", 64 * 1024))
+MAX_RANGES = 16
+
+# Uploads are read STREAM_CHUNK_SIZE bytes at a time. Bodies larger than
+# MAX_UPLOAD_SIZE get a 413; up to UPLOAD_SPOOL_SIZE they are buffered in
+# memory, beyond that in a temporary file until the upload is complete.
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", 256 * 1024 * 1024))
+UPLOAD_SPOOL_SIZE = int(os.environ.get("UPLOAD_SPOOL_SIZE", 1024 * 1024))
+
+# Change notifications (GET /raw/watch): SSE streams get a comment line every
+# WATCH_KEEPALIVE seconds; long polls (?wait=) give up with a 304 after
+# WATCH_TIMEOUT seconds by default. With pre-forked workers, writes made in
+# other processes are picked up every WATCH_POLL_INTERVAL seconds.
+WATCH_KEEPALIVE = float(os.environ.get("WATCH_KEEPALIVE", 15))
+WATCH_TIMEOUT = float(os.environ.get("WATCH_TIMEOUT", 30))
+WATCH_MAX_TIMEOUT = 300
+WATCH_POLL_INTERVAL = float(os.environ.get("WATCH_POLL_INTERVAL", 0.25))
+WATCH_MAX_BACKLOG = 1024 * 1024  # Unsent bytes before a stalled subscriber is dropped
+
+# Latency histogram buckets (seconds) for /metrics
+METRICS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Pre-forked processes publish their metrics for /metrics this often (seconds)
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+# Queued request and cache observations are folded into their series this often (seconds)
+METRICS_FOLD_INTERVAL = 1
+
+# Payloads smaller than this are not worth precompressing
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+_COMPRESSOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compress")
+
+# Bot sessions expire after SESSION_TTL idle seconds; at most SESSION_MAX are
+# kept in memory (least recently used go first). With SESSION_PERSIST and
+# sqlite storage they are also written through to the database.
+SESSION_TTL = float(os.environ.get("SESSION_TTL", 7 * 24 * 3600))
+SESSION_MAX = int(os.environ.get("SESSION_MAX", 50_000))
+SESSION_PERSIST = os.environ.get("SESSION_PERSIST", "1") == "1"
+
+# Server thread control
+server_thread = None
+server_running = False
+
+# ========================
+# STARTUP
+# ========================
+class StartupTimer:
+    """Wall-clock duration of each startup phase, for the ready line"""
+    
+    def __init__(self, started):
+        self.started = self.mark = started
+        self.phases = []
+    
+    def phase(self, name):
+        """Close the phase that has been running since the previous mark"""
+        now = time.perf_counter()
+        self.phases.append((name, now - self.mark))
+        self.mark = now
+    
+    def report(self):
+        phases = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases)
+        return f"{(self.mark - self.started) * 1000:.0f} ms ({phases})"
+
+STARTUP = StartupTimer(_STARTED)
+STARTUP.phase("imports")
+
+@functools.cache
+def optional_module(name):
+    """Import an optional dependency on first use; None when it is not installed"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+def import_telegram():
+    """Load python-telegram-bot (and asyncio, which only the bot uses) into this module's globals"""
+    global asyncio, ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters
+    global CallbackQueryHandler, InlineKeyboardButton, InlineKeyboardMarkup, Update
+    import asyncio
+    from telegram.ext import (
+        ApplicationBuilder, CommandHandler, MessageHandler,
+        ContextTypes, filters, CallbackQueryHandler
+    )
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+
+def wait_until_ready(timeout=10):
+    """Serve one request through the listening socket, then report startup timings
+    
+    Returns once a real request has made it through the server, the app and
+    back; the bot is only started after that.
+    """
+    conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=timeout)
+    try:
+        conn.request("GET", "/health", headers={"User-Agent": "rawdata-startup"})
+        conn.getresponse().read()
+    except OSError as e:
+        print(f"⚠️ Startup probe failed: {e}")
+        return False
+    finally:
+        conn.close()
+    STARTUP.phase("first request")
+    print(f"✅ Ready in {STARTUP.report()}")
+    return True
+
+# ========================
+# UTILITY FUNCTIONS
+# ========================
+def safe_encode_header(value):
+    """Safely encode header values to avoid encoding issues"""
+    if not value:
+        return ""
+    # Remove emojis and non-ASCII characters for header safety
+    # Keep only ASCII characters for headers
+    safe_value = re.sub(r'[^\x00-\x7F]+', '', str(value))
+    return safe_value[:50]  # Limit header length
+
+_CODE_LINE = re.compile(
+    r"^(?:#!|#include\b|import \w|from [\w.]+ import\b|def \w|class \w|function\b|"
+    r"package \w|using \w|const \w|let \w|var \w|public \w|fn \w|func \w)"
+)
+_INI_LINE = re.compile(r"^(?:\[[A-Za-z_][\w .-]*\]|[\w.\"'-]+\s*=)")
+_YAML_LINE = re.compile(r"^(?:---|- |[\w.-]+:(?:\s|$))")
+
+def detect_format(text):
+    """Guess the format of the input text from its first and last SNIFF_CHARS
+    
+    The label is a cheap guess; validate_format() confirms it against the
+    whole text when someone needs it.
+    """
+    # Strip the whole text only when SNIFF_CHARS of padding hide the content
+    head = text[:SNIFF_CHARS].lstrip() or text.lstrip()[:SNIFF_CHARS]
+    tail = text[-SNIFF_CHARS:].rstrip() or text.rstrip()[-SNIFF_CHARS:]
+    if not head:
+        return "text"
+    
+    lines = head.splitlines()
+    if len(text) > SNIFF_CHARS and len(lines) > 1:
+        lines.pop()  # Probably cut off mid-line
+    lines = [line for line in lines[:20] if line.strip()]
+    significant = [line for line in lines if not line.startswith(("#", ";"))]
+    
+    if head[0] in "{[" and tail[-1] == "}]"["{[".index(head[0])] and not _INI_LINE.match(lines[0]):
+        return "json"
+    if head[0] == "<" and tail[-1] == ">":
+        return "xml/html"
+    if "```" in head or "```" in tail or any(_CODE_LINE.match(line) for line in lines):
+        return "code"
+    if significant and all(_INI_LINE.match(line) for line in significant):
+        return "ini/toml"
+    if len(significant) > 1 and _YAML_LINE.match(significant[0]) and all(
+        _YAML_LINE.match(line) or line[0] in " \t" for line in significant
+    ):
+        return "yaml"
+    if len(lines) > 1:
+        delimiter = max(",\t;", key=lines[0].count)
+        columns = lines[0].count(delimiter)
+        if columns and all(line.count(delimiter) == columns for line in lines):
+            return "csv"
+    return "text"
+
+def validate_format(text, label):
+    """Check a sniffed label against the whole text; labels that fail become text"""
+    try:
+        if label == "json":
+            json.loads(text)
+        elif label == "ini/toml":
+            try:
+                tomllib = optional_module("tomllib")  # Python < 3.11 has no TOML parser
+                if tomllib is None:
+                    raise ValueError("no TOML parser")
+                tomllib.loads(text)
+            except ValueError:
+                configparser.ConfigParser(strict=False).read_string(text)
+        elif label == "yaml" and optional_module("yaml") is not None:
+            optional_module("yaml").safe_load(text)
+        elif label == "csv":
+            first = text.lstrip().split("\n", 1)[0]
+            rows = csv.reader(io.StringIO(text), delimiter=max(",\t;", key=first.count))
+            widths = {len(row) for row in rows if row}
+            if len(widths) != 1:
+                return "text"
+    except Exception:
+        return "text"
+    return label
+
+def is_public_url(url):
+    """Check if URL is publicly accessible (not localhost)"""
+    return url and 'localhost' not in url and '127.0.0.1' not in url
+
+def is_valid_key(key):
+    """Check that a document key is safe to use in URLs and callback data"""
+    return bool(key) and KEY_PATTERN.match(key) is not None and key not in RESERVED_KEYS
+
+# ========================
+# METRICS
+# ========================
+# name -> (type, help) for every series /metrics can report
+METRIC_INFO = {
+    "rawdata_http_requests_total": ("counter", "HTTP requests by route, method and status code"),
+    "rawdata_http_request_duration_seconds": ("histogram", "Time from request start until the handler returned"),
+    "rawdata_http_request_bytes_total": ("counter", "Request body bytes received"),
+    "rawdata_http_response_bytes_total": ("counter", "Response body bytes sent (when the length is known)"),
+    "rawdata_http_requests_in_flight": ("gauge", "Requests currently being handled"),
+    "rawdata_write_stage_duration_seconds": ("histogram", "Time spent in each stage of a write"),
+    "rawdata_cache_requests_total": ("counter", "Lookups in derived caches by result"),
+    "rawdata_telegram_handler_duration_seconds": ("histogram", "Telegram handler run time by handler and update type"),
+    "rawdata_documents": ("gauge", "Documents held in memory"),
+    "rawdata_watch_subscribers": ("gauge", "Parked /raw/watch connections"),
+    "process_resident_memory_bytes": ("gauge", "Resident set size"),
+    "process_cpu_seconds_total": ("counter", "User and system CPU time"),
+    "python_gc_collections_total": ("counter", "Garbage collector runs by generation"),
+    "python_gc_objects_collected_total": ("counter", "Objects collected by generation"),
+    "python_gc_objects_uncollectable_total": ("counter", "Uncollectable objects found by generation"),
+}
+
+class Histogram:
+    """Bucket counts and sum for one labelled series"""
+    __slots__ = ("counts", "sum")
+    
+    def __init__(self):
+        self.counts = [0] * (len(METRICS_BUCKETS) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+
+class RouteStats:
+    """Latency histogram and byte counters of one route"""
+    __slots__ = ("latency", "bytes_in", "bytes_out")
+    
+    def __init__(self):
+        self.latency = Histogram()
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+class Metrics:
+    """Counters, gauges and histograms of this process
+    
+    Series are keyed by (name, labels) in plain dicts behind one lock.
+    Requests and cache lookups are the hot path: observe_request() and
+    cache() only append a tuple to a deque (atomic, no lock). The
+    run_metrics_folder() thread folds the queues into the
+    (route, method, code) -> [count, RouteStats] index and the cache
+    counters, as does every snapshot.
+    """
+    
+    # Backstop: a request thread only folds if the folder falls this far behind
+    FOLD_BATCH = 65536
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.requests = {}
+        self.routes = {}
+        self.pending = deque()
+        self.cache_events = deque()
+        # Ids of the requests being handled; set.add/discard need no lock
+        self.active = set()
+    
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+    
+    def observe(self, name, labels, value):
+        with self.lock:
+            self._observe(name, labels, value)
+    
+    def _observe(self, name, labels, value):
+        histogram = self.histograms.get((name, labels))
+        if histogram is None:
+            histogram = self.histograms[(name, labels)] = Histogram()
+        histogram.counts[bisect.bisect_left(METRICS_BUCKETS, value)] += 1
+        histogram.sum += value
+    
+    def observe_request(self, route, method, status, seconds, bytes_in, headers):
+        """Queue one request; the status line, body sizes and headers are parsed when folded"""
+        pending = self.pending
+        pending.append((route, method, status, seconds, bytes_in, headers))
+        if len(pending) > self.FOLD_BATCH:
+            self.fold()
+    
+    def fold(self):
+        """Add the queued request observations and cache lookups into their series"""
+        pending, cache_events = self.pending, self.cache_events
+        with self.lock:
+            lookups = Counter(cache_events.popleft() for _ in range(len(cache_events)))
+            for (name, hit), count in lookups.items():
+                key = ("rawdata_cache_requests_total", (("cache", name), ("result", "hit" if hit else "miss")))
+                self.counters[key] = self.counters.get(key, 0) + count
+            requests, bisect_left = self.requests, bisect.bisect_left
+            for _ in range(len(pending)):
+                route, method, status, seconds, bytes_in, headers = pending.popleft()
+                key = (route, method, status[:3])
+                entry = requests.get(key)
+                if entry is None:
+                    stats = self.routes.get(route) or self.routes.setdefault(route, RouteStats())
+                    entry = requests[key] = [0, stats]
+                entry[0] += 1
+                stats = entry[1]
+                latency = stats.latency
+                latency.counts[bisect_left(METRICS_BUCKETS, seconds)] += 1
+                latency.sum += seconds
+                if bytes_in:
+                    stats.bytes_in += int(bytes_in)
+                for name, value in headers:
+                    if name == "Content-Length":
+                        stats.bytes_out += int(value)
+                        break
+    
+    def cache(self, name, hit):
+        cache_events = self.cache_events
+        cache_events.append((name, hit))
+        if len(cache_events) > self.FOLD_BATCH:
+            self.fold()
+    
+    def snapshot(self):
+        """Everything this process has recorded, as JSON-serializable lists"""
+        self.fold()
+        with self.lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self.counters.items()]
+            histograms = [
+                [name, list(labels), list(histogram.counts), histogram.sum]
+                for (name, labels), histogram in self.histograms.items()
+            ]
+            for (route, method, status), (count, _) in self.requests.items():
+                labels = [["route", route], ["method", method], ["code", status]]
+                counters.append(["rawdata_http_requests_total", labels, count])
+            for route, stats in self.routes.items():
+                labels = [["route", route]]
+                histograms.append([
+                    "rawdata_http_request_duration_seconds", labels, list(stats.latency.counts), stats.latency.sum
+                ])
+                counters.append(["rawdata_http_request_bytes_total", labels, stats.bytes_in])
+                counters.append(["rawdata_http_response_bytes_total", labels, stats.bytes_out])
+        
+        gauges = [
+            ["rawdata_http_requests_in_flight", [], len(self.active)],
+            ["rawdata_documents", [], len(DOCUMENTS)],
+            ["rawdata_watch_subscribers", [], WATCH_HUB.subscriber_count],
+            ["process_resident_memory_bytes", [], process_rss()],
+        ]
+        times = os.times()
+        counters.append(["process_cpu_seconds_total", [], times.user + times.system])
+        for generation, stats in enumerate(gc.get_stats()):
+            labels = [["generation", str(generation)]]
+            counters.append(["python_gc_collections_total", labels, stats["collections"]])
+            counters.append(["python_gc_objects_collected_total", labels, stats["collected"]])
+            counters.append(["python_gc_objects_uncollectable_total", labels, stats["uncollectable"]])
+        return {"pid": os.getpid(), "counters": counters, "histograms": histograms, "gauges": gauges}
+
+METRICS = Metrics()
+# Set by run_prefork(): every process writes its snapshot here for /metrics to merge
+METRICS_DIR = None
+
+def process_rss():
+    """Current resident set size in bytes (peak size where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+# Scrapes and the flusher thread write the same .tmp file
+_FLUSH_LOCK = threading.Lock()
+
+def flush_metrics():
+    """Publish this process's snapshot to METRICS_DIR (written aside, then renamed)"""
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    with _FLUSH_LOCK:
+        with open(path + ".tmp", "w") as f:
+            json.dump(METRICS.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+def run_metrics_flusher():
+    """Flush metrics on startup, so the process is listed at once, then every METRICS_FLUSH_INTERVAL seconds"""
+    while True:
+        try:
+            flush_metrics()
+        except Exception as e:
+            print(f"⚠️ Metrics flush failed: {e}")
+        time.sleep(METRICS_FLUSH_INTERVAL)
+
+def run_metrics_folder():
+    """Fold queued observations every METRICS_FOLD_INTERVAL seconds, off the request threads"""
+    while True:
+        time.sleep(METRICS_FOLD_INTERVAL)
+        try:
+            METRICS.fold()
+        except Exception as e:
+            print(f"⚠️ Metrics fold failed: {e}")
+
+def collect_metrics():
+    """Snapshots of this process and, with pre-forked workers, of every other one
+    
+    A scrape lands on whichever worker accepts it. That worker publishes
+    its own snapshot first and then merges the latest published snapshot
+    of every process, itself included: everything a scrape reports has
+    been persisted, so the next scrape, whichever worker serves it, never
+    reports less. Counters and histograms of exited processes are kept so
+    totals never go backwards; their gauges are dropped.
+    """
+    if METRICS_DIR is None:
+        return [METRICS.snapshot()]
+    flush_metrics()
+    snapshots = []
+    for name in os.listdir(METRICS_DIR):
+        if not name.endswith(".json"):
+            continue
+        pid = name[:-len(".json")]
+        try:
+            with open(os.path.join(METRICS_DIR, name)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except (ProcessLookupError, ValueError):
+            snapshot["gauges"] = []
+        except PermissionError:
+            pass
+        snapshots.append(snapshot)
+    return snapshots
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+def render_metrics(snapshots):
+    """Prometheus text exposition (format 0.0.4) of merged snapshots"""
+    counters, histograms, gauges = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            if name.startswith(("process_", "python_")):
+                labels = labels + [["pid", str(snapshot["pid"])]]
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+        for name, labels, value in snapshot["gauges"]:
+            if name.startswith("process_") or name == "rawdata_documents":
+                labels = labels + [["pid", str(snapshot["pid"])]]
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+    
+    series = {}
+    for (name, labels), value in list(counters.items()) + list(gauges.items()):
+        # repr, not :g, so large counters keep every digit
+        series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value!r}")
+    for (name, labels), (counts, total) in histograms.items():
+        lines = series.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(METRICS_BUCKETS + ("+Inf",), counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}' if bound != '+Inf' else bound),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    
+    out = []
+    for name, lines in series.items():
+        kind, help_text = METRIC_INFO.get(name, ("untyped", name))
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+class RoutedRequest(Request):
+    """Flask request that notes its matched URL rule in the environ for MetricsMiddleware
+    
+    Flask drops the request object before the middleware reads it. Routing
+    assigns url_rule exactly once, so recording it here costs less than a
+    before_request hook going through the request proxy every time.
+    """
+    _url_rule = None
+    
+    @property
+    def url_rule(self):
+        return self._url_rule
+    
+    @url_rule.setter
+    def url_rule(self, rule):
+        self._url_rule = rule
+        if rule is not None:
+            self.environ["rawdata.route"] = rule.rule
+
+class MetricsMiddleware:
+    """WSGI wrapper that times every request and counts its bytes by route
+    
+    Reads everything from the environ and the start_response arguments,
+    without Flask's context proxies, to keep the per-request cost small;
+    RoutedRequest leaves the matched URL rule there for it.
+    Latency is measured until the app returns its body iterable, so
+    streamed responses count up to their first byte.
+    """
+    
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+    
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        token = id(environ)
+        METRICS.active.add(token)
+        
+        def recording_start_response(status, headers, exc_info=None):
+            environ["rawdata.response"] = (status, headers)
+            return start_response(status, headers, exc_info)
+        
+        try:
+            return self.wsgi_app(environ, recording_start_response)
+        finally:
+            elapsed = time.perf_counter() - started
+            METRICS.active.discard(token)
+            status, headers = environ.get("rawdata.response", ("500", ()))
+            METRICS.observe_request(
+                environ.get("rawdata.route", "unmatched"),
+                environ["REQUEST_METHOD"],
+                status,
+                elapsed,
+                environ.get("rawdata.bytes_in") or environ.get("CONTENT_LENGTH"),
+                headers
+            )
+
+def timed_handler(callback):
+    """Wrap a Telegram handler callback to record its run time by update type"""
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            if update.callback_query is not None:
+                kind = (update.callback_query.data or "").split(":", 1)[0]
+            elif update.message is not None and (update.message.text or "").startswith("/"):
+                kind = update.message.text.split()[0].split("@", 1)[0]
+            else:
+                kind = "message"
+            METRICS.observe(
+                "rawdata_telegram_handler_duration_seconds",
+                (("handler", callback.__name__), ("type", kind)),
+                time.perf_counter() - started
+            )
+    return wrapper
+
+# ========================
+# ENCRYPTION
+# ========================
+class EnvelopeCipher:
+    """AES-GCM envelopes for data at rest, sealed and opened segment by segment
+    
+    An envelope is a header (format byte, key id, HKDF salt, nonce prefix)
+    followed by the plaintext in SEGMENT_SIZE pieces, each sealed on its
+    own under a key derived from the salt. A segment's nonce is the prefix,
+    its index and a last-segment flag, and the header plus a caller-chosen
+    context (document key, chunk digest) is authenticated with every
+    segment, so segments cannot be reordered, truncated or moved to another
+    row. Neither side ever holds more than one segment of ciphertext.
+    """
+    SEGMENT_SIZE = 64 * 1024
+    TAG_SIZE = 16
+    
+    def __init__(self, keys):
+        aead = optional_module("cryptography.hazmat.primitives.ciphers.aead")
+        if aead is None:
+            raise RuntimeError("ENCRYPTION_KEYS is set but the cryptography package is not installed")
+        self._aesgcm = aead.AESGCM
+        self._hkdf = importlib.import_module("cryptography.hazmat.primitives.kdf.hkdf").HKDF
+        self._sha256 = importlib.import_module("cryptography.hazmat.primitives.hashes").SHA256
+        self._invalid_tag = importlib.import_module("cryptography.exceptions").InvalidTag
+        self._keys = dict(keys)
+        self.key_id = keys[0][0]
+        self._header_size = 2 + len(self.key_id.encode("utf-8")) + 16 + 7
+    
+    def _segment_cipher(self, key_id, salt):
+        if key_id not in self._keys:
+            raise ValueError(f"Stored data is sealed with key '{key_id}', which is not in ENCRYPTION_KEYS")
+        hkdf = self._hkdf(algorithm=self._sha256(), length=32, salt=salt, info=b"rawdata segments")
+        return self._aesgcm(hkdf.derive(self._keys[key_id]))
+    
+    def sealed_size(self, length):
+        """Size of the envelope for `length` bytes of plaintext under the current key"""
+        segments = max(1, -(-length // self.SEGMENT_SIZE))
+        return self._header_size + length + segments * self.TAG_SIZE
+    
+    def seal_segments(self, raw, context):
+        """Yield the envelope of raw under the current key: the header, then one piece per segment"""
+        salt, prefix = os.urandom(16), os.urandom(7)
+        key_id = self.key_id.encode("utf-8")
+        header = bytes((1, len(key_id))) + key_id + salt + prefix
+        cipher = self._segment_cipher(self.key_id, salt)
+        aad = header + context
+        view = memoryview(raw)
+        count = max(1, -(-len(raw) // self.SEGMENT_SIZE))
+        yield header
+        for index in range(count):
+            nonce = prefix + index.to_bytes(4, "big") + (b"\x01" if index == count - 1 else b"\x00")
+            yield cipher.encrypt(nonce, view[index * self.SEGMENT_SIZE:(index + 1) * self.SEGMENT_SIZE], aad)
+    
+    def seal(self, raw, context):
+        return b"".join(self.seal_segments(raw, context))
+    
+    def open_segments(self, read, context):
+        """Yield the plaintext segments of an envelope read piecewise through read(n)"""
+        head = read(2)
+        if len(head) != 2 or head[0] != 1:
+            raise ValueError("Stored data is not a recognised encrypted envelope")
+        key_id = read(head[1])
+        salt, prefix = read(16), read(7)
+        cipher = self._segment_cipher(key_id.decode("utf-8"), salt)
+        aad = head + key_id + salt + prefix + context
+        size = self.SEGMENT_SIZE + self.TAG_SIZE
+        segment, index = read(size), 0
+        while True:
+            following = read(size)  # Only the segment with nothing after it may carry the last flag
+            nonce = prefix + index.to_bytes(4, "big") + (b"\x00" if following else b"\x01")
+            try:
+                yield cipher.decrypt(nonce, segment, aad)
+            except self._invalid_tag:
+                raise ValueError("Stored data failed authentication (wrong key or tampered)") from None
+            if not following:
+                return
+            segment, index = following, index + 1
+    
+    def open(self, blob, context):
+        return b"".join(self.open_segments(io.BytesIO(blob).read, context))
+    
+    def plaintext_size(self, envelope):
+        """Plaintext length of an envelope, from its size and header (works on an open blob)"""
+        body = len(envelope) - (2 + envelope[1] + 16 + 7)
+        return body - max(1, -(-body // (self.SEGMENT_SIZE + self.TAG_SIZE))) * self.TAG_SIZE
+    
+    def open_into(self, read, buffer, context):
+        """Decrypt an envelope segment by segment into a buffer preallocated to its plaintext_size()"""
+        offset = 0
+        with memoryview(buffer) as view:
+            for segment in self.open_segments(read, context):
+                if offset + len(segment) > len(view):
+                    raise ValueError("Stored data is longer than its envelope claims")
+                view[offset:offset + len(segment)] = segment
+                offset += len(segment)
+        if offset != len(buffer):
+            raise ValueError("Stored data is shorter than its envelope claims")
+        return buffer
+    
+    def blob_key_id(self, blob):
+        """Id of the key an envelope was sealed with"""
+        return bytes(blob[2:2 + blob[1]]).decode("utf-8")
+
+def make_cipher():
+    """The at-rest cipher configured by ENCRYPTION_KEYS, or None when encryption is off"""
+    if not ENCRYPTION_KEYS.strip():
+        return None
+    keys = []
+    for entry in ENCRYPTION_KEYS.split(","):
+        key_id, _, encoded = entry.strip().rpartition(":")
+        try:
+            key = base64.b64decode(encoded, validate=True)
+        except ValueError:
+            key = b""
+        if not key_id or len(key_id.encode("utf-8")) > 255 or len(key) not in (16, 24, 32):
+            # Never echo the entry itself: it holds key material
+            raise ValueError(
+                f"Invalid ENCRYPTION_KEYS entry {len(keys) + 1}: expected <id>:<base64 16, 24 or 32 byte key>"
+            )
+        keys.append((key_id, key))
+    return EnvelopeCipher(keys)
+
+CIPHER = make_cipher()
+
+# ========================
+# DOCUMENTS
+# ========================
+def new_metadata(**fields):
+    """Metadata for an empty document (views are counted on the Document)"""
+    metadata = {
+        "last_updated": "",
+        "size": 0,
+        "format": "text",
+        "author": ""
+    }
+    metadata.update(fields)
+    return metadata
+
+class LineIndex:
+    """Byte offset of the start of every line of an encoded payload
+    
+    Built once per version: the payload is split LINE_INDEX_CHUNK bytes at
+    a time and the line lengths summed into a flat array of 4-byte offsets
+    (8-byte past 4 GB), so the line count and any range of lines are a
+    couple of lookups instead of a split of the whole text.
+    """
+    __slots__ = ("starts", "size")
+    LINE_INDEX_CHUNK = 1024 * 1024
+    
+    def __init__(self, raw):
+        self.size = len(raw)
+        self.starts = starts = array.array("I" if len(raw) < 2 ** 32 else "Q", [0] if raw else [])
+        for base in range(0, len(raw), self.LINE_INDEX_CHUNK):
+            parts = raw[base:base + self.LINE_INDEX_CHUNK].split(b"\n")
+            # Running total of len(part) + 1 is the offset just past each newline
+            starts.extend(itertools.islice(
+                itertools.accumulate(map(operator.add, map(len, parts), itertools.repeat(1)), initial=base),
+                1, len(parts)
+            ))
+        if starts and starts[-1] == len(raw):
+            starts.pop()  # A trailing newline ends the last line, it does not start one
+    
+    def __len__(self):
+        return len(self.starts)
+    
+    def span(self, first, last):
+        """Byte range (start, stop) of lines first..last (1-based, inclusive, clamped to the payload)"""
+        count = len(self.starts)
+        first, last = max(first, 1), min(last, count)
+        if first > last:
+            return self.size, self.size
+        return self.starts[first - 1], self.starts[last] if last < count else self.size
+    
+    def lines_within(self, max_bytes):
+        """How many leading lines fit, newlines included, in max_bytes"""
+        if self.size <= max_bytes:
+            return len(self.starts)
+        return bisect.bisect_right(self.starts, max_bytes) - 1
+
+# One published version of a document. Snapshots are never modified:
+# writers build a new one and swap Document.snapshot, so a reader that
+# grabs the reference once sees data, metadata and validators that agree.
+# The payload is held once, as UTF-8 bytes; text() decodes it on demand.
+class Snapshot(namedtuple("Snapshot", "version raw metadata history etag modified")):
+    __slots__ = ()
+    
+    def text(self):
+        """The payload as a str, decoded afresh on every call"""
+        return self.raw.decode("utf-8")
+
+def make_snapshot(version, raw, metadata, history, etag=None, modified=None):
+    """Build a snapshot and everything derived from its payload
+    
+    Snapshots of stored versions pass the etag and modification time that
+    were recorded when the version was written, so every process answers
+    with the same validators without re-hashing the payload.
+    """
+    if not isinstance(raw, bytes):
+        raise TypeError(f"Snapshot payloads must be bytes, not {type(raw).__name__}")
+    if etag is None:
+        etag = hashlib.sha256(raw).hexdigest()
+    metadata = {key: value for key, value in metadata.items() if key != "views"}
+    return Snapshot(
+        version=version,
+        raw=raw,
+        metadata=MappingProxyType(metadata),
+        history=tuple(history),
+        etag=etag,
+        modified=modified or datetime.now(timezone.utc)
+    )
+
+def preview_lines(doc, snapshot, count, max_bytes=PREVIEW_MAX_BYTES):
+    """Text of the first `count` lines (at most max_bytes of it) and how many lines are left out"""
+    index = line_index(doc, snapshot)
+    start, stop = index.span(1, count)
+    text = snapshot.raw[:min(stop, max_bytes)].decode("utf-8", "ignore")  # Drops a character cut in half
+    if stop > max_bytes:
+        text += "…"
+    return text.rstrip("\n"), max(0, len(index) - count)
+
+class ViewCounter:
+    """Page view counter sharded over a fixed pool of slots
+    
+    increment() adds to the slot picked by the calling thread's ident, so
+    it never locks and costs the same on a thread's first view as on its
+    thousandth. The slot count is prime because idents are aligned
+    addresses, which a power of two would fold onto one slot. Threads that
+    share a slot still count exactly: the in-place add has no GIL switch
+    point between its read and its write. Slots are summed when the total
+    is read.
+    """
+    
+    SLOTS = 61
+    
+    def __init__(self, value=0):
+        self._slots = [0] * self.SLOTS
+        self._lock = threading.Lock()  # Adjustments to the base only
+        self._base = value
+    
+    def increment(self):
+        self._slots[threading.get_ident() % self.SLOTS] += 1
+    
+    @property
+    def value(self):
+        """Total across all slots"""
+        return self._base + sum(self._slots)
+    
+    def reset(self, value=0):
+        with self._lock:
+            self._base = value - sum(self._slots)
+    
+    def add(self, delta):
+        """Fold in views counted elsewhere (e.g. by other worker processes)"""
+        with self._lock:
+            self._base += delta
+
+class Document:
+    """One named document: the current snapshot plus caches derived from it"""
+    
+    def __init__(self, key):
+        self.key = key
+        # Serializes writers only; readers just read self.snapshot
+        self.lock = threading.Lock()
+        self.snapshot = make_snapshot(0, b"", new_metadata(), ())
+        # Storage sequence number of the snapshot (0 = never stored)
+        self.seq = 0
+        self.views = ViewCounter()
+        # Last view count written to storage
+        self.views_checkpoint = 0
+        # Precompressed variants: (version, {encoding: bytes})
+        self.compressed = (0, {})
+        # Rendered dashboard: (version, [bytes | mark, ...])
+        self.home_cache = (0, None)
+        # Serialized JSON responses: (version, {(name, compact): [bytes | mark, ...]})
+        self.json_cache = (0, {})
+        # Validated format label: (version, label)
+        self.format_check = (0, "text")
+        # Line offsets, built on first use: (version, LineIndex)
+        self.line_index = (0, LineIndex(b""))
+        # Parsed JSON payload: (version, JsonTree, or None if it is not JSON)
+        self.json_tree = (0, None)
+        # Retained versions, oldest first: deque of VersionRecord
+        self.versions = deque()
+    
+    @property
+    def url(self):
+        """Public RAW URL of this document"""
+        return RAW_URL if self.key == DEFAULT_KEY else f"{RAW_URL}/{self.key}"
+
+# Hash index of key -> Document; the default document always exists
+DOCUMENTS = {DEFAULT_KEY: Document(DEFAULT_KEY)}
+_DOCUMENTS_LOCK = threading.Lock()
+
+def get_document(key, create=False):
+    """Look up a document by key, optionally creating an empty one"""
+    doc = DOCUMENTS.get(key)
+    if doc is None and create:
+        with _DOCUMENTS_LOCK:
+            doc = DOCUMENTS.setdefault(key, Document(key))
+    return doc
+
+# ------------------------
+# Version history
+# ------------------------
+CHUNK_MIN_SIZE = 4 * 1024
+CHUNK_TARGET_COUNT = 1024  # Bigger documents get proportionally bigger chunks
+_CHUNK_BOUNDARY_MASK = 0x1F  # About one line end in 32 closes a chunk
+
+def split_chunks(raw):
+    """Cut raw bytes into content-defined chunks
+    
+    A chunk ends at a newline whose preceding 32 bytes hash to a boundary
+    value, so boundaries depend on content rather than offsets: an edit
+    changes the chunks around it and the rest line up with the previous
+    version. Chunks are at least min_size bytes, which grows in powers of
+    two with the document so splitting stays cheap; text without suitable
+    newlines is cut every 16 * min_size.
+    """
+    length = len(raw)
+    min_size = max(CHUNK_MIN_SIZE, 1 << (length // CHUNK_TARGET_COUNT).bit_length())
+    max_size = 16 * min_size
+    view = memoryview(raw)
+    chunks = []
+    start = 0
+    while start < length:
+        end = min(start + max_size, length)
+        pos = start + min_size
+        while pos < end:
+            newline = raw.find(b"\n", pos, end)
+            if newline < 0:
+                break
+            if not zlib.crc32(view[newline - 32:newline]) & _CHUNK_BOUNDARY_MASK:
+                end = newline + 1
+                break
+            pos = newline + 1
+        chunks.append(raw[start:end])
+        start = end
+    return chunks
+
+class ChunkStore:
+    """Content-addressed chunks shared by every version of every document
+    
+    Chunks are keyed by SHA-256 digest and reference counted, so a chunk
+    that appears in many versions is held once and freed with the last
+    version that uses it. With a cipher, chunks are held sealed (the
+    digest is their context) and only opened to serve a past version.
+    """
+    
+    def __init__(self, cipher=None):
+        self._lock = threading.Lock()
+        self._chunks = {}  # digest -> [data, refcount]
+        self._bytes = 0
+        self.cipher = cipher
+    
+    def retain(self, pairs, sealed=False):
+        """Take a reference on each (digest, data) pair; return {digest: data} of chunks new to the store
+        
+        data may be None for digests the store already holds. New chunks
+        are sealed on the way in unless `sealed` says they already are.
+        """
+        new = {}
+        with self._lock:
+            for digest, data in pairs:
+                entry = self._chunks.get(digest)
+                if entry is None:
+                    if self.cipher is not None and not sealed:
+                        data = self.cipher.seal(data, digest)
+                    self._chunks[digest] = [data, 1]
+                    self._bytes += len(data)
+                    new[digest] = data
+                else:
+                    entry[1] += 1
+        return new
+    
+    def release(self, digests):
+        with self._lock:
+            for digest in digests:
+                entry = self._chunks[digest]
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._chunks[digest]
+                    self._bytes -= len(entry[0])
+    
+    def missing(self, digests):
+        """Digests not currently held"""
+        chunks = self._chunks
+        return {digest for digest in digests if digest not in chunks}
+    
+    def digests(self):
+        with self._lock:
+            return set(self._chunks)
+    
+    def join(self, digests):
+        """Reassemble a version from its chunk digests"""
+        chunks = self._chunks
+        if self.cipher is None:
+            return b"".join(chunks[digest][0] for digest in digests)
+        return b"".join(self.cipher.open(chunks[digest][0], digest) for digest in digests)
+    
+    def reseal(self):
+        """Re-seal chunks held under an older key with the current one; returns how many"""
+        cipher, done = self.cipher, 0
+        if cipher is None:
+            return 0
+        for digest in list(self._chunks):
+            with self._lock:  # One chunk at a time, so versions can still be read meanwhile
+                entry = self._chunks.get(digest)
+                if entry is None or cipher.blob_key_id(entry[0]) == cipher.key_id:
+                    continue
+                data = cipher.seal(cipher.open(entry[0], digest), digest)
+                self._bytes += len(data) - len(entry[0])
+                entry[0] = data
+                done += 1
+        return done
+    
+    def stats(self):
+        return {"chunks": len(self._chunks), "bytes": self._bytes}
+
+CHUNKS = ChunkStore(CIPHER)
+
+# One retained version: number, creation time (epoch seconds), SHA-256 of the
+# content, its metadata and the digests of its chunks in order
+VersionRecord = namedtuple("VersionRecord", "number created etag metadata chunks")
+
+def chunk_version(raw):
+    """Split raw into chunks, retain them and return (digests, chunks new to the store)"""
+    chunks = split_chunks(raw)
+    digests = tuple(hashlib.sha256(chunk).digest() for chunk in chunks)
+    return digests, CHUNKS.retain(zip(digests, chunks))
+
+def remember_version(doc, record):
+    """Append a version to the document's history, dropping the oldest beyond HISTORY_VERSIONS"""
+    versions = doc.versions
+    versions.append(record)
+    while len(versions) > HISTORY_VERSIONS:
+        CHUNKS.release(versions.popleft().chunks)
+
+def find_version(doc, number=None, at=None):
+    """The retained version with this number, or the one current at epoch time `at`"""
+    versions = list(doc.versions)  # Consistent copy; writers append concurrently
+    if number is not None:
+        if versions and versions[0].number <= number <= versions[-1].number:
+            index = bisect.bisect_left(versions, number, key=lambda record: record.number)
+            if versions[index].number == number:
+                return versions[index]
+        return None
+    index = bisect.bisect_right(versions, at, key=lambda record: record.created)
+    return versions[index - 1] if index else None
+
+def load_versions(doc, after=0):
+    """Load the document's stored versions newer than `after` into its history"""
+    rows = STORE.load_versions(doc.key, after)
+    wanted = CHUNKS.missing({digest for row in rows for digest in row[4]})
+    fetched = STORE.load_chunks(wanted)
+    for number, created, etag, metadata, digests in rows:
+        CHUNKS.retain(((digest, fetched.get(digest)) for digest in digests), sealed=True)
+        remember_version(doc, VersionRecord(number, created, etag, MappingProxyType(metadata), digests))
+
+def stored_validators(doc, version):
+    """(etag, modified) recorded for a loaded version, or (None, None) if it has no record"""
+    if doc.versions and doc.versions[-1].number == version:
+        record = doc.versions[-1]
+        return record.etag, datetime.fromtimestamp(record.created, timezone.utc)
+    return None, None
+
+def line_index(doc, snapshot):
+    """LineIndex of a snapshot, built on first use and at most once per version"""
+    version, index = doc.line_index
+    METRICS.cache("lines", version == snapshot.version)
+    if version != snapshot.version:
+        index = LineIndex(snapshot.raw)
+        if snapshot is doc.snapshot:
+            doc.line_index = (snapshot.version, index)
+    return index
+
+def document_format(doc, snapshot):
+    """Format label of a snapshot, validated against the full text at most once per version"""
+    version, label = doc.format_check
+    METRICS.cache("format", version == snapshot.version)
+    if version != snapshot.version:
+        label = snapshot.metadata["format"]
+        tree_version, tree = doc.json_tree
+        if label == "json" and tree_version == snapshot.version:
+            label = "json" if tree is not None else "text"  # Already parsed for a ?path= query
+        else:
+            # Validation parses and drops the result; only ?path= keeps a tree
+            label = validate_format(snapshot.text(), label)
+        if snapshot is doc.snapshot:
+            doc.format_check = (snapshot.version, label)
+    return label
+
+def document_metadata(doc, snapshot, validate=True):
+    """Public metadata for a snapshot, including the live view count
+    
+    Write responses pass validate=False to report the sniffed format
+    without parsing the payload they just stored.
+    """
+    metadata = dict(snapshot.metadata, views=doc.views.value)
+    if validate:
+        metadata["format"] = document_format(doc, snapshot)
+    return metadata
+
+def commit_data(doc, data, metadata, history_entry=None, reset_views=False, raw=None, etag=None):
+    """Persist and publish a new version of a document
+    
+    Callers must hold doc.lock. The new snapshot is built off to the side
+    and published with a single reference assignment, then announced to
+    the other worker processes, if any, and to watching clients.
+    """
+    current = doc.snapshot
+    history = current.history
+    if history_entry is not None:
+        history = (history + (history_entry,))[-10:]  # Keep last 10
+    
+    if raw is None:
+        raw = data.encode("utf-8")
+    snapshot = make_snapshot(current.version + 1, raw, metadata, history, etag)
+    created = snapshot.modified.timestamp()
+    digests, new_chunks = chunk_version(snapshot.raw)
+    try:
+        seq, number = STORE.commit(
+            doc.key, snapshot.raw, dict(snapshot.metadata), history_entry, reset_views,
+            version=(created, snapshot.etag, digests, new_chunks)
+        )
+    except BaseException:
+        CHUNKS.release(digests)
+        raise
+    if number is not None and number != snapshot.version:
+        snapshot = snapshot._replace(version=number)  # Numbered by the shared store
+    remember_version(doc, VersionRecord(snapshot.version, created, snapshot.etag, snapshot.metadata, digests))
+    doc.seq = seq
+    doc.snapshot = snapshot
+    if SHARED_VERSION is not None:
+        SHARED_VERSION.publish(seq)
+    WATCH_HUB.publish(doc, snapshot)
+    
+    if len(snapshot.raw) >= COMPRESS_MIN_SIZE:
+        _COMPRESSOR.submit(compress_version, doc, snapshot)
+    return snapshot
+
+class DataService:
+    """Read/write API shared by the HTTP routes and the Telegram bot
+    
+    Flask handlers call the plain methods. Bot handlers await the a*
+    variants, which run the same code on a worker thread so hashing, the
+    storage commit and catching up with other workers never stall the
+    bot's event loop.
+    """
+    
+    def read(self, key, create=False):
+        """A document and its current snapshot, or (None, None) if it does not exist"""
+        sync_documents()
+        doc = get_document(key, create=create)
+        if doc is None:
+            return None, None
+        return doc, doc.snapshot
+    
+    def write(self, key, data, author, keep_history=True, raw=None, etag=None):
+        """Store data as the next version of a document and return its snapshot
+        
+        Callers that already hold the UTF-8 bytes and their SHA-256 (such
+        as a streamed upload) pass them as raw and etag to skip re-encoding.
+        """
+        if not is_valid_key(key):
+            raise ValueError(f"Invalid document key: {key!r}")
+        sync_documents()
+        doc = get_document(key, create=True)
+        with doc.lock:
+            return self._commit_version(doc, data, author, keep_history, raw, etag)
+    
+    def patch(self, key, change, author):
+        """Apply change(current snapshot) -> (data, raw or None) as the next version
+        
+        change runs under the writer lock, so a patch always applies to the
+        version it was checked against and never loses a concurrent write.
+        Returns the new snapshot, or None if the document does not exist.
+        """
+        sync_documents()
+        doc = get_document(key)
+        if doc is None:
+            return None
+        with doc.lock:
+            data, raw = change(doc.snapshot)
+            return self._commit_version(doc, data, author, True, raw)
+    
+    def _commit_version(self, doc, data, author, keep_history, raw=None, etag=None):
+        """Commit data with fresh metadata; callers hold doc.lock"""
+        started = time.perf_counter()
+        metadata = {
+            "last_updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "size": len(data),
+            "format": detect_format(data),
+            "author": author
+        }
+        detected = time.perf_counter()
+        METRICS.observe("rawdata_write_stage_duration_seconds", (("stage", "detect"),), detected - started)
+        
+        # Save to history (keep last 10)
+        current = doc.snapshot
+        history_entry = None
+        if keep_history and current.raw:
+            # 404 bytes of UTF-8 hold at least 101 characters, enough to tell if it was cut
+            head = current.raw[:404].decode("utf-8", "ignore")
+            history_entry = {
+                "data": head[:100] + "..." if len(head) > 100 else head,
+                "timestamp": current.metadata["last_updated"],
+                "size": current.metadata["size"]
+            }
+        snapshot = commit_data(doc, data, metadata, history_entry, raw=raw, etag=etag)
+        METRICS.observe("rawdata_write_stage_duration_seconds", (("stage", "store"),), time.perf_counter() - detected)
+        return snapshot
+    
+    def clear(self, key):
+        """Empty a document, reset its views and return the cleared size"""
+        sync_documents()
+        doc = get_document(key, create=True)
+        with doc.lock:
+            old_size = len(doc.snapshot.raw)
+            
+            # Save to history before clearing
+            history_entry = None
+            if old_size:
+                history_entry = {
+                    "data": "[CLEARED BY USER]",
+                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "size": 0,
+                    "action": "cleared"
+                }
+            
+            with _VIEWS_LOCK:
+                doc.views.reset()
+                doc.views_checkpoint = 0
+                commit_data(doc, "", new_metadata(
+                    last_updated=time.strftime("%Y-%m-%d %H:%M:%S"),
+                    format="empty"
+                ), history_entry, reset_views=True)
+        return old_size
+    
+    async def aread(self, key, create=False):
+        if SHARED_VERSION is None:
+            return self.read(key, create)  # Nothing to sync, just a reference read
+        # Following other workers may load and decrypt a whole document
+        return await asyncio.to_thread(self.read, key, create)
+    
+    async def awrite(self, key, data, author, keep_history=True):
+        return await asyncio.to_thread(self.write, key, data, author, keep_history)
+    
+    async def aclear(self, key):
+        return await asyncio.to_thread(self.clear, key)
+
+DATA_SERVICE = DataService()
+
+def compress_version(doc, snapshot):
+    """Build the compressed variants of one snapshot (runs on the worker)"""
+    if snapshot is not doc.snapshot:
+        return  # Superseded by a newer write before we got to it
+    
+    raw = snapshot.raw
+    variants = {"gzip": gzip.compress(raw, compresslevel=6)}
+    brotli, zstandard = optional_module("brotli"), optional_module("zstandard")
+    if brotli is not None:
+        variants["br"] = brotli.compress(raw, quality=5)
+    if zstandard is not None:
+        variants["zstd"] = zstandard.ZstdCompressor(level=6).compress(raw)
+    
+    # Only keep variants that are actually smaller
+    variants = {enc: body for enc, body in variants.items() if len(body) < len(raw)}
+    doc.compressed = (snapshot.version, variants)
+
+def choose_encoding(doc, snapshot, accept_encodings):
+    """Pick the best precompressed variant the client accepts, or (None, None)"""
+    version, variants = doc.compressed
+    if version != snapshot.version or not variants:
+        if len(snapshot.raw) >= COMPRESS_MIN_SIZE:
+            METRICS.cache("compressed", False)  # Not built yet for this version
+        return None, None
+    METRICS.cache("compressed", True)
+    
+    best, best_quality = None, 0
+    for encoding in ("br", "zstd", "gzip"):  # Preference order on ties
+        quality = accept_encodings.quality(encoding)
+        if encoding in variants and quality > best_quality:
+            best, best_quality = encoding, quality
+    return best, variants.get(best)
+
+def checkpoint_views():
+    """Add new views to storage and fold in views other workers stored"""
+    for doc in list(DOCUMENTS.values()):
+        with _VIEWS_LOCK:
+            delta = doc.views.value - doc.views_checkpoint
+            if not delta and SHARED_VERSION is None:
+                continue
+            total = STORE.add_views(doc.key, delta)
+            if total is None:  # Nothing stored for this document
+                doc.views_checkpoint += delta
+                continue
+            doc.views.add(total - doc.views_checkpoint - delta)
+            doc.views_checkpoint = total
+
+def run_views_checkpointer():
+    """Checkpoint view counts every VIEWS_CHECKPOINT_INTERVAL seconds"""
+    while True:
+        time.sleep(VIEWS_CHECKPOINT_INTERVAL)
+        try:
+            checkpoint_views()
+        except Exception as e:
+            print(f"⚠️ View checkpoint failed: {e}")
+
+def run_reencryptor():
+    """Re-seal everything stored in plaintext or under an older key, then stop
+    
+    Keys only change on restart, so once a pass finds nothing left to do
+    there is nothing more for this process to catch up on.
+    """
+    total = 0
+    try:
+        while True:
+            done = STORE.reencrypt()
+            if not done:
+                break
+            total += done
+            time.sleep(0.05)  # Leave the database to requests between batches
+        total += CHUNKS.reseal()
+    except Exception as e:
+        print(f"⚠️ Re-encryption stopped: {e}")
+    if total:
+        print(f"🔐 Re-encrypted {total:,} stored items under key '{CIPHER.key_id}'")
+
+def recover_state():
+    """Reload every committed document, with metadata and history, from the store"""
+    global _synced_seq
+    started = time.perf_counter()
+    total = 0
+    for key, raw, metadata, history, seq, version in STORE.load():
+        doc = get_document(key, create=True)
+        doc.views_checkpoint = metadata.get("views", 0)
+        doc.views.reset(doc.views_checkpoint)
+        load_versions(doc)
+        # Keep the ETag and Last-Modified recorded for this version, without re-hashing it
+        etag, modified = stored_validators(doc, version)
+        snapshot = make_snapshot(version, raw, metadata, history, etag, modified)
+        if etag is None:
+            # Stored before version history existed: start it from the current data
+            digests, new_chunks = chunk_version(raw)
+            created = snapshot.modified.timestamp()
+            STORE.add_version(key, version, created, snapshot.etag, dict(snapshot.metadata), digests, new_chunks)
+            remember_version(doc, VersionRecord(version, created, snapshot.etag, snapshot.metadata, digests))
+        
+        doc.snapshot = snapshot
+        doc.seq = seq
+        _synced_seq = max(_synced_seq, seq)
+        if len(raw) >= COMPRESS_MIN_SIZE:
+            _COMPRESSOR.submit(compress_version, doc, doc.snapshot)
+        total += len(raw)
+    STORE.collect_chunks(CHUNKS.digests())
+    if total or len(DOCUMENTS) > 1:
+        print(f"💾 Restored {len(DOCUMENTS)} documents ({total:,} bytes) from {STORAGE_BACKEND} "
+              f"storage in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+# ========================
+# SHARED STATE (pre-forked workers)
+# ========================
+class SharedVersion:
+    """Highest storage sequence number committed by any worker process
+    
+    Lives in shared memory allocated before the workers fork. Writers
+    publish after their SQLite commit; readers compare it against the
+    last sequence they synced, which costs one memory read per request.
+    """
+    
+    def __init__(self, value=0):
+        self._shared = multiprocessing.Value("q", value)
+        self._counter = self._shared.get_obj()  # Unlocked view for readers
+    
+    @property
+    def value(self):
+        return self._counter.value
+    
+    def publish(self, seq):
+        with self._shared.get_lock():
+            if seq > self._counter.value:
+                self._counter.value = seq
+
+# Set by run_prefork(); None while serving from a single process
+SHARED_VERSION = None
+# Last shared sequence number this process has caught up with
+_synced_seq = 0
+_SYNC_LOCK = threading.Lock()
+# Serializes view checkpoints with clears
+_VIEWS_LOCK = threading.Lock()
+
+def sync_documents():
+    """Load the versions other worker processes committed since we last looked
+    
+    Only documents whose stored sequence is ahead of ours are read back.
+    If another thread is already syncing, the caller serves what this
+    process has rather than waiting.
+    """
+    global _synced_seq
+    if SHARED_VERSION is None:
+        return
+    target = SHARED_VERSION.value
+    if target <= _synced_seq or not _SYNC_LOCK.acquire(blocking=False):
+        return
+    try:
+        stale = []
+        for key, seq in STORE.changed_since(_synced_seq):
+            doc = DOCUMENTS.get(key)
+            if doc is None or seq > doc.seq:
+                stale.append(key)
+        for key, raw, metadata, history, seq, version in STORE.load(stale):
+            doc = get_document(key, create=True)
+            with doc.lock:
+                if seq <= doc.seq:
+                    continue  # This process wrote something newer meanwhile
+                load_versions(doc, doc.versions[-1].number if doc.versions else 0)
+                etag, modified = stored_validators(doc, version)
+                doc.snapshot = make_snapshot(version, raw, metadata, history, etag, modified)
+                doc.seq = seq
+                WATCH_HUB.publish(doc, doc.snapshot)
+                if len(raw) >= COMPRESS_MIN_SIZE:
+                    _COMPRESSOR.submit(compress_version, doc, doc.snapshot)
+        _synced_seq = target
+    finally:
+        _SYNC_LOCK.release()
+
+def _after_fork_in_child():
+    """Give a forked worker its own compression thread"""
+    global _COMPRESSOR
+    _COMPRESSOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compress")
+    for doc in list(DOCUMENTS.values()):
+        snapshot = doc.snapshot
+        if doc.compressed[0] != snapshot.version and len(snapshot.raw) >= COMPRESS_MIN_SIZE:
+            _COMPRESSOR.submit(compress_version, doc, snapshot)
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+# ========================
+# CHANGE NOTIFICATIONS
+# ========================
+_SSE_HEAD = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/event-stream; charset=utf-8\r\n"
+    b"Cache-Control: no-cache\r\n"
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"X-Accel-Buffering: no\r\n"
+    b"Connection: close\r\n\r\n"
+    b"retry: 3000\n\n"
+)
+_SSE_KEEPALIVE = b": keepalive\n\n"
+
+def watch_payload(doc, snapshot):
+    """JSON announcement of a version: key, version id, ETag and metadata"""
+    return json.dumps({
+        "key": doc.key,
+        "version": snapshot.version,
+        "etag": snapshot.etag,
+        "metadata": dict(snapshot.metadata),
+        "url": doc.url
+    }).encode("utf-8")
+
+def sse_event(version, payload):
+    """One server-sent "change" event; the version doubles as the event id"""
+    return b"id: %d\nevent: change\ndata: %s\n\n" % (version, payload)
+
+def poll_response(version, payload=None):
+    """Complete HTTP response for a long poll: the new version, or 304 on timeout"""
+    if payload is None:
+        status, body = b"304 Not Modified", b""
+    else:
+        status, body = b"200 OK", payload
+    return (
+        b"HTTP/1.1 %s\r\n"
+        b"Content-Type: application/json\r\n"
+        b"Content-Length: %d\r\n"
+        b"Cache-Control: no-store\r\n"
+        b"Access-Control-Allow-Origin: *\r\n"
+        b"X-Version: %d\r\n"
+        b"Connection: close\r\n\r\n" % (status, len(body), version)
+    ) + body
+
+class Watcher:
+    """One parked /raw/watch client: an SSE stream or a pending long poll"""
+    __slots__ = ("key", "stream", "since", "deadline", "sock", "out", "closing")
+    
+    def __init__(self, key, stream, since, deadline=None):
+        self.key = key
+        self.stream = stream
+        # Last version the client has seen (None: send the current one)
+        self.since = since
+        self.deadline = deadline
+        self.sock = None
+        self.out = bytearray()
+        self.closing = False
+
+class WatchHub:
+    """Serves every parked /raw/watch connection of this process from one thread
+    
+    Request threads validate a watch request and hand the socket over with
+    adopt(); commit_data() and sync_documents() call publish() after each
+    new version. The hub multiplexes all subscribers with a selector, so an
+    idle subscriber costs a file descriptor and a small buffer, not a
+    thread. The thread starts with the first parked client.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._selector = None
+        self._waker = None
+        # Work handed over by other threads: ("adopt", sock, watcher) or ("publish", doc, snapshot)
+        self._pending = deque()
+        # Owned by the hub thread
+        self._subscribers = {}
+        self._deadlines = []
+        # Wakes request threads blocked in wait()
+        self.changed = threading.Condition()
+    
+    @property
+    def subscriber_count(self):
+        return sum(len(watchers) for watchers in list(self._subscribers.values()))
+    
+    def publish(self, doc, snapshot):
+        """Announce a new version to every watcher of the document"""
+        with self.changed:
+            self.changed.notify_all()
+        if self._thread is not None:
+            self._pending.append(("publish", doc, snapshot))
+            self._wake()
+    
+    def adopt(self, sock, watcher):
+        """Take ownership of a connected socket whose request asked to watch"""
+        with self._lock:
+            if self._thread is None:
+                self._start()
+        self._pending.append(("adopt", sock, watcher))
+        self._wake()
+    
+    def wait(self, doc, since, timeout):
+        """Block until the document moves past version `since`; the new snapshot, or None on timeout
+        
+        Used for servers that cannot hand connections to the hub, at the
+        cost of a thread per waiting client.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            sync_documents()
+            snapshot = doc.snapshot
+            if snapshot.version != since:
+                return snapshot
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            if SHARED_VERSION is not None:
+                remaining = min(remaining, WATCH_POLL_INTERVAL)
+            with self.changed:
+                if doc.snapshot is snapshot:
+                    self.changed.wait(remaining)
+    
+    def _start(self):
+        # Each subscriber holds a descriptor: lift the soft limit as far as allowed
+        try:
+            soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+        self._selector = selectors.DefaultSelector()
+        self._waker = socket.socketpair()
+        for end in self._waker:
+            end.setblocking(False)
+        self._selector.register(self._waker[0], selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._run, name="watch-hub", daemon=True)
+        self._thread.start()
+    
+    def _wake(self):
+        try:
+            self._waker[1].send(b"\0")
+        except BlockingIOError:
+            pass  # Already signalled
+    
+    def _run(self):
+        next_ping = time.monotonic() + WATCH_KEEPALIVE
+        while True:
+            try:
+                timeout = next_ping - time.monotonic()
+                if self._deadlines:
+                    timeout = min(timeout, self._deadlines[0][0] - time.monotonic())
+                if SHARED_VERSION is not None:
+                    timeout = min(timeout, WATCH_POLL_INTERVAL)
+                for key, mask in self._selector.select(max(timeout, 0)):
+                    if key.data is None:
+                        try:
+                            self._waker[0].recv(4096)
+                        except BlockingIOError:
+                            pass
+                    else:
+                        self._on_ready(key.data, mask)
+                sync_documents()  # Another worker's commit comes back through publish()
+                while self._pending:
+                    item = self._pending.popleft()
+                    if item[0] == "adopt":
+                        self._register(item[1], item[2])
+                    else:
+                        self._notify(item[1], item[2])
+                now = time.monotonic()
+                self._expire(now)
+                if now >= next_ping:
+                    for watchers in list(self._subscribers.values()):
+                        for watcher in list(watchers):
+                            if watcher.stream:
+                                self._send(watcher, _SSE_KEEPALIVE)
+                    next_ping = now + WATCH_KEEPALIVE
+            except Exception as e:
+                print(f"⚠️ Watch hub error: {e}")
+    
+    def _register(self, sock, watcher):
+        sock.setblocking(False)
+        watcher.sock = sock
+        self._selector.register(sock, selectors.EVENT_READ, watcher)
+        self._subscribers.setdefault(watcher.key, set()).add(watcher)
+        if watcher.stream:
+            self._send(watcher, _SSE_HEAD)
+        else:
+            heapq.heappush(self._deadlines, (watcher.deadline, id(watcher), watcher))
+        
+        # A version committed while the request was being handed over
+        doc = get_document(watcher.key)
+        if doc is not None and doc.snapshot.version != watcher.since:
+            self._deliver(watcher, doc.snapshot.version, watch_payload(doc, doc.snapshot))
+    
+    def _notify(self, doc, snapshot):
+        payload = None
+        for watcher in list(self._subscribers.get(doc.key, ())):
+            if watcher.since != snapshot.version:
+                payload = payload or watch_payload(doc, snapshot)
+                self._deliver(watcher, snapshot.version, payload)
+    
+    def _deliver(self, watcher, version, payload):
+        watcher.since = version
+        if watcher.stream:
+            self._send(watcher, sse_event(version, payload))
+        else:
+            self._finish(watcher, poll_response(version, payload))
+    
+    def _expire(self, now):
+        while self._deadlines and self._deadlines[0][0] <= now:
+            watcher = heapq.heappop(self._deadlines)[2]
+            if watcher.sock is not None and not watcher.closing:
+                self._finish(watcher, poll_response(watcher.since))
+    
+    def _finish(self, watcher, response):
+        """Send a final response, then close the connection once it is out"""
+        self._subscribers.get(watcher.key, set()).discard(watcher)
+        watcher.closing = True
+        self._send(watcher, response)
+    
+    def _on_ready(self, watcher, mask):
+        if mask & selectors.EVENT_READ:
+            try:
+                if not watcher.sock.recv(4096):
+                    self._drop(watcher)  # Client went away
+                    return
+            except BlockingIOError:
+                pass
+            except OSError:
+                self._drop(watcher)
+                return
+        if mask & selectors.EVENT_WRITE:
+            self._flush(watcher)
+    
+    def _send(self, watcher, data):
+        if watcher.sock is None:
+            return
+        watcher.out += data
+        if len(watcher.out) > WATCH_MAX_BACKLOG:
+            self._drop(watcher)  # Not reading; don't buffer for it forever
+        else:
+            self._flush(watcher)
+    
+    def _flush(self, watcher):
+        try:
+            sent = watcher.sock.send(watcher.out)
+            del watcher.out[:sent]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self._drop(watcher)
+            return
+        if watcher.out:
+            self._selector.modify(watcher.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, watcher)
+        elif watcher.closing:
+            self._drop(watcher)
+        else:
+            self._selector.modify(watcher.sock, selectors.EVENT_READ, watcher)
+    
+    def _drop(self, watcher):
+        self._subscribers.get(watcher.key, set()).discard(watcher)
+        if not self._subscribers.get(watcher.key, True):
+            del self._subscribers[watcher.key]
+        sock, watcher.sock = watcher.sock, None
+        if sock is not None:
+            self._selector.unregister(sock)
+            sock.close()
+
+WATCH_HUB = WatchHub()
+
+# ========================
+# PATCHES
+# ========================
+class PatchError(ValueError):
+    """A PATCH that cannot be applied; status is the HTTP status to answer with"""
+    
+    def __init__(self, message, status=422):
+        super().__init__(message)
+        self.status = status
+
+def append_text(snapshot, text):
+    """Append text; only the new bytes are encoded"""
+    return snapshot.text() + text, snapshot.raw + text.encode("utf-8")
+
+def replace_lines(snapshot, first, last, text):
+    """Replace lines first..last (1-based, inclusive) with text
+    
+    An empty text deletes the lines. Only the lines up to `last` are
+    scanned; the rest of the document is copied, not inspected.
+    """
+    data = snapshot.text()
+    if first < 1 or last < first:
+        raise PatchError(f"Invalid line range {first}-{last}", 400)
+    
+    # start: first character of line `first`; end: just past line `last` and its newline
+    start = 0
+    for _ in range(first - 1):
+        newline = data.find("\n", start)
+        if newline < 0:
+            raise PatchError(f"Line {first} is past the end of the document", 416)
+        start = newline + 1
+    end = start
+    for line in range(first, last + 1):
+        newline = data.find("\n", end)
+        if newline < 0:
+            if line < last:
+                raise PatchError(f"Line {last} is past the end of the document", 416)
+            end = len(data)
+        else:
+            end = newline + 1
+    
+    if text:
+        if data[end - 1:end] == "\n" and not text.endswith("\n"):
+            text += "\n"
+    elif end == len(data) and start and not data.endswith("\n"):
+        start -= 1  # Deleting an unterminated last line: drop the newline before it instead
+    return data[:start] + text + data[end:], None
+
+def _pointer_tokens(pointer):
+    """Split an RFC 6901 JSON Pointer into unescaped reference tokens"""
+    if pointer == "":
+        return []
+    if not isinstance(pointer, str) or not pointer.startswith("/"):
+        raise PatchError(f"Invalid JSON Pointer: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+def _array_index(container, token, allow_end=False):
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise PatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise PatchError(f"Array index {index} out of range")
+    return index
+
+def _parent(document, pointer):
+    """(container, last token) for a pointer that must not be the root"""
+    tokens = _pointer_tokens(pointer)
+    if not tokens:
+        raise PatchError("Operation needs a non-root path")
+    container = _resolve(document, tokens[:-1], pointer)
+    if not isinstance(container, (dict, list)):
+        raise PatchError(f"Parent of {pointer} is not a container")
+    return container, tokens[-1]
+
+def _resolve(document, tokens, pointer):
+    value = document
+    for token in tokens:
+        if isinstance(value, dict) and token in value:
+            value = value[token]
+        elif isinstance(value, list):
+            value = value[_array_index(value, token)]
+        else:
+            raise PatchError(f"Path not found: {pointer}")
+    return value
+
+def _add(document, pointer, value):
+    if pointer == "":
+        return value
+    container, token = _parent(document, pointer)
+    if isinstance(container, list):
+        container.insert(_array_index(container, token, allow_end=True), value)
+    else:
+        container[token] = value
+    return document
+
+def _remove(document, pointer):
+    container, token = _parent(document, pointer)
+    if isinstance(container, list):
+        return container.pop(_array_index(container, token))
+    if token not in container:
+        raise PatchError(f"Path not found: {pointer}")
+    return container.pop(token)
+
+def _replace(document, pointer, value):
+    """Replace an existing value in place, so object keys keep their order"""
+    if pointer == "":
+        return value
+    container, token = _parent(document, pointer)
+    if isinstance(container, list):
+        container[_array_index(container, token)] = value
+    elif token in container:
+        container[token] = value
+    else:
+        raise PatchError(f"Path not found: {pointer}")
+    return document
+
+def _json_equal(a, b):
+    """RFC 6902 equality: like ==, except that booleans never equal numbers"""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(_json_equal(a[key], b[key]) for key in a)
+    if isinstance(a, list):
+        return isinstance(b, list) and len(a) == len(b) and all(map(_json_equal, a, b))
+    return a == b
+
+def apply_json_patch(document, operations):
+    """Apply an RFC 6902 JSON Patch to a parsed document and return the result"""
+    if not isinstance(operations, list):
+        raise PatchError("A JSON Patch must be an array of operations", 400)
+    for operation in operations:
+        if not isinstance(operation, dict) or "path" not in operation:
+            raise PatchError(f"Malformed operation: {operation!r}", 400)
+        op, path = operation.get("op"), operation["path"]
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise PatchError(f"'{op}' needs a value", 400)
+        if op in ("move", "copy") and "from" not in operation:
+            raise PatchError(f"'{op}' needs a from", 400)
+        
+        if op == "add":
+            document = _add(document, path, operation["value"])
+        elif op == "remove":
+            _remove(document, path)
+        elif op == "replace":
+            document = _replace(document, path, operation["value"])
+        elif op == "move":
+            if path.startswith(operation["from"] + "/"):
+                raise PatchError("Cannot move a value into itself")
+            if path != operation["from"]:
+                document = _add(document, path, _remove(document, operation["from"]))
+        elif op == "copy":
+            value = _resolve(document, _pointer_tokens(operation["from"]), operation["from"])
+            document = _add(document, path, json.loads(json.dumps(value)))
+        elif op == "test":
+            if not _json_equal(_resolve(document, _pointer_tokens(path), path), operation["value"]):
+                raise PatchError(f"Test failed at {path}", 409)
+        else:
+            raise PatchError(f"Unknown operation: {op!r}", 400)
+    return document
+
+def apply_merge_patch(target, patch):
+    """Apply an RFC 7396 JSON Merge Patch and return the result"""
+    if not isinstance(patch, dict):
+        return patch
+    if not isinstance(target, dict):
+        target = {}
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        else:
+            target[key] = apply_merge_patch(target.get(key), value)
+    return target
+
+# First indented line of a pretty-printed document, and a compact key separator
+_JSON_INDENT = re.compile(r"\n([ \t]+)\S")
+_JSON_SPACED_KEY = re.compile(r'"\s*:\s')
+
+def patch_json(snapshot, apply, patch):
+    """Apply a JSON patch function to a JSON document, keeping its layout style
+    
+    The result is re-serialized with the original's indent unit (or, when
+    it is on one line, its separator spacing), key order and surrounding
+    whitespace such as a trailing newline. Other formatting, like aligned
+    values or escapes, is normalized.
+    """
+    data = snapshot.text()
+    try:
+        document = json.loads(data)
+    except ValueError:
+        raise PatchError("Document is not valid JSON")
+    result = apply(document, patch)
+    
+    body = data.strip()
+    head = body[:SNIFF_CHARS]
+    indented = _JSON_INDENT.search(head)
+    if indented:
+        text = json.dumps(result, indent=indented.group(1), ensure_ascii=False)
+    else:
+        key_separator = ": " if _JSON_SPACED_KEY.search(head) else ":"
+        item_separator = ", " if key_separator == ": " else ","
+        text = json.dumps(result, separators=(item_separator, key_separator), ensure_ascii=False)
+    leading = data[:len(data) - len(data.lstrip())]
+    return leading + text + data[len(leading) + len(body):], None
+
+# ========================
+# JSON PATHS
+# ========================
+# One step of a dotted path: .name (or a leading name), [3] or ["quoted.key"]
+_PATH_STEP = re.compile(r'(?:^|\.)([^.\[\]]+)|\[(\d+)\]|\[("(?:[^"\\]|\\.)*")\]')
+
+def json_path_tokens(path):
+    """Reference tokens of a JSON Pointer ("/a/b/3/c") or a dotted path ("a.b[3].c", 'a["x.y"]')"""
+    if path == "" or path.startswith("/"):
+        return _pointer_tokens(path)
+    tokens, position = [], 0
+    while position < len(path):
+        match = _PATH_STEP.match(path, position)
+        if match is None:
+            raise ValueError(f"Invalid path {path!r} at offset {position}")
+        name, index, quoted = match.groups()
+        tokens.append(name if name is not None else index if index is not None else json.loads(quoted))
+        position = match.end()
+    return tokens
+
+def json_pointer(tokens):
+    """RFC 6901 JSON Pointer for a list of reference tokens"""
+    return "".join("/" + token.replace("~", "~0").replace("/", "~1") for token in tokens)
+
+class JsonTree:
+    """Parsed payload of one JSON version and the subtrees served from it
+    
+    Paths are normalized to JSON Pointers, resolved with one dict or list
+    lookup per token, and the serialized subtree is cached under the
+    pointer, so a repeated query is a single dict hit. The cache holds at
+    most JSON_PATH_CACHE_SIZE bytes; the oldest entries make room.
+    """
+    
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()  # Guards the cache and its size
+        self.subtrees = {}  # (pointer, compact) -> bytes
+        self.cached_bytes = 0
+    
+    def serialized(self, pointer, tokens, compact):
+        """Serialized subtree at tokens; raises PatchError if the path does not exist"""
+        body = self.subtrees.get((pointer, compact))
+        METRICS.cache("json_path", body is not None)
+        if body is not None:
+            return body
+        value = _resolve(self.root, tokens, pointer)
+        try:
+            body = encode_json(value, compact)
+        except TypeError:  # orjson refuses integers past 64 bits
+            body = json.dumps(
+                value, ensure_ascii=False, indent=None if compact else 2, separators=(",", ":") if compact else None
+            ).encode("utf-8")
+        if len(body) <= JSON_PATH_CACHE_SIZE:
+            with self.lock:
+                while self.cached_bytes + len(body) > JSON_PATH_CACHE_SIZE:
+                    self.cached_bytes -= len(self.subtrees.pop(next(iter(self.subtrees))))
+                if (pointer, compact) not in self.subtrees:
+                    self.subtrees[(pointer, compact)] = body
+                    self.cached_bytes += len(body)
+        return body
+
+def json_tree(doc, snapshot):
+    """JsonTree of a snapshot, parsed at most once per version; None if it is not JSON"""
+    version, tree = doc.json_tree
+    METRICS.cache("json_tree", version == snapshot.version)
+    if version != snapshot.version:
+        checked_version, label = doc.format_check
+        tree = None
+        if snapshot.metadata["format"] == "json" and (checked_version != snapshot.version or label == "json"):
+            try:
+                # json, not orjson: orjson reads integers past 64 bits as floats
+                tree = JsonTree(json.loads(snapshot.raw))
+            except ValueError:
+                pass
+        if snapshot is doc.snapshot:
+            doc.json_tree = (snapshot.version, tree)
+    return tree
+
+# ========================
+# STORAGE BACKENDS
+# ========================
+class MemoryStore:
+    """Keeps nothing between runs"""
+    # Version numbers start over on every run, so they do not name one payload forever
+    durable = False
+    
+    def load(self, keys=None):
+        return []
+    
+    def changed_since(self, seq):
+        return []
+    
+    def commit(self, key, raw, metadata, history_entry=None, reset_views=False, version=None):
+        return 0, None
+    
+    def add_views(self, key, delta):
+        return None
+    
+    def load_versions(self, key, after=0):
+        return []
+    
+    def load_chunks(self, digests):
+        return {}
+    
+    def add_version(self, key, number, created, etag, metadata, digests, new_chunks):
+        pass
+    
+    def collect_chunks(self, live):
+        pass
+    
+    def load_session(self, user_id, cutoff):
+        return None
+    
+    def save_session(self, user_id, fields, touched):
+        pass
+    
+    def expire_sessions(self, cutoff):
+        pass
+    
+    def reencrypt(self, limit=REENCRYPT_BATCH):
+        return 0
+
+class SQLiteStore:
+    """Durable store backed by a SQLite database in WAL mode
+    
+    The current version of each document is one row, so recovering it
+    does not depend on how many writes came before. Past versions live in
+    the versions table as lists of chunk digests, and each distinct chunk
+    is stored once in the chunks table. SQLite replays its own WAL tail
+    on open after a crash.
+    
+    Every commit stamps its row with a sequence number that increases
+    across documents, so pre-forked workers sharing the database can ask
+    which documents changed since the last sequence they saw.
+    
+    With a cipher, payloads, history entries and chunks are stored as
+    EnvelopeCipher envelopes and their key_id column names the key (NULL
+    for plaintext). Payloads are streamed through SQLite's incremental
+    blob I/O one segment at a time in both directions.
+    """
+    durable = True
+    
+    def __init__(self, path, cipher=None):
+        self.path = path
+        self.cipher = cipher
+        self.lock = threading.Lock()
+        self.conn = self._connect()
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "key TEXT PRIMARY KEY, data BLOB NOT NULL, metadata TEXT NOT NULL, "
+                "seq INTEGER NOT NULL DEFAULT 0, version INTEGER NOT NULL DEFAULT 1)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS document_history ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, entry TEXT NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS document_history_key ON document_history (key, id)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS versions ("
+                "key TEXT NOT NULL, number INTEGER NOT NULL, created REAL NOT NULL, etag TEXT NOT NULL, "
+                "metadata TEXT NOT NULL, chunks BLOB NOT NULL, PRIMARY KEY (key, number))"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS chunks (digest BLOB PRIMARY KEY, data BLOB NOT NULL)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "user_id INTEGER PRIMARY KEY, fields TEXT NOT NULL, touched REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS sessions_touched ON sessions (touched)")
+            self._migrate_single_document()
+            self._migrate_columns()
+        os.register_at_fork(after_in_child=self._reopen)
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Read payloads through a shared memory map instead of copying pages in
+        conn.execute("PRAGMA mmap_size=268435456")
+        if self.cipher is not None:
+            # Zero freed pages, so re-sealed plaintext does not linger in the file
+            conn.execute("PRAGMA secure_delete=ON")
+        return conn
+    
+    def _reopen(self):
+        """Give a forked child its own connection; SQLite handles must not cross fork"""
+        self._inherited = self.conn  # Kept, not closed: closing would touch the parent's locks
+        self.lock = threading.Lock()
+        self.conn = self._connect()
+    
+    def _migrate_single_document(self):
+        """Move data from the single-document schema into the default key"""
+        tables = {name for (name,) in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "current" in tables:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO documents (key, data, metadata) "
+                "SELECT ?, data, metadata FROM current WHERE id = 1", (DEFAULT_KEY,)
+            )
+            self.conn.execute("DROP TABLE current")
+        if "history" in tables:
+            self.conn.execute(
+                "INSERT INTO document_history (key, entry) SELECT ?, entry FROM history ORDER BY id",
+                (DEFAULT_KEY,)
+            )
+            self.conn.execute("DROP TABLE history")
+    
+    def _migrate_columns(self):
+        """Add the sequence, version and key_id columns to databases created before them"""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(documents)")}
+        if "seq" not in columns:
+            self.conn.execute("ALTER TABLE documents ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+        if "version" not in columns:
+            self.conn.execute("ALTER TABLE documents ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS documents_seq ON documents (seq)")
+        for table in ("documents", "document_history", "chunks"):
+            if "key_id" not in {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN key_id TEXT")
+    
+    def _cipher_for(self, key_id):
+        """The cipher to open data sealed with key_id"""
+        if self.cipher is None:
+            raise RuntimeError(f"Stored data is encrypted with key '{key_id}'; set ENCRYPTION_KEYS to read it")
+        return self.cipher
+    
+    def _open_payload(self, rowid, key, key_id):
+        """Decrypt a sealed documents.data blob a segment at a time into one bytes object
+        
+        Joining the segments instead would briefly hold the plaintext twice.
+        The BytesIO is sized once, filled in place, and getvalue() hands its
+        buffer over as bytes without copying it.
+        """
+        cipher = self._cipher_for(key_id)
+        with self.conn.blobopen("documents", "data", rowid, readonly=True) as blob:
+            size = cipher.plaintext_size(blob)
+            out = io.BytesIO()
+            if size:
+                out.seek(size - 1)
+                out.write(b"\0")
+            with out.getbuffer() as buffer:
+                cipher.open_into(blob.read, buffer, key.encode("utf-8"))
+            return out.getvalue()
+    
+    def _write_payload(self, rowid, key, raw):
+        """Seal raw into the zeroblob reserved for it in documents.data, a segment at a time"""
+        with self.conn.blobopen("documents", "data", rowid) as blob:
+            for piece in self.cipher.seal_segments(raw, key.encode("utf-8")):
+                blob.write(piece)
+    
+    def _history_value(self, key, entry):
+        """(stored entry, key_id) for a history entry"""
+        text = json.dumps(entry)
+        if self.cipher is None:
+            return text, None
+        return self.cipher.seal(text.encode("utf-8"), key.encode("utf-8") + b"#history"), self.cipher.key_id
+    
+    def _history_entry(self, key, entry, key_id):
+        if key_id is not None:
+            entry = self._cipher_for(key_id).open(entry, key.encode("utf-8") + b"#history")
+        return json.loads(entry)
+    
+    def load(self, keys=None):
+        """Rows as (key, raw, metadata, history, seq, version); all documents unless keys is given"""
+        if keys is not None and not keys:
+            return []
+        where, params = "", ()
+        if keys is not None:
+            where, params = f" WHERE key IN ({', '.join('?' * len(keys))})", tuple(keys)
+        
+        with self.lock:
+            # One read transaction so data and history agree
+            self.conn.execute("BEGIN")
+            try:
+                # Sealed payloads are not selected whole; _open_payload streams them
+                rows = [
+                    (key, data if key_id is None else self._open_payload(rowid, key, key_id), metadata, seq, version)
+                    for key, data, metadata, seq, version, key_id, rowid in self.conn.execute(
+                        "SELECT key, CASE WHEN key_id IS NULL THEN data END, metadata, seq, version, key_id, rowid "
+                        f"FROM documents{where}", params
+                    ).fetchall()
+                ]
+                entries = self.conn.execute(
+                    f"SELECT key, entry, key_id FROM document_history{where} ORDER BY key, id", params
+                ).fetchall()
+            finally:
+                self.conn.commit()
+        
+        history = {}
+        for key, entry, key_id in entries:
+            history.setdefault(key, []).append(self._history_entry(key, entry, key_id))
+        return [
+            (key, data, json.loads(metadata), history.get(key, [])[-10:], seq, version)
+            for key, data, metadata, seq, version in rows
+        ]
+    
+    def changed_since(self, seq):
+        """(key, seq) of every document committed after sequence number seq"""
+        with self.lock:
+            return self.conn.execute("SELECT key, seq FROM documents WHERE seq > ?", (seq,)).fetchall()
+    
+    def commit(self, key, raw, metadata, history_entry=None, reset_views=False, version=None):
+        """Write a document's new version and return (sequence number, version number)
+        
+        The stored view count is kept (workers add to it independently)
+        unless reset_views is set. version, when given, is (created, etag,
+        chunk digests, chunks new to memory) for the version history.
+        """
+        sealed = self.cipher is not None
+        with self.lock, self.conn:
+            # A sealed payload gets a zeroblob of its final size, filled in below
+            seq, number, rowid = self.conn.execute(
+                "INSERT INTO documents (key, data, metadata, seq, version, key_id) "
+                f"VALUES (?, {'zeroblob(?)' if sealed else '?'}, ?, "
+                "(SELECT COALESCE(MAX(seq), 0) + 1 FROM documents), 1, ?) "
+                "ON CONFLICT (key) DO UPDATE SET data = excluded.data, seq = excluded.seq, "
+                "version = documents.version + 1, key_id = excluded.key_id, "
+                "metadata = json_set(excluded.metadata, '$.views', "
+                "CASE WHEN ? THEN 0 ELSE COALESCE(json_extract(documents.metadata, '$.views'), 0) END) "
+                "RETURNING seq, version, rowid",
+                (key, self.cipher.sealed_size(len(raw)) if sealed else raw, json.dumps(metadata),
+                 self.cipher.key_id if sealed else None, reset_views)
+            ).fetchone()
+            if sealed:
+                self._write_payload(rowid, key, raw)
+            if version is not None:
+                self._insert_version(key, number, metadata, *version)
+            if history_entry is not None:
+                self.conn.execute(
+                    "INSERT INTO document_history (key, entry, key_id) VALUES (?, ?, ?)",
+                    (key, *self._history_value(key, history_entry))
+                )
+                self.conn.execute(
+                    "DELETE FROM document_history WHERE key = ? AND id NOT IN "
+                    "(SELECT id FROM document_history WHERE key = ? ORDER BY id DESC LIMIT 10)",
+                    (key, key)
+                )
+        return seq, number
+    
+    def _insert_version(self, key, number, metadata, created, etag, digests, new_chunks):
+        # Chunks arrive as CHUNKS holds them: already sealed when there is a cipher
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO chunks (digest, data, key_id) VALUES (?, ?, ?)",
+            ((digest, data, self.cipher and self.cipher.blob_key_id(data)) for digest, data in new_chunks.items())
+        )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO versions (key, number, created, etag, metadata, chunks) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, number, created, etag, json.dumps(metadata), b"".join(digests))
+        )
+        self.conn.execute(
+            "DELETE FROM versions WHERE key = ? AND number <= ?", (key, number - HISTORY_VERSIONS)
+        )
+    
+    def add_version(self, key, number, created, etag, metadata, digests, new_chunks):
+        """Record one version outside a commit (seeding history for old databases)"""
+        with self.lock, self.conn:
+            self._insert_version(key, number, metadata, created, etag, digests, new_chunks)
+    
+    def load_versions(self, key, after=0):
+        """Stored versions of a document newer than `after`, oldest first"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT number, created, etag, metadata, chunks FROM versions "
+                "WHERE key = ? AND number > ? ORDER BY number",
+                (key, after)
+            ).fetchall()
+        return [
+            (number, created, etag, json.loads(metadata),
+             tuple(chunks[offset:offset + 32] for offset in range(0, len(chunks), 32)))
+            for number, created, etag, metadata, chunks in rows
+        ]
+    
+    def load_chunks(self, digests):
+        """{digest: data} for the given chunk digests, sealed if and only if there is a cipher"""
+        digests, found = list(digests), {}
+        with self.lock:
+            for offset in range(0, len(digests), 500):
+                batch = digests[offset:offset + 500]
+                for digest, data, key_id in self.conn.execute(
+                    f"SELECT digest, data, key_id FROM chunks WHERE digest IN ({', '.join('?' * len(batch))})", batch
+                ):
+                    if key_id is None and self.cipher is not None:
+                        data = self.cipher.seal(data, digest)  # Stored before encryption; reencrypt() catches up
+                    elif key_id is not None and self.cipher is None:
+                        self._cipher_for(key_id)
+                    found[digest] = data
+        return found
+    
+    def collect_chunks(self, live):
+        """Delete stored chunks that no retained version uses any more"""
+        with self.lock, self.conn:
+            dead = [
+                (digest,) for (digest,) in self.conn.execute("SELECT digest FROM chunks")
+                if digest not in live
+            ]
+            self.conn.executemany("DELETE FROM chunks WHERE digest = ?", dead)
+    
+    def add_views(self, key, delta):
+        """Add delta to a document's stored view count and return the new total"""
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "UPDATE documents SET metadata = json_set(metadata, '$.views', "
+                "COALESCE(json_extract(metadata, '$.views'), 0) + ?) WHERE key = ? "
+                "RETURNING json_extract(metadata, '$.views')",
+                (delta, key)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def load_session(self, user_id, cutoff):
+        """Stored fields of a bot session last changed after cutoff, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT fields FROM sessions WHERE user_id = ? AND touched > ?", (user_id, cutoff)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def save_session(self, user_id, fields, touched):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sessions (user_id, fields, touched) VALUES (?, ?, ?)",
+                (user_id, json.dumps(fields), touched)
+            )
+    
+    def expire_sessions(self, cutoff):
+        """Delete bot sessions not changed since cutoff"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM sessions WHERE touched <= ?", (cutoff,))
+    
+    def reencrypt(self, limit=REENCRYPT_BATCH):
+        """Re-seal up to `limit` rows of each table stored in plaintext or under an older key
+        
+        Returns how many rows were re-sealed. A payload is only replaced if
+        its document was not committed again in the meantime, so this can
+        run alongside writers (and in several workers at once).
+        """
+        cipher, current, done = self.cipher, self.cipher.key_id, 0
+        with self.lock:
+            documents = self.conn.execute(
+                "SELECT key, seq, key_id, rowid FROM documents WHERE key_id IS NOT ? LIMIT ?", (current, limit)
+            ).fetchall()
+        for key, seq, key_id, rowid in documents:
+            with self.lock, self.conn:
+                if key_id is None:
+                    (raw,) = self.conn.execute("SELECT data FROM documents WHERE rowid = ?", (rowid,)).fetchone()
+                else:
+                    raw = self._open_payload(rowid, key, key_id)
+                row = self.conn.execute(
+                    "UPDATE documents SET data = zeroblob(?), key_id = ? WHERE key = ? AND seq = ? RETURNING rowid",
+                    (cipher.sealed_size(len(raw)), current, key, seq)
+                ).fetchone()
+                if row is not None:
+                    self._write_payload(row[0], key, raw)
+                    done += 1
+        
+        with self.lock:
+            entries = self.conn.execute(
+                "SELECT id, key, entry, key_id FROM document_history WHERE key_id IS NOT ? LIMIT ?", (current, limit)
+            ).fetchall()
+            chunks = self.conn.execute(
+                "SELECT digest, data, key_id FROM chunks WHERE key_id IS NOT ? LIMIT ?", (current, limit)
+            ).fetchall()
+        updates = [
+            (*self._history_value(key, self._history_entry(key, entry, key_id)), id_, key_id)
+            for id_, key, entry, key_id in entries
+        ]
+        chunk_updates = [
+            (cipher.seal(data if key_id is None else cipher.open(data, digest), digest), current, digest, key_id)
+            for digest, data, key_id in chunks
+        ]
+        with self.lock, self.conn:
+            done += self.conn.executemany(
+                "UPDATE document_history SET entry = ?, key_id = ? WHERE id = ? AND key_id IS ?", updates
+            ).rowcount
+            done += self.conn.executemany(
+                "UPDATE chunks SET data = ?, key_id = ? WHERE digest = ? AND key_id IS ?", chunk_updates
+            ).rowcount
+        return done
+
+def make_store():
+    """Create the storage backend selected by STORAGE_BACKEND"""
+    if STORAGE_BACKEND == "memory":
+        return MemoryStore()
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteStore(STORAGE_PATH, CIPHER)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+STORE = make_store()
+STARTUP.phase("store")
+
+# ========================
+# SESSIONS
+# ========================
+class Session:
+    """What the bot remembers about one user between updates"""
+    __slots__ = ("username", "key", "waiting_for_data", "confirm_clear", "touched")
+    
+    FIELDS = ("username", "key", "waiting_for_data", "confirm_clear")
+    
+    def __init__(self, username="", key=DEFAULT_KEY, waiting_for_data=False, confirm_clear=False):
+        self.username = username
+        self.key = key
+        self.waiting_for_data = waiting_for_data
+        self.confirm_clear = confirm_clear
+        self.touched = time.monotonic()
+    
+    def fields(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+class SessionStore:
+    """Bot sessions by Telegram user id, bounded by an idle TTL and an LRU cap
+    
+    Sessions sit in an OrderedDict in least-recently-used order, so both
+    limits are enforced by popping from the front: memory stays at most
+    max_size records however many users have ever talked to the bot. With
+    a backing store, changes are written through and an evicted session
+    is reloaded on the user's next update.
+    
+    Bot handlers await the a* variants: the backing store shares its
+    connection lock with document commits, so its I/O runs on a worker
+    thread rather than stalling the event loop behind a large write.
+    """
+    
+    def __init__(self, ttl, max_size, backing=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.backing = backing
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_purge = 0
+    
+    def __len__(self):
+        return len(self._sessions)
+    
+    def __contains__(self, user_id):
+        # Memory only: a membership test never touches the backing store
+        return self._cached(user_id) is not None
+    
+    def get(self, user_id):
+        """The user's live session, or None"""
+        session = self._cached(user_id)
+        if session is not None or self.backing is None:
+            return session
+        fields = self.backing.load_session(user_id, time.time() - self.ttl)
+        if fields is None:
+            return None
+        session = Session(**{name: fields[name] for name in Session.FIELDS if name in fields})
+        with self._lock:
+            return self._insert(user_id, session)
+    
+    def key(self, user_id):
+        """Document key the user is working on"""
+        session = self.get(user_id)
+        return session.key if session is not None else DEFAULT_KEY
+    
+    def update(self, user_id, **fields):
+        """Set fields on the user's session, creating it if needed, and persist the change"""
+        session = self.get(user_id)
+        if session is None:
+            with self._lock:
+                session = self._insert(user_id, Session())
+        for name, value in fields.items():
+            setattr(session, name, value)
+        if self.backing is not None:
+            now = time.time()
+            self.backing.save_session(user_id, session.fields(), now)
+            if now >= self._next_purge:
+                self._next_purge = now + 3600
+                self.backing.expire_sessions(now - self.ttl)
+        return session
+    
+    async def aget(self, user_id):
+        session = self._cached(user_id)
+        if session is not None or self.backing is None:
+            return session  # In memory, nothing to offload
+        return await asyncio.to_thread(self.get, user_id)
+    
+    async def akey(self, user_id):
+        session = await self.aget(user_id)
+        return session.key if session is not None else DEFAULT_KEY
+    
+    async def aupdate(self, user_id, **fields):
+        if self.backing is None:
+            return self.update(user_id, **fields)
+        return await asyncio.to_thread(self.update, user_id, **fields)
+    
+    def _cached(self, user_id):
+        """The user's session if it is in memory and live, else None"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(user_id)
+            if session is not None:
+                session.touched = now
+                self._sessions.move_to_end(user_id)
+            return session
+    
+    def _insert(self, user_id, session):
+        session = self._sessions.setdefault(user_id, session)
+        self._sessions.move_to_end(user_id)
+        while len(self._sessions) > self.max_size:
+            self._sessions.popitem(last=False)
+        return session
+    
+    def _expire(self, now):
+        # The front is always the least recently touched session
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if now - session.touched < self.ttl:
+                break
+            del self._sessions[user_id]
+
+user_sessions = SessionStore(SESSION_TTL, SESSION_MAX, STORE if SESSION_PERSIST else None)
+
+# ========================
+# SERVER (Enhanced Endpoints)
+# ========================
+app = Flask(__name__)
+app.request_class = RoutedRequest
+app.wsgi_app = MetricsMiddleware(app.wsgi_app)
+
+# Dashboard template, compiled once at import (see HOME_TEMPLATE below)
+HOME_TEMPLATE_SOURCE = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>📁 RAW Data Viewer</title>
+        <meta name="viewport" content="width=device-width, initial-scale=1">
+        <meta charset="UTF-8">
+        <style>
+            :root {
+                --primary: #667eea;
+                --secondary: #764ba2;
+                --success: #10b981;
+                --info: #3b82f6;
+                --warning: #f59e0b;
+                --danger: #ef4444;
+            }
+            
+            * {
+                margin: 0;
+                padding: 0;
+                box-sizing: border-box;
+            }
+            
+            body {
+                font-family: 'Segoe UI', system-ui, sans-serif;
+                background: linear-gradient(135deg, var(--primary) 0%, var(--secondary) 100%);
+                min-height: 100vh;
+                color: #333;
+                padding: 20px;
+            }
+            
+            .container {
+                max-width: 1200px;
+                margin: 0 auto;
+            }
+            
+            header {
+                text-align: center;
+                margin-bottom: 30px;
+                padding: 20px;
+                background: rgba(255, 255, 255, 0.95);
+                border-radius: 20px;
+                box-shadow: 0 10px 30px rgba(0, 0, 0, 0.1);
+            }
+            
+            h1 {
+                color: var(--primary);
+                font-size: 2.5rem;
+                margin-bottom: 10px;
+                display: flex;
+                align-items: center;
+                justify-content: center;
+                gap: 15px;
+            }
+            
+            h1::before {
+                content: '📁';
+                font-size: 3rem;
+            }
+            
+            .subtitle {
+                color: #666;
+                font-size: 1.1rem;
+                margin-bottom: 20px;
+            }
+            
+            .dashboard {
+                display: grid;
+                grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
+                gap: 20px;
+                margin-bottom: 30px;
+            }
+            
+            .card {
+                background: rgba(255, 255, 255, 0.95);
+                padding: 25px;
+                border-radius: 15px;
+                box-shadow: 0 5px 20px rgba(0, 0, 0, 0.08);
+                transition: transform 0.3s, box-shadow 0.3s;
+            }
+            
+            .card:hover {
+                transform: translateY(-5px);
+                box-shadow: 0 15px 30px rgba(0, 0, 0, 0.15);
+            }
+            
+            .card h3 {
+                color: var(--primary);
+                margin-bottom: 15px;
+                display: flex;
+                align-items: center;
+                gap: 10px;
+            }
+            
+            .stat-grid {
+                display: grid;
+                grid-template-columns: repeat(2, 1fr);
+                gap: 15px;
+            }
+            
+            .stat-item {
+                text-align: center;
+                padding: 15px;
+                background: rgba(102, 126, 234, 0.1);
+                border-radius: 10px;
+            }
+            
+            .stat-value {
+                font-size: 1.8rem;
+                font-weight: bold;
+                color: var(--primary);
+                display: block;
+            }
+            
+            .stat-label {
+                font-size: 0.9rem;
+                color: #666;
+                margin-top: 5px;
+            }
+            
+            .data-container {
+                background: rgba(255, 255, 255, 0.95);
+                border-radius: 15px;
+                padding: 30px;
+                margin-bottom: 30px;
+                box-shadow: 0 5px 20px rgba(0, 0, 0, 0.08);
+            }
+            
+            .viewer {
+                position: relative;
+                background: #f8f9fa;
+                border-radius: 10px;
+                border: 1px solid #e9ecef;
+                height: 500px;
+                overflow: auto;
+                font-family: 'Monaco', 'Menlo', 'Ubuntu Mono', monospace;
+                font-size: 14px;
+            }
+            
+            .viewer-lines {
+                position: absolute;
+                top: 0;
+                left: 0;
+                min-width: 100%;
+                padding: 0 20px;
+                white-space: pre;
+            }
+            
+            .viewer-lines div {
+                height: 21px;
+                line-height: 21px;
+            }
+            
+            .viewer-lines .ln {
+                display: inline-block;
+                min-width: 4em;
+                margin-right: 1.5em;
+                text-align: right;
+                color: #adb5bd;
+                user-select: none;
+            }
+            
+            .viewer-status {
+                margin-top: 10px;
+                color: #666;
+                font-size: 0.9rem;
+            }
+            
+            .empty-data {
+                text-align: center;
+                color: #666;
+                padding: 40px;
+                font-size: 1.2rem;
+            }
+            
+            .empty-data::before {
+                content: '📭';
+                font-size: 3rem;
+                display: block;
+                margin-bottom: 15px;
+            }
+            
+            .actions {
+                display: flex;
+                flex-wrap: wrap;
+                gap: 15px;
+                justify-content: center;
+                margin-top: 30px;
+            }
+            
+            .btn {
+                padding: 12px 24px;
+                border: none;
+                border-radius: 10px;
+                font-size: 1rem;
+                font-weight: 600;
+                cursor: pointer;
+                transition: all 0.3s;
+                text-decoration: none;
+                display: inline-flex;
+                align-items: center;
+                gap: 10px;
+                color: white;
+            }
+            
+            .btn-primary {
+                background: var(--primary);
+            }
+            
+            .btn-primary:hover {
+                background: #5a6fd8;
+                transform: translateY(-2px);
+            }
+            
+            .btn-success {
+                background: var(--success);
+            }
+            
+            .btn-success:hover {
+                background: #0da271;
+                transform: translateY(-2px);
+            }
+            
+            .btn-info {
+                background: var(--info);
+            }
+            
+            .btn-info:hover {
+                background: #2563eb;
+                transform: translateY(-2px);
+            }
+            
+            .btn-warning {
+                background: var(--warning);
+            }
+            
+            .btn-warning:hover {
+                background: #e59409;
+                transform: translateY(-2px);
+            }
+            
+            footer {
+                text-align: center;
+                margin-top: 40px;
+                color: rgba(255, 255, 255, 0.8);
+                font-size: 0.9rem;
+            }
+            
+            .copy-btn {
+                position: absolute;
+                top: 10px;
+                right: 10px;
+                background: var(--primary);
+                color: white;
+                border: none;
+                padding: 8px 15px;
+                border-radius: 5px;
+                cursor: pointer;
+                font-size: 0.9rem;
+            }
+            
+            .url-display {
+                background: #f8f9fa;
+                padding: 15px;
+                border-radius: 10px;
+                margin: 20px 0;
+                position: relative;
+                border: 1px solid #e9ecef;
+                font-family: monospace;
+                word-break: break-all;
+            }
+            
+            @media (max-width: 768px) {
+                h1 {
+                    font-size: 2rem;
+                }
+                
+                .dashboard {
+                    grid-template-columns: 1fr;
+                }
+                
+                .btn {
+                    width: 100%;
+                    justify-content: center;
+                }
+                
+                .actions {
+                    flex-direction: column;
+                }
+            }
+        </style>
+        <script>
+            function copyToClipboard(text) {
+                navigator.clipboard.writeText(text).then(() => {
+                    alert('URL copied to clipboard!');
+                });
+            }
+            
+            // Virtualized viewer: only the rows in view are in the DOM, and pages
+            // of lines beyond the embedded first one are fetched from ?lines=a-b
+            // as they scroll into view (the oldest are dropped past MAX_PAGES).
+            function startViewer() {
+                const viewer = document.getElementById('viewer');
+                if (!viewer) {
+                    return;
+                }
+                const info = JSON.parse(document.getElementById('viewer-data').textContent);
+                const LINE_HEIGHT = 21, MAX_HEIGHT = 10000000, OVERSCAN = 20, MAX_PAGES = 50, MAX_LINE = 10000;
+                const spacer = viewer.querySelector('.viewer-spacer');
+                const rows = viewer.querySelector('.viewer-lines');
+                const status = document.getElementById('viewer-status');
+                const pages = new Map();
+                const loading = new Set();
+                const height = Math.min(info.total * LINE_HEIGHT, MAX_HEIGHT);
+                let changed = false, frame = 0;
+                spacer.style.height = height + 'px';
+                
+                function lineAt(index) {
+                    if (index < info.lines.length) {
+                        return info.lines[index];
+                    }
+                    const page = Math.floor(index / info.page);
+                    const lines = pages.get(page);
+                    if (lines === undefined) {
+                        load(page);
+                        return null;
+                    }
+                    return lines[index - page * info.page];
+                }
+                
+                function load(page) {
+                    if (loading.has(page)) {
+                        return;
+                    }
+                    loading.add(page);
+                    const first = page * info.page + 1;
+                    fetch(`${info.url}?lines=${first}-${first + info.page - 1}`).then(response => {
+                        if (response.headers.get('X-Version') !== String(info.version)) {
+                            changed = true;
+                        }
+                        return response.text();
+                    }).then(text => {
+                        const lines = text.split('\\n');
+                        if (text.endsWith('\\n')) {
+                            lines.pop();
+                        }
+                        pages.set(page, lines);
+                        if (pages.size > MAX_PAGES) {
+                            pages.delete(pages.keys().next().value);
+                        }
+                    }).finally(() => {
+                        loading.delete(page);
+                        render();
+                    });
+                }
+                
+                function render() {
+                    const visible = Math.ceil(viewer.clientHeight / LINE_HEIGHT);
+                    let first, top;
+                    if (height < MAX_HEIGHT) {
+                        first = Math.floor(viewer.scrollTop / LINE_HEIGHT);
+                        top = first * LINE_HEIGHT;
+                    } else {
+                        // Too many lines for one scrollable element: scroll position maps to a fraction of them
+                        const fraction = viewer.scrollTop / Math.max(1, height - viewer.clientHeight);
+                        first = Math.floor(fraction * Math.max(0, info.total - visible));
+                        top = viewer.scrollTop;
+                    }
+                    const last = Math.min(info.total, first + visible + OVERSCAN);
+                    const fragment = document.createDocumentFragment();
+                    for (let index = first; index < last; index++) {
+                        const row = document.createElement('div');
+                        const number = document.createElement('span');
+                        number.className = 'ln';
+                        number.textContent = index + 1;
+                        row.appendChild(number);
+                        let text = lineAt(index);
+                        if (text === null) {
+                            text = '…';
+                        } else if (text.length > MAX_LINE) {
+                            text = text.slice(0, MAX_LINE) + ' …';
+                        }
+                        row.appendChild(document.createTextNode(text));
+                        fragment.appendChild(row);
+                    }
+                    rows.style.top = top + 'px';
+                    rows.replaceChildren(fragment);
+                    status.textContent = `Lines ${(first + 1).toLocaleString()}–${last.toLocaleString()} of ${info.total.toLocaleString()}` +
+                        (changed ? ' · The document has changed since this page was loaded; reload to see the new version.' : '');
+                }
+                
+                viewer.addEventListener('scroll', () => {
+                    if (!frame) {
+                        frame = requestAnimationFrame(() => {
+                            frame = 0;
+                            render();
+                        });
+                    }
+                });
+                window.addEventListener('resize', render);
+                render();
+            }
+            
+            document.addEventListener('DOMContentLoaded', startViewer);
+        </script>
+    </head>
+    <body>
+        <div class="container">
+            <header>
+                <h1>RAW Data Viewer</h1>
+                <p class="subtitle">Store, share, and access your data with a permanent URL</p>
+            </header>
+            
+            <div class="dashboard">
+                <div class="card">
+                    <h3>📊 Statistics</h3>
+                    <div class="stat-grid">
+                        <div class="stat-item">
+                            <span class="stat-value">{{ metadata.size }}</span>
+                            <span class="stat-label">Bytes</span>
+                        </div>
+                        <div class="stat-item">
+                            <span class="stat-value">{{ metadata.views }}</span>
+                            <span class="stat-label">Views</span>
+                        </div>
+                        <div class="stat-item">
+                            <span class="stat-value">{{ metadata.format }}</span>
+                            <span class="stat-label">Format</span>
+                        </div>
+                        <div class="stat-item">
+                            <span class="stat-value">{{ history_count }}</span>
+                            <span class="stat-label">History</span>
+                        </div>
+                    </div>
+                </div>
+                
+                <div class="card">
+                    <h3>📅 Information</h3>
+                    <p><strong>Last Updated:</strong><br>{{ metadata.last_updated }}</p>
+                    {% if metadata.author %}
+                    <p style="margin-top: 10px;"><strong>Author:</strong><br>{{ metadata.author }}</p>
+                    {% endif %}
+                    <p style="margin-top: 10px;"><strong>Status:</strong><br>
+                        <span style="color: var(--success); font-weight: bold;">● Active</span>
+                    </p>
+                </div>
+                
+                <div class="card">
+                    <h3>🔗 Quick Links</h3>
+                    <div class="url-display">
+                        {{ raw_url }}
+                        <button class="copy-btn" onclick="copyToClipboard('{{ raw_url }}')">Copy</button>
+                    </div>
+                    <p style="margin-top: 15px; font-size: 0.9rem; color: #666;">
+                        Use this URL to access your data from anywhere
+                    </p>
+                </div>
+            </div>
+            
+            <div class="data-container">
+                <h3 style="margin-bottom: 20px; display: flex; align-items: center; gap: 10px;">
+                    📄 Stored Data
+                    <span style="font-size: 0.9rem; color: #666; font-weight: normal;">
+                        ({{ metadata.size }} bytes, {{ line_count }} lines)
+                    </span>
+                </h3>
+                
+                {% if viewer.total %}
+                <div class="viewer" id="viewer">
+                    <div class="viewer-spacer"></div>
+                    <div class="viewer-lines"></div>
+                </div>
+                <p class="viewer-status" id="viewer-status"></p>
+                <script type="application/json" id="viewer-data">{{ viewer|tojson }}</script>
+                <noscript>
+                    <p class="viewer-status"><a href="{{ raw_url }}">Open the RAW URL</a> to read the data.</p>
+                </noscript>
+                {% else %}
+                <div class="empty-data">
+                    No data stored yet. {% if telegram_available %}Send data via Telegram bot{% else %}Use API{% endif %} to get started!
+                </div>
+                {% endif %}
+            </div>
+            
+            <div class="actions">
+                <a href="{{ raw_url }}" class="btn btn-primary" download="raw_data_{{ timestamp }}.txt">
+                    <span>📥</span> Download Data
+                </a>
+                <a href="{{ raw_url }}" class="btn btn-success" target="_blank">
+                    <span>🔗</span> Open RAW URL
+                </a>
+                <a href="{{ raw_url }}?format=json" class="btn btn-info" target="_blank">
+                    <span>📊</span> JSON Format
+                </a>
+                <a href="/stats" class="btn btn-warning">
+                    <span>📈</span> Detailed Stats
+                </a>
+                {% if telegram_available %}
+                <a href="https://t.me/{{ bot_username }}" class="btn btn-primary" target="_blank">
+                    <span>🤖</span> Telegram Bot
+                </a>
+                {% endif %}
+            </div>
+            
+            <footer>
+                <p>Powered by Flask | {{ timestamp }}</p>
+                <p style="margin-top: 5px; font-size: 0.8rem;">
+                    Data is stored permanently until cleared
+                </p>
+            </footer>
+        </div>
+    </body>
+    </html>
+    """
+HOME_TEMPLATE = app.jinja_env.from_string(HOME_TEMPLATE_SOURCE)
+
+# Placeholders rendered into the cached page and swapped per request
+_VOLATILE_TOKEN = os.urandom(8).hex()
+_VIEWS_MARK = f"__views_{_VOLATILE_TOKEN}__"
+_TIME_MARK = f"__time_{_VOLATILE_TOKEN}__"
+_VOLATILE_RE = re.compile(f"({_VIEWS_MARK}|{_TIME_MARK})")
+
+def render_home_parts(doc, snapshot):
+    """Render the dashboard once for one snapshot
+    
+    Only metadata and the first page of lines go into the page; the viewer
+    fetches the rest from /raw?lines=a-b, so its size does not depend on
+    the document's.
+    """
+    index = line_index(doc, snapshot)
+    count = min(DASHBOARD_PREVIEW_LINES, index.lines_within(PREVIEW_MAX_BYTES))
+    start, stop = index.span(1, count)
+    html = HOME_TEMPLATE.render(
+        viewer={
+            "url": "/raw" if doc.key == DEFAULT_KEY else f"/raw/{doc.key}",
+            "version": snapshot.version,
+            "total": len(index),
+            "page": DASHBOARD_PREVIEW_LINES,
+            "lines": snapshot.raw[start:stop].decode("utf-8").split("\n")[:count]
+        },
+        line_count=f"{len(index):,}",
+        metadata=dict(snapshot.metadata, views=_VIEWS_MARK, format=document_format(doc, snapshot)),
+        raw_url=doc.url,
+        timestamp=_TIME_MARK,
+        history_count=len(snapshot.history),
+        telegram_available=TELEGRAM_AVAILABLE,
+        bot_username="raw_data_viewer_bot"  # Replace with your bot username
+    )
+    return [
+        part if part in (_VIEWS_MARK, _TIME_MARK) else part.encode("utf-8")
+        for part in _VOLATILE_RE.split(html)
+    ]
+
+def json_mark(name):
+    """Placeholder value for a field that changes between requests of one version"""
+    return f"__{name}_{_VOLATILE_TOKEN}__"
+
+# Matches a serialized placeholder, quotes included; group 1 is its name
+_JSON_MARK_RE = re.compile(rb'"__([a-z_]+)_' + _VOLATILE_TOKEN.encode("ascii") + rb'__"')
+
+def encode_json(value, compact=False):
+    """Serialize to UTF-8 JSON bytes, indented unless compact, with orjson if available"""
+    if orjson is not None:
+        return orjson.dumps(value, option=0 if compact else orjson.OPT_INDENT_2)
+    # Raw UTF-8 like orjson, so bytes and ETags do not depend on which is installed
+    if compact:
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return json.dumps(value, indent=2, ensure_ascii=False).encode("utf-8")
+
+def cached_json(doc, snapshot, name, build, volatile, compact=False):
+    """Response parts for a JSON document serialized once per version of doc
+    
+    build() returns the document with json_mark() placeholders for the
+    fields in `volatile` ({name: value}); only those small values are
+    serialized per request, in the same style and at the placeholder's
+    indent, and spliced between the cached bytes.
+    """
+    version, cache = doc.json_cache
+    if version != snapshot.version:
+        cache = {}
+        if snapshot is doc.snapshot:
+            doc.json_cache = (snapshot.version, cache)
+    parts = cache.get((name, compact))
+    METRICS.cache("json", parts is not None)
+    if parts is None:
+        # Odd indices are (placeholder name, newline plus the indent of its line),
+        # even ones serialized bytes
+        parts = _JSON_MARK_RE.split(encode_json(build(), compact))
+        for index in range(1, len(parts), 2):
+            line = parts[index - 1][parts[index - 1].rfind(b"\n") + 1:]
+            parts[index] = (parts[index].decode("ascii"), b"\n" + line[:len(line) - len(line.lstrip(b" "))])
+        cache[(name, compact)] = parts
+    values = {mark: encode_json(value, compact) for mark, value in volatile.items()}
+    return [
+        values[part[0]].replace(b"\n", part[1]) if index % 2 else part
+        for index, part in enumerate(parts)
+    ]
+
+def wants_compact(default=False):
+    """Whether the request wants non-indented JSON (?compact=1 / ?compact=0)"""
+    value = request.args.get("compact")
+    if value is None:
+        return default
+    return value.lower() not in ("0", "false", "no", "")
+
+def document_not_found(key):
+    """JSON 404 for an unknown document key"""
+    return json.dumps({"status": "error", "message": f"No document named '{key}'"}), 404
+
+def invalid_key(key):
+    """JSON 400 for a key that cannot be used as a document name"""
+    return json.dumps({
+        "status": "error",
+        "message": "Document keys may only contain letters, digits, '.', '_' and '-' (max 60), "
+                   "and 'watch' is reserved"
+    }), 400
+
+@app.before_request
+def sync_shared_state():
+    """Catch up with writes made by other worker processes"""
+    sync_documents()
+
+@app.route("/")
+def home():
+    """HTML interface for viewing raw data"""
+    key = request.args.get("key", DEFAULT_KEY)
+    doc, snapshot = DATA_SERVICE.read(key)
+    if doc is None:
+        return document_not_found(key)
+    
+    # Increment view counter
+    doc.views.increment()
+    
+    version, parts = doc.home_cache
+    METRICS.cache("home", version == snapshot.version and parts is not None)
+    if version != snapshot.version or parts is None:
+        parts = render_home_parts(doc, snapshot)
+        doc.home_cache = (snapshot.version, parts)
+    
+    volatile = {
+        _VIEWS_MARK: str(doc.views.value).encode("utf-8"),
+        _TIME_MARK: time.strftime("%Y-%m-%d %H:%M:%S").encode("utf-8")
+    }
+    return Response([volatile.get(part, part) for part in parts], mimetype="text/html")
+
+def raw_validators(snapshot, format_type, encoding=None, compact=False):
+    """ETag and Last-Modified headers for one /raw representation"""
+    if format_type == 'json':
+        # The JSON envelope embeds the request time and view count
+        etag = quote_etag(f"{snapshot.etag}-json{'-compact' if compact else ''}", weak=True)
+    elif format_type == 'html':
+        etag = quote_etag(f"{snapshot.etag}-html")
+    elif encoding:
+        etag = quote_etag(f"{snapshot.etag}-{encoding}")
+    else:
+        etag = quote_etag(snapshot.etag)
+    return {"ETag": etag, "Last-Modified": http_date(snapshot.modified)}
+
+class UploadTooLarge(Exception):
+    """Request body is bigger than MAX_UPLOAD_SIZE"""
+
+def read_upload():
+    """Stream the request body in and return (raw bytes, SHA-256 hex digest)
+    
+    The body is read in STREAM_CHUNK_SIZE chunks that are hashed, counted
+    and UTF-8 validated on arrival and spooled aside, so only one chunk
+    plus the final bytes object is ever held. Raises UploadTooLarge or
+    UnicodeDecodeError before anything is stored.
+    """
+    if (request.content_length or 0) > MAX_UPLOAD_SIZE:
+        raise UploadTooLarge()
+    
+    digest = hashlib.sha256()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    size = 0
+    with tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_SIZE) as spool:
+        while True:
+            chunk = request.stream.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_UPLOAD_SIZE:
+                raise UploadTooLarge()
+            digest.update(chunk)
+            decoder.decode(chunk)  # Validate only; the text is decoded once at commit
+            spool.write(chunk)
+        decoder.decode(b"", final=True)
+        spool.seek(0)
+        raw = spool.read()
+    request.environ["rawdata.bytes_in"] = size
+    return raw, digest.hexdigest()
+
+def decode_upload(raw):
+    """Text of a validated upload, timed as the decode stage of the write"""
+    started = time.perf_counter()
+    data = raw.decode("utf-8")
+    METRICS.observe("rawdata_write_stage_duration_seconds", (("stage", "decode"),), time.perf_counter() - started)
+    return data
+
+def upload_too_large():
+    """JSON 413 for a body over MAX_UPLOAD_SIZE"""
+    return json.dumps({
+        "status": "error",
+        "message": f"Upload exceeds the {MAX_UPLOAD_SIZE:,} byte limit"
+    }), 413
+
+def stream_chunks(body, start, stop):
+    """Yield body[start:stop] in STREAM_CHUNK_SIZE pieces without copying the rest"""
+    view = memoryview(body)
+    for offset in range(start, stop, STREAM_CHUNK_SIZE):
+        yield bytes(view[offset:min(offset + STREAM_CHUNK_SIZE, stop)])
+
+def requested_ranges(length, etag, modified):
+    """Resolve the request's byte ranges against a body of `length` bytes
+    
+    Returns None to serve the full body, an empty list when nothing is
+    satisfiable, or a list of (start, stop) pairs with exclusive stops.
+    """
+    rng = request.range
+    if rng is None or rng.units != "bytes" or len(rng.ranges) > MAX_RANGES:
+        return None
+    
+    # If-Range: only honour the range when the client's copy is current
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != unquote_etag(etag)[0]:
+        return None
+    if if_range.date is not None and if_range.date != modified.replace(microsecond=0):
+        return None
+    
+    ranges = []
+    for start, stop in rng.ranges:
+        if start < 0:  # Suffix range: the last -start bytes
+            start = max(0, length + start)
+        stop = length if stop is None else min(stop, length)
+        if start < stop:
+            ranges.append((start, stop))
+    return ranges
+
+def stream_response(body, mimetype, headers, etag, modified):
+    """Stream a stored body in chunks, answering Range requests with 206"""
+    length = len(body)
+    headers["Accept-Ranges"] = "bytes"
+    ranges = requested_ranges(length, etag, modified)
+    
+    if ranges is None:
+        headers["Content-Length"] = str(length)
+        return Response(stream_chunks(body, 0, length), mimetype=mimetype, headers=headers)
+    
+    if not ranges:
+        headers["Content-Range"] = f"bytes */{length}"
+        return Response(status=416, headers=headers)
+    
+    if len(ranges) == 1:
+        start, stop = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{length}"
+        headers["Content-Length"] = str(stop - start)
+        return Response(stream_chunks(body, start, stop), status=206, mimetype=mimetype, headers=headers)
+    
+    # Several ranges: multipart/byteranges, still streamed chunk by chunk
+    boundary = os.urandom(12).hex()
+    part_type = Response(mimetype=mimetype).content_type
+    heads = [
+        (f"\r\n--{boundary}\r\nContent-Type: {part_type}\r\n"
+         f"Content-Range: bytes {start}-{stop - 1}/{length}\r\n\r\n").encode("ascii")
+        for start, stop in ranges
+    ]
+    tail = f"\r\n--{boundary}--\r\n".encode("ascii")
+    
+    def generate():
+        for head, (start, stop) in zip(heads, ranges):
+            yield head
+            yield from stream_chunks(body, start, stop)
+        yield tail
+    
+    headers["Content-Length"] = str(
+        sum(len(head) for head in heads) + sum(stop - start for start, stop in ranges) + len(tail)
+    )
+    return Response(
+        generate(),
+        status=206,
+        content_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers
+    )
+
+@app.route("/raw", methods=["GET"], defaults={"key": DEFAULT_KEY})
+@app.route("/raw/<key>", methods=["GET"])
+def read_raw(key):
+    """Enhanced raw endpoint with format options"""
+    doc, snapshot = DATA_SERVICE.read(key)
+    if doc is None:
+        return document_not_found(key)
+    if "version" in request.args or "at" in request.args:
+        return read_version(doc)
+    if "lines" in request.args or "head" in request.args or "tail" in request.args:
+        return read_lines(doc, snapshot)
+    if "path" in request.args:
+        return read_paths(doc, snapshot)
+    
+    format_type = request.args.get('format', 'text')
+    encoding, body = None, None
+    if format_type not in ('json', 'html'):
+        encoding, body = choose_encoding(doc, snapshot, request.accept_encodings)
+    compact = format_type == 'json' and wants_compact()
+    validators = raw_validators(snapshot, format_type, encoding, compact)
+    
+    if not is_resource_modified(request.environ, etag=validators["ETag"], last_modified=snapshot.modified):
+        return Response(
+            status=304,
+            headers=dict(validators, **{
+                "Access-Control-Allow-Origin": "*",
+                "Cache-Control": "no-cache",
+                "Vary": "Accept-Encoding"
+            })
+        )
+    
+    if format_type == 'json':
+        def envelope():
+            return {
+                "key": doc.key,
+                "data": snapshot.text(),
+                "metadata": dict(snapshot.metadata, format=document_format(doc, snapshot), views=json_mark("views")),
+                "history_count": len(snapshot.history),
+                "timestamp": json_mark("timestamp")
+            }
+        
+        return Response(
+            cached_json(doc, snapshot, "raw", envelope, {
+                "views": doc.views.value,
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+            }, compact=compact),
+            mimetype="application/json",
+            headers=dict(validators, **{"Access-Control-Allow-Origin": "*"})
+        )
+    elif format_type == 'html':
+        return Response(f"<pre>{snapshot.text()}</pre>", mimetype="text/html", headers=validators)
+    else:
+        headers = dict(validators, **{
+            "Access-Control-Allow-Origin": "*",
+            # Caches must revalidate, but may keep a copy for If-None-Match
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding"
+        })
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        else:
+            body = snapshot.raw
+        return stream_response(body, "text/plain", headers, validators["ETag"], snapshot.modified)
+
+def read_lines(doc, snapshot):
+    """Serve ?lines=a-b, ?head=N or ?tail=N of a snapshot through its line index"""
+    index = line_index(doc, snapshot)
+    total = len(index)
+    try:
+        if "lines" in request.args:
+            first, last = parse_line_range(request.args["lines"])
+            if first < 1 or last < first:
+                raise ValueError(f"Invalid line range {first}-{last}")
+        else:
+            count = int(request.args["head"] if "head" in request.args else request.args["tail"])
+            if count < 0:
+                raise ValueError(f"Invalid line count {count}")
+            first, last = (1, count) if "head" in request.args else (total - count + 1, total)
+    except ValueError as e:
+        return json.dumps({"status": "error", "message": str(e)}), 400
+    
+    first, last = max(first, 1), min(last, total)
+    headers = {
+        "X-Total-Lines": str(total),
+        "X-Version": str(snapshot.version),
+        "Access-Control-Allow-Origin": "*",
+        "Cache-Control": "no-cache"
+    }
+    if "lines" in request.args and first > total:
+        return Response(
+            json.dumps({"status": "error", "message": f"Line {first} is past the end of the document"}),
+            status=416,
+            mimetype="application/json",
+            headers=headers
+        )
+    
+    start, stop = index.span(first, last)
+    if first <= last:
+        headers["X-Lines"] = f"{first}-{last}"
+    etag = headers["ETag"] = quote_etag(f"{snapshot.etag}-lines-{start}-{stop}")
+    headers["Last-Modified"] = http_date(snapshot.modified)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=snapshot.modified):
+        return Response(status=304, headers=headers)
+    return stream_response(memoryview(snapshot.raw)[start:stop], "text/plain", headers, etag, snapshot.modified)
+
+def read_paths(doc, snapshot):
+    """Serve ?path= subtrees of a JSON document from its parsed tree
+    
+    One path answers with the subtree itself. Repeated ?path= parameters
+    answer with {"values": {path: subtree, ...}, "missing": [path, ...]}.
+    Subtrees are compact unless ?compact=0.
+    """
+    paths = list(dict.fromkeys(request.args.getlist("path")))
+    compact = wants_compact(default=True)
+    headers = {
+        "X-Version": str(snapshot.version),
+        "Access-Control-Allow-Origin": "*",
+        "Cache-Control": "no-cache"
+    }
+    if len(paths) > MAX_JSON_PATHS:
+        return json.dumps({"status": "error", "message": f"At most {MAX_JSON_PATHS} paths per request"}), 400
+    try:
+        pointers = [(path, json_pointer(tokens), tokens) for path in paths for tokens in [json_path_tokens(path)]]
+    except ValueError as e:
+        return json.dumps({"status": "error", "message": str(e)}), 400
+    
+    tree = json_tree(doc, snapshot)
+    if tree is None:
+        return json.dumps({"status": "error", "message": "Document is not valid JSON"}), 422
+    
+    digest = hashlib.sha256(json.dumps([pointer for _, pointer, _ in pointers]).encode("utf-8")).hexdigest()[:16]
+    etag = headers["ETag"] = quote_etag(f"{snapshot.etag}-path-{digest}{'-compact' if compact else ''}")
+    headers["Last-Modified"] = http_date(snapshot.modified)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=snapshot.modified):
+        return Response(status=304, headers=headers)
+    
+    if len(pointers) == 1:
+        _, pointer, tokens = pointers[0]
+        try:
+            body = tree.serialized(pointer, tokens, compact)
+        except PatchError as e:
+            return Response(
+                json.dumps({"status": "error", "message": str(e)}),
+                status=404,
+                mimetype="application/json",
+                headers=headers
+            )
+        return Response(body, mimetype="application/json", headers=headers)
+    
+    # Spliced from the cached subtrees rather than re-serialized as a whole
+    values, missing = [], []
+    for path, pointer, tokens in pointers:
+        try:
+            values.append(encode_json(path, compact=True) + b":" + tree.serialized(pointer, tokens, compact))
+        except PatchError:
+            missing.append(path)
+    body = b'{"values":{' + b",".join(values) + b'},"missing":' + encode_json(missing, compact=True) + b"}"
+    return Response(body, mimetype="application/json", headers=headers)
+
+def parse_timestamp(value):
+    """Epoch seconds, or an ISO 8601 date/time (local time unless it has an offset)"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def read_version(doc):
+    """Serve a past version picked by ?version=N or ?at=<timestamp>"""
+    try:
+        if "version" in request.args:
+            record = find_version(doc, number=int(request.args["version"]))
+        else:
+            record = find_version(doc, at=parse_timestamp(request.args["at"]))
+    except ValueError as e:
+        return json.dumps({"status": "error", "message": str(e)}), 400
+    if record is None:
+        return json.dumps({
+            "status": "error",
+            "message": f"No retained version of '{doc.key}' matches the request"
+        }), 404
+    
+    etag = quote_etag(record.etag)
+    modified = datetime.fromtimestamp(record.created, timezone.utc)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(modified),
+        "X-Version": str(record.number),
+        "Access-Control-Allow-Origin": "*",
+        # A numbered version never changes if the store keeps its numbering across
+        # restarts; "at" may resolve differently later
+        "Cache-Control": (
+            "public, max-age=31536000, immutable"
+            if "version" in request.args and STORE.durable else "no-cache"
+        )
+    }
+    if not is_resource_modified(request.environ, etag=etag, last_modified=modified):
+        return Response(status=304, headers=headers)
+    return stream_response(CHUNKS.join(record.chunks), "text/plain", headers, etag, modified)
+
+@app.route("/raw/watch", defaults={"key": DEFAULT_KEY})
+@app.route("/raw/watch/<key>")
+def watch_raw(key):
+    """Push new versions as server-sent events, or long-poll with ?wait=<version>
+    
+    The SSE stream resumes after Last-Event-ID (or ?since=) and otherwise
+    starts with the current version. A long poll answers at once if the
+    document is no longer at version `wait`, else when it changes, or with
+    a 304 after ?timeout= seconds. Idle clients are parked on WATCH_HUB.
+    """
+    doc, snapshot = DATA_SERVICE.read(key)
+    if doc is None:
+        return document_not_found(key)
+    
+    try:
+        if "wait" in request.args:
+            since = int(request.args["wait"])
+            timeout = float(request.args.get("timeout", WATCH_TIMEOUT))
+            if not math.isfinite(timeout):
+                raise ValueError("timeout must be a finite number of seconds")
+            timeout = min(max(timeout, 0), WATCH_MAX_TIMEOUT)
+            watcher = Watcher(doc.key, False, since, time.monotonic() + timeout)
+        else:
+            since = request.args.get("since", request.headers.get("Last-Event-ID"))
+            watcher = Watcher(doc.key, True, int(since) if since else None)
+    except ValueError as e:
+        return json.dumps({"status": "error", "message": str(e)}), 400
+    
+    if not watcher.stream and snapshot.version != watcher.since:
+        return Response(
+            watch_payload(doc, snapshot),
+            mimetype="application/json",
+            headers={
+                "Cache-Control": "no-store",
+                "Access-Control-Allow-Origin": "*",
+                "X-Version": str(snapshot.version)
+            }
+        )
+    
+    park = request.environ.get("rawdata.park")
+    if park is not None:
+        park(watcher)
+        return Response(status=200)  # Discarded: the hub writes the real response
+    
+    # Server without connection hand-over: hold this request's thread instead
+    if not watcher.stream:
+        snapshot = WATCH_HUB.wait(doc, watcher.since, timeout)
+        if snapshot is None:
+            return Response(status=304, headers={"X-Version": str(watcher.since)})
+        return Response(
+            watch_payload(doc, snapshot),
+            mimetype="application/json",
+            headers={"Cache-Control": "no-store", "X-Version": str(snapshot.version)}
+        )
+    
+    def generate():
+        yield b"retry: 3000\n\n"
+        since = watcher.since
+        while True:
+            snapshot = WATCH_HUB.wait(doc, since, WATCH_KEEPALIVE)
+            if snapshot is None:
+                yield _SSE_KEEPALIVE
+                continue
+            since = snapshot.version
+            yield sse_event(since, watch_payload(doc, snapshot))
+    
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Access-Control-Allow-Origin": "*", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/raw", methods=["POST"], defaults={"key": DEFAULT_KEY})
+@app.route("/raw/<key>", methods=["POST"])
+def write_raw(key):
+    """Enhanced write endpoint with metadata"""
+    if not is_valid_key(key):
+        return invalid_key(key)
+    
+    try:
+        # Stream the body in; nothing is committed unless all of it is valid
+        raw, etag = read_upload()
+        
+        # Get author safely
+        author = safe_encode_header(request.headers.get('X-Author', 'Unknown'))
+        
+        snapshot = DATA_SERVICE.write(key, decode_upload(raw), author, raw=raw, etag=etag)
+        doc = get_document(key)
+        
+        return json.dumps({
+            "status": "success",
+            "message": "Data updated successfully",
+            "key": doc.key,
+            "metadata": document_metadata(doc, snapshot, validate=False),
+            "url": doc.url
+        })
+    except UploadTooLarge:
+        return upload_too_large()
+    except Exception as e:
+        return json.dumps({
+            "status": "error",
+            "message": str(e)
+        }), 400
+
+def parse_line_range(value):
+    """Parse "a-b" (or a single line "a") into a (first, last) pair"""
+    first, _, last = value.partition("-")
+    return int(first), int(last or first)
+
+@app.route("/raw", methods=["PATCH"], defaults={"key": DEFAULT_KEY})
+@app.route("/raw/<key>", methods=["PATCH"])
+def patch_raw(key):
+    """Change part of a document without re-sending all of it
+    
+    The Content-Type picks the operation: application/json-patch+json
+    (RFC 6902) and application/merge-patch+json (RFC 7396) edit a JSON
+    document; any other body is text that replaces ?lines=a-b, or is
+    appended when no range is given. With If-Match the patch only
+    applies to the version the client last saw.
+    """
+    try:
+        body, _ = read_upload()
+        text = body.decode("utf-8")
+        
+        if request.mimetype == "application/json-patch+json":
+            operations = json.loads(text)
+            change = lambda snapshot: patch_json(snapshot, apply_json_patch, operations)
+        elif request.mimetype == "application/merge-patch+json":
+            merge = json.loads(text)
+            change = lambda snapshot: patch_json(snapshot, apply_merge_patch, merge)
+        elif "lines" in request.args:
+            first, last = parse_line_range(request.args["lines"])
+            change = lambda snapshot: replace_lines(snapshot, first, last, text)
+        else:
+            change = lambda snapshot: append_text(snapshot, text)
+        
+        if_match = request.if_match
+        
+        def checked_change(snapshot):
+            if if_match and not if_match.contains(snapshot.etag):
+                raise PatchError("Document has changed since the ETag in If-Match", 412)
+            return change(snapshot)
+        
+        author = safe_encode_header(request.headers.get('X-Author', 'Unknown'))
+        snapshot = DATA_SERVICE.patch(key, checked_change, author)
+        if snapshot is None:
+            return document_not_found(key)
+        doc = get_document(key)
+        
+        return Response(
+            json.dumps({
+                "status": "success",
+                "message": "Data patched successfully",
+                "key": doc.key,
+                "metadata": document_metadata(doc, snapshot, validate=False),
+                "url": doc.url
+            }),
+            headers={"ETag": quote_etag(snapshot.etag)}
+        )
+    except UploadTooLarge:
+        return upload_too_large()
+    except PatchError as e:
+        return json.dumps({"status": "error", "message": str(e)}), e.status
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)}), 400
+
+@app.route("/documents")
+def list_documents():
+    """Index of all stored documents"""
+    documents = {}
+    for key, doc in list(DOCUMENTS.items()):
+        snapshot = doc.snapshot
+        documents[key] = dict(
+            document_metadata(doc, snapshot),
+            url=doc.url,
+            history_count=len(snapshot.history)
+        )
+    return json.dumps({"count": len(documents), "documents": documents}, indent=2)
+
+@app.route("/stats")
+def stats():
+    """Statistics endpoint"""
+    key = request.args.get("key", DEFAULT_KEY)
+    doc, snapshot = DATA_SERVICE.read(key)
+    if doc is None:
+        return document_not_found(key)
+    
+    def stats_data():
+        return {
+            "key": doc.key,
+            "current_size": len(snapshot.raw),
+            "history_entries": len(snapshot.history),
+            "version": snapshot.version,
+            "versions_retained": json_mark("versions_retained"),
+            "chunk_store": json_mark("chunk_store"),
+            "watchers": json_mark("watchers"),
+            "metadata": dict(snapshot.metadata, format=document_format(doc, snapshot), views=json_mark("views")),
+            "documents": json_mark("documents"),
+            "access_url": doc.url,
+            "web_interface": PUBLIC_URL,
+            "timestamp": json_mark("timestamp"),
+            "server_status": "running",
+            "telegram_bot": "available" if TELEGRAM_AVAILABLE else "not_available"
+        }
+    
+    return Response(cached_json(doc, snapshot, "stats", stats_data, {
+        "versions_retained": len(doc.versions),
+        "chunk_store": CHUNKS.stats(),
+        "watchers": WATCH_HUB.subscriber_count,
+        "views": doc.views.value,
+        "documents": len(DOCUMENTS),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    }, compact=wants_compact()), mimetype="application/json")
+
+@app.route("/health")
+def health():
+    """Health check endpoint"""
+    doc, snapshot = DATA_SERVICE.read(DEFAULT_KEY)
+    
+    def health_data():
+        return {
+            "status": "healthy",
+            "timestamp": json_mark("timestamp"),
+            "data_exists": bool(snapshot.raw),
+            "documents": json_mark("documents"),
+            "public_url": is_public_url(PUBLIC_URL),
+            "telegram_bot": "available" if TELEGRAM_AVAILABLE else "not_available"
+        }
+    
+    return Response(cached_json(doc, snapshot, "health", health_data, {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "documents": len(DOCUMENTS)
+    }, compact=wants_compact(default=True)), mimetype="application/json")
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus metrics for every server process"""
+    return Response(render_metrics(collect_metrics()), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route("/update", methods=["POST"], defaults={"key": DEFAULT_KEY})
+@app.route("/update/<key>", methods=["POST"])
+def update_data(key):
+    """Simple API endpoint to update data"""
+    if not is_valid_key(key):
+        return invalid_key(key)
+    
+    try:
+        raw, etag = read_upload()
+        if not raw:
+            return json.dumps({"status": "error", "message": "No data provided"}), 400
+        
+        snapshot = DATA_SERVICE.write(
+            key, decode_upload(raw), request.headers.get('X-Author', 'API'),
+            keep_history=False, raw=raw, etag=etag
+        )
+        doc = get_document(key)
+        
+        return json.dumps({
+            "status": "success",
+            "message": "Data updated via API",
+            "key": doc.key,
+            "url": doc.url,
+            "size": len(snapshot.raw)
+        })
+    except UploadTooLarge:
+        return upload_too_large()
+    except UnicodeDecodeError as e:
+        return json.dumps({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)}), 500
+
+class WatchRequestHandler(WSGIRequestHandler):
+    """Werkzeug request handler that can hand its connection over to WATCH_HUB
+    
+    watch_raw() calls environ["rawdata.park"] instead of streaming: the
+    response werkzeug then writes is discarded, and once the request is
+    finished the socket is detached (so werkzeug neither shuts it down nor
+    closes it) and adopted by the hub.
+    """
+    parked = None
+    
+    def make_environ(self):
+        environ = super().make_environ()
+        environ["rawdata.park"] = self.park
+        return environ
+    
+    def park(self, watcher):
+        self.parked = watcher
+        self.wfile = io.BytesIO()
+    
+    def finish(self):
+        super().finish()
+        if self.parked is not None:
+            WATCH_HUB.adopt(socket.socket(fileno=self.connection.detach()), self.parked)
+
+class UpdateRelay:
+    """Carries webhook updates from HTTP request threads to the bot's Application
+    
+    submit() never waits for the bot: in a single process it schedules the
+    update onto the bot's event loop; with pre-forked workers it puts the
+    payload on a multiprocessing queue that a thread in the bot process
+    drains. Either way the update lands on Application.update_queue.
+    """
+    
+    def __init__(self, shared=False):
+        self._queue = multiprocessing.Queue() if shared else None
+        self._application = None
+        self._loop = None
+    
+    def submit(self, payload):
+        """Queue one decoded update; False if no bot is attached to take it yet"""
+        if self._queue is not None:
+            self._queue.put(payload)
+            return True
+        if self._loop is None:
+            return False
+        self._loop.call_soon_threadsafe(self._deliver, payload)
+        return True
+    
+    def attach(self, application, loop):
+        """Start delivering to application, whose updates are processed on loop"""
+        self._application, self._loop = application, loop
+        if self._queue is not None:
+            threading.Thread(target=self._drain, name="webhook-relay", daemon=True).start()
+    
+    def _drain(self):
+        while True:
+            payload = self._queue.get()
+            self._loop.call_soon_threadsafe(self._deliver, payload)
+    
+    def _deliver(self, payload):
+        update = Update.de_json(payload, self._application.bot)
+        self._application.update_queue.put_nowait(update)
+
+# Set by main() / run_prefork() in webhook mode
+TELEGRAM_RELAY = None
+
+@app.route("/telegram/<secret>", methods=["POST"])
+def telegram_webhook(secret):
+    """Receive an update pushed by Telegram and hand it to the bot"""
+    if TELEGRAM_RELAY is None or not hmac.compare_digest(secret.encode(), WEBHOOK_SECRET.encode()):
+        return json.dumps({"status": "error", "message": "Not found"}), 404
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not hmac.compare_digest(token.encode(), WEBHOOK_SECRET.encode()):
+        return json.dumps({"status": "error", "message": "Invalid secret token"}), 403
+    if (request.content_length or 0) > WEBHOOK_MAX_SIZE:
+        return json.dumps({"status": "error", "message": "Update too large"}), 413
+    
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or "update_id" not in payload:
+        return json.dumps({"status": "error", "message": "Not a Telegram update"}), 400
+    if not TELEGRAM_RELAY.submit(payload):
+        # Bot still starting; Telegram redelivers on errors
+        return json.dumps({"status": "error", "message": "Bot not ready"}), 503
+    return json.dumps({"status": "ok"})
+
+def run_server():
+    """Bind the Flask server and serve it from a background thread"""
+    global server_thread, server_running
+    print(f"🌐 Starting Flask server on port {PORT}...")
+    print(f"📡 Server URL: {PUBLIC_URL}")
+    print(f"🔗 RAW Endpoint: {RAW_URL}")
+    print(f"📂 Documents: {RAW_URL}/<key> (index at {PUBLIC_URL}/documents)")
+    print(f"📊 Statistics: {PUBLIC_URL}/stats")
+    print(f"🏥 Health Check: {PUBLIC_URL}/health")
+    print(f"📈 Metrics: {PUBLIC_URL}/metrics")
+    print(f"🔔 Change feed: {RAW_URL}/watch (SSE, or ?wait=<version> to long-poll)")
+    print(f"🌳 JSON subtrees: {RAW_URL}?path=a.b[0] (repeat ?path= to batch)")
+    
+    server = make_server("0.0.0.0", PORT, app, threaded=True, request_handler=WatchRequestHandler)
+    STARTUP.phase("bind")
+    server_thread = threading.Thread(target=server.serve_forever, name="http", daemon=True)
+    server_thread.start()
+    server_running = True
+
+def serve_worker(listener):
+    """Body of one pre-forked HTTP worker: accept on the shared listening socket"""
+    threading.Thread(target=run_views_checkpointer, daemon=True).start()
+    if CIPHER is not None:
+        threading.Thread(target=run_reencryptor, daemon=True).start()
+    server = make_server(
+        "0.0.0.0", PORT, app, threaded=True, request_handler=WatchRequestHandler, fd=listener.fileno()
+    )
+    server.serve_forever()
+
+def run_prefork(run_telegram_bot):
+    """Production mode: fork WORKERS HTTP workers (and one bot process) and restart any that exit
+    
+    The supervisor binds the port, sets up the shared version counter and
+    forks; it serves nothing itself. Workers share documents through the
+    SQLite database and pick up each other's writes on their next request.
+    """
+    global SHARED_VERSION, TELEGRAM_RELAY, METRICS_DIR, server_running
+    SHARED_VERSION = SharedVersion(_synced_seq)
+    if run_telegram_bot and BOT_MODE == "webhook":
+        TELEGRAM_RELAY = UpdateRelay(shared=True)  # Workers receive, the bot process handles
+    listener = socket.create_server(("0.0.0.0", PORT), backlog=1024)
+    STARTUP.phase("bind")
+    METRICS_DIR = tempfile.mkdtemp(prefix="rawdata-metrics-")
+    children = {}
+    
+    def spawn(role):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            threading.Thread(target=run_metrics_flusher, daemon=True).start()
+            threading.Thread(target=run_metrics_folder, daemon=True).start()
+            try:
+                if role == "bot":
+                    listener.close()
+                    run_bot()
+                else:
+                    serve_worker(listener)
+            except KeyboardInterrupt:
+                pass
+            except BaseException as e:
+                print(f"❌ {role} worker {os.getpid()} failed: {e}")
+                status = 1
+            os._exit(status)
+        children[pid] = role
+    
+    print(f"🌐 Starting {WORKERS} server workers on port {PORT}...")
+    print(f"📡 Server URL: {PUBLIC_URL}")
+    print(f"🔗 RAW Endpoint: {RAW_URL}")
+    for _ in range(WORKERS):
+        spawn("http")
+    wait_until_ready()
+    if run_telegram_bot:
+        print("🤖 Starting Telegram Bot process...")
+        spawn("bot")
+    server_running = True
+    
+    try:
+        while True:
+            pid, status = os.wait()
+            role = children.pop(pid, None)
+            if role is None:
+                continue
+            print(f"⚠️ {role} worker {pid} exited (status {status}), restarting...")
+            time.sleep(1)  # Don't spin if a worker dies on startup
+            spawn(role)
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down...")
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    finally:
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+# ========================
+# TELEGRAM BOT FUNCTIONS
+# ========================
+if TELEGRAM_AVAILABLE:
+    async def session_document(user_id):
+        """Document the user is working on (the default one unless they picked another) and its snapshot"""
+        key = await user_sessions.akey(user_id)
+        return await DATA_SERVICE.aread(key, create=True)
+    
+    async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Start command with inline keyboard"""
+        user_id = update.effective_user.id
+        username = update.effective_user.username or update.effective_user.first_name
+        await user_sessions.aupdate(user_id, waiting_for_data=False, confirm_clear=False, username=username)
+        
+        # Create keyboard dynamically based on whether URL is public
+        keyboard = [
+            [
+                InlineKeyboardButton("📝 Update Data", callback_data="update_data"),
+                InlineKeyboardButton("📊 View Data", callback_data="view_data")
+            ],
+            [
+                InlineKeyboardButton("🔗 Get Raw Link", callback_data="get_link"),
+                InlineKeyboardButton("📈 Statistics", callback_data="stats")
+            ],
+            [
+                InlineKeyboardButton("❓ Help", callback_data="help"),
+                InlineKeyboardButton("🔄 History", callback_data="history")
+            ],
+            [
+                InlineKeyboardButton("📂 Documents", callback_data="documents")
+            ]
+        ]
+        
+        # Only add web interface button if URL is public
+        if is_public_url(PUBLIC_URL):
+            keyboard.append([
+                InlineKeyboardButton("🌐 Web Interface", url=PUBLIC_URL)
+            ])
+        
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        welcome_text = (
+            f"🤖 **Welcome to RAW Data Bot, {username}!**\n\n"
+            "✨ **Features:**\n"
+            "• 📝 Store any text/data permanently\n"
+            "• 🔗 Get a public RAW link\n"
+            "• 📊 View data statistics\n"
+            "• 📜 Data history tracking\n"
+            "• 📂 Multiple named documents\n"
+        )
+        
+        # Add web interface info if available
+        if is_public_url(PUBLIC_URL):
+            welcome_text += "• 🌐 Beautiful web interface\n\n"
+        else:
+            welcome_text += "\n"
+        
+        welcome_text += "💡 *Select an option below:*"
+        
+        await update.message.reply_text(
+            welcome_text,
+            reply_markup=reply_markup,
+            parse_mode="Markdown"
+        )
+    
+    async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle inline keyboard button clicks"""
+        query = update.callback_query
+        if query.data.startswith("doc:") and not is_valid_key(query.data[len("doc:"):]):
+            # Callback data comes from the client; check it like any other key
+            await query.answer("❌ Invalid document name", show_alert=True)
+            return
+        await query.answer()
+        
+        user_id = query.from_user.id
+        doc, snapshot = await session_document(user_id)
+        metadata = await asyncio.to_thread(document_metadata, doc, snapshot)  # First look at a version parses it
+        
+        if query.data == "update_data":
+            await user_sessions.aupdate(user_id, waiting_for_data=True)
+            await query.edit_message_text(
+                f"📝 **Send me the data/text you want to store in `{doc.key}`:**\n\n"
+                "You can send:\n"
+                "• 📄 Plain text\n"
+                "• 📊 JSON data\n"
+                "• ⚙️ Configuration files\n"
+                "• 💻 Code snippets\n"
+                "• 🔗 URLs or lists\n\n"
+                "💡 *Type /cancel to abort.*",
+                parse_mode="Markdown"
+            )
+        
+        elif query.data == "view_data":
+            if snapshot.raw:
+                # Create a more informative preview (Telegram caps messages at 4096 characters)
+                # The first preview of a version builds its line index; keep that off the loop
+                preview, more_lines = await asyncio.to_thread(preview_lines, doc, snapshot, 5, 1024)
+                
+                if more_lines:
+                    preview += f"\n[... and {more_lines:,} more lines]"
+                
+                # Format info
+                format_icon = {
+                    "json": "📊",
+                    "code": "💻",
+                    "xml/html": "🔖",
+                    "yaml": "📋",
+                    "ini/toml": "⚙️",
+                    "csv": "📈",
+                    "text": "📄"
+                }.get(metadata.get("format", "text"), "📄")
+                
+                message_text = (
+                    f"{format_icon} **Stored Data Preview (`{doc.key}`):**\n\n"
+                    f"```\n{preview}\n```\n\n"
+                    f"📏 **Size:** {len(snapshot.raw):,} bytes\n"
+                    f"⏰ **Last Updated:** {metadata.get('last_updated', 'Never')}\n"
+                    f"👤 **Author:** {metadata.get('author', 'Unknown')}\n"
+                    f"👁️ **Views:** {metadata.get('views', 0)}\n\n"
+                    f"🔗 **RAW URL:** `{doc.url}`"
+                )
+                
+                # Add web interface link only if public
+                if is_public_url(PUBLIC_URL):
+                    message_text += f"\n🌐 **Web:** `{PUBLIC_URL}`"
+                
+                await query.edit_message_text(
+                    message_text,
+                    parse_mode="Markdown",
+                    disable_web_page_preview=True
+                )
+            else:
+                await query.edit_message_text(
+                    "📭 **No data stored yet!**\n\n"
+                    "Use the *'Update Data'* button to store your first data.",
+                    parse_mode="Markdown"
+                )
+        
+        elif query.data == "get_link":
+            message_text = f"🔗 **Permanent RAW Links:**\n\n📄 **Text Format:**\n`{doc.url}`\n\n📊 **JSON Format:**\n`{doc.url}?format=json`\n\n"
+            
+            if is_public_url(PUBLIC_URL):
+                message_text += f"🌐 **Web Interface:**\n`{PUBLIC_URL}`\n\n📊 **Statistics:**\n`{PUBLIC_URL}/stats`\n\n"
+            
+            message_text += "💡 *Click or copy the links to access your data!*"
+            
+            await query.edit_message_text(
+                message_text,
+                parse_mode="Markdown"
+            )
+        
+        elif query.data == "stats":
+            stats_text = (
+                f"📊 **Statistics:**\n\n"
+                f"• 📏 **Data Size:** {metadata.get('size', 0):,} bytes\n"
+                f"• 📝 **Format:** {metadata.get('format', 'text')}\n"
+                f"• ⏰ **Last Updated:** {metadata.get('last_updated', 'Never')}\n"
+                f"• 📜 **History Entries:** {len(snapshot.history)}\n"
+                f"• 👤 **Author:** {metadata.get('author', 'Not specified')}\n"
+                f"• 👁️ **Total Views:** {metadata.get('views', 0)}\n\n"
+                f"🔗 **RAW URL:** `{doc.url}`"
+            )
+            
+            await query.edit_message_text(stats_text, parse_mode="Markdown", disable_web_page_preview=True)
+        
+        elif query.data == "history":
+            if snapshot.history:
+                history_text = "📜 **Last 10 Updates:**\n\n"
+                for i, entry in enumerate(reversed(snapshot.history), 1):
+                    history_text += f"**{i}. {entry['timestamp']}**\n"
+                    history_text += f"   📏 Size: {entry['size']:,} bytes\n"
+                    history_text += f"   📄 Preview: {entry['data'][:50]}...\n\n"
+            else:
+                history_text = "📭 No history available yet. Update some data first!"
+            
+            await query.edit_message_text(history_text, parse_mode="Markdown")
+        
+        elif query.data == "help":
+            help_text = (
+                "❓ **Help Guide**\n\n"
+                "**Commands:**\n"
+                "/start - Show main menu\n"
+                "/cancel - Cancel current operation\n"
+                "/link - Get all RAW links\n"
+                "/stats - View statistics\n"
+                "/clear - Clear all data\n"
+                "/use <name> - Switch to another document\n"
+                "/health - Check server status\n\n"
+                "**Features:**\n"
+                "• 📝 Store any text/data permanently\n"
+                "• 🔗 Public RAW URL for sharing\n"
+                "• 📊 Multiple format outputs (JSON, Text, HTML)\n"
+                "• 📜 Data history tracking\n"
+                "• 📈 Real-time statistics\n"
+            )
+            
+            if is_public_url(PUBLIC_URL):
+                help_text += "• 🌐 Beautiful web interface\n\n"
+            else:
+                help_text += "\n"
+            
+            help_text += (
+                "**Tips:**\n"
+                "• Use inline keyboard for easy navigation\n"
+                "• Links work in any browser\n"
+                "• No size limits (within reason)\n"
+                "• Data persists until cleared\n\n"
+                "**Need Help?**\nContact the bot admin"
+            )
+            
+            await query.edit_message_text(help_text, parse_mode="Markdown")
+        
+        elif query.data == "documents":
+            keys = sorted(DOCUMENTS)
+            keyboard = [
+                [InlineKeyboardButton(("✅ " if key == doc.key else "📄 ") + key, callback_data=f"doc:{key}")]
+                for key in keys[:20]
+            ]
+            keyboard.append([InlineKeyboardButton("📋 Main Menu", callback_data="menu")])
+            
+            documents_text = f"📂 **Documents ({len(keys)}):**\n\nCurrent: `{doc.key}`\n\n"
+            if len(keys) > 20:
+                documents_text += f"_Showing the first 20 of {len(keys)}._\n"
+            documents_text += "💡 *Pick one below, or use /use <name> to create a new document.*"
+            
+            await query.edit_message_text(
+                documents_text,
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode="Markdown"
+            )
+        
+        elif query.data.startswith("doc:"):
+            key = query.data[len("doc:"):]
+            await user_sessions.aupdate(user_id, key=key)
+            doc, _ = await DATA_SERVICE.aread(key, create=True)
+            keyboard = [[InlineKeyboardButton("📋 Main Menu", callback_data="menu")]]
+            await query.edit_message_text(
+                f"📂 Now using document `{doc.key}`\n\n🔗 `{doc.url}`",
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode="Markdown"
+            )
+        
+        elif query.data == "menu":
+            # Return to main menu
+            keyboard = [
+                [
+                    InlineKeyboardButton("📝 Update Data", callback_data="update_data"),
+                    InlineKeyboardButton("📊 View Data", callback_data="view_data")
+                ],
+                [
+                    InlineKeyboardButton("🔗 Get Raw Link", callback_data="get_link"),
+                    InlineKeyboardButton("📈 Statistics", callback_data="stats")
+                ],
+                [
+                    InlineKeyboardButton("❓ Help", callback_data="help"),
+                    InlineKeyboardButton("🔄 History", callback_data="history")
+                ],
+                [
+                    InlineKeyboardButton("📂 Documents", callback_data="documents")
+                ]
+            ]
+            
+            # Only add web interface button if URL is public
+            if is_public_url(PUBLIC_URL):
+                keyboard.append([
+                    InlineKeyboardButton("🌐 Web Interface", url=PUBLIC_URL)
+                ])
+            
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            await query.edit_message_text(
+                "📋 **Main Menu**\n\n"
+                f"📂 Document: `{doc.key}`\n"
+                "Select an option:",
+                reply_markup=reply_markup,
+                parse_mode="Markdown"
+            )
+    
+    async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle user messages"""
+        user_id = update.effective_user.id
+        
+        session = await user_sessions.aget(user_id)
+        if session is not None and session.waiting_for_data:
+            # User is sending data to store
+            text = update.message.text
+            
+            if text == "/cancel":
+                await user_sessions.aupdate(user_id, waiting_for_data=False)
+                await update.message.reply_text("❌ Operation cancelled.")
+                return
+            
+            doc, _ = await session_document(user_id)
+            
+            try:
+                # Write through the shared service; no HTTP round trip
+                snapshot = await DATA_SERVICE.awrite(
+                    doc.key, text, author=safe_encode_header(update.effective_user.first_name)
+                )
+            except Exception as e:
+                await update.message.reply_text(
+                    f"❌ **Error storing data!**\n"
+                    f"Error: {str(e)}",
+                    parse_mode="Markdown"
+                )
+                return
+            
+            # Success
+            await user_sessions.aupdate(user_id, waiting_for_data=False)
+            
+            # Create keyboard dynamically
+            keyboard = [
+                [
+                    InlineKeyboardButton("🔗 Get Links", callback_data="get_link"),
+                    InlineKeyboardButton("📊 View Stats", callback_data="stats")
+                ],
+                [
+                    InlineKeyboardButton("📄 View Data", callback_data="view_data"),
+                    InlineKeyboardButton("🔄 Update Again", callback_data="update_data")
+                ]
+            ]
+            
+            # Only add web interface button if URL is public
+            if is_public_url(PUBLIC_URL):
+                keyboard.append([
+                    InlineKeyboardButton("🌐 Web Interface", url=PUBLIC_URL)
+                ])
+            
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            success_message = (
+                "✅ **Data stored successfully!** 🎉\n\n"
+                f"📂 **Document:** `{doc.key}`\n"
+                f"📏 **Size:** {snapshot.metadata['size']:,} bytes\n"
+                f"📝 **Format:** {snapshot.metadata['format']}\n"
+                f"⏰ **Timestamp:** {snapshot.metadata['last_updated']}\n"
+                f"🔗 **URL:** `{doc.url}`\n\n"
+            )
+            
+            if not is_public_url(PUBLIC_URL):
+                success_message += "💡 *Note: Web interface requires public URL (deploy to Render/Heroku)*\n\n"
+            
+            success_message += "💡 *Choose your next action:*"
+            
+            await update.message.reply_text(
+                success_message,
+                reply_markup=reply_markup,
+                parse_mode="Markdown"
+            )
+        else:
+            # Regular message - show main menu
+            keyboard = [[InlineKeyboardButton("📋 Main Menu", callback_data="menu")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            await update.message.reply_text(
+                "🤖 **RAW Data Bot**\n\n"
+                "Type /start to begin or use the button below:",
+                reply_markup=reply_markup,
+                parse_mode="Markdown"
+            )
+    
+    async def link_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Direct link command"""
+        doc, _ = await session_document(update.effective_user.id)
+        message_text = f"🔗 **Available Links:**\n\n📄 **RAW Text:** `{doc.url}`\n📊 **JSON View:** `{doc.url}?format=json`\n"
+        
+        if is_public_url(PUBLIC_URL):
+            message_text += f"🌐 **Web Interface:** `{PUBLIC_URL}`\n📊 **Statistics:** `{PUBLIC_URL}/stats`\n\n"
+        else:
+            message_text += "\n"
+        
+        message_text += "💡 *Click or copy to access your data!*"
+        
+        await update.message.reply_text(
+            message_text,
+            parse_mode="Markdown"
+        )
+    
+    async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Direct stats command"""
+        doc, snapshot = await session_document(update.effective_user.id)
+        metadata = await asyncio.to_thread(document_metadata, doc, snapshot)
+        stats_text = (
+            f"📊 **Current Statistics:**\n\n"
+            f"• 📂 **Document:** `{doc.key}` (of {len(DOCUMENTS)})\n"
+            f"• 📏 **Data Size:** {len(snapshot.raw):,} bytes\n"
+            f"• 📝 **Format:** {metadata.get('format', 'text')}\n"
+            f"• ⏰ **Last Updated:** {metadata.get('last_updated', 'Never')}\n"
+            f"• 📦 **Storage:** {'📭 Empty' if not snapshot.raw else '✅ Contains data'}\n"
+            f"• 📜 **History:** {len(snapshot.history)} past entries\n"
+            f"• 👁️ **Views:** {metadata.get('views', 0)}\n\n"
+            f"🔗 **RAW URL:** `{doc.url}`"
+        )
+        
+        if is_public_url(PUBLIC_URL):
+            stats_text += f"\n🌐 **Web:** `{PUBLIC_URL}`"
+        
+        await update.message.reply_text(stats_text, parse_mode="Markdown", disable_web_page_preview=True)
+    
+    async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Clear all data with confirmation"""
+        user_id = update.effective_user.id
+        doc, snapshot = await session_document(user_id)
+        
+        await user_sessions.aupdate(user_id, confirm_clear=True)
+        
+        keyboard = [
+            [
+                InlineKeyboardButton("✅ Yes, Clear All", callback_data="confirm_clear"),
+                InlineKeyboardButton("❌ No, Cancel", callback_data="cancel_clear")
+            ]
+        ]
+        
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await update.message.reply_text(
+            f"⚠️ **Warning: This will clear ALL data in `{doc.key}`!**\n\n"
+            f"📏 Current size: {len(snapshot.raw):,} bytes\n"
+            f"📜 History entries: {len(snapshot.history)}\n\n"
+            "Are you sure you want to continue?",
+            reply_markup=reply_markup,
+            parse_mode="Markdown"
+        )
+    
+    async def health_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Health check command"""
+        doc, snapshot = await session_document(update.effective_user.id)
+        health_status = {
+            "bot": "✅ Running",
+            "server": "✅ Running" if server_running else "⚠️ Unknown",
+            "data": f"✅ {len(snapshot.raw):,} bytes" if snapshot.raw else "📭 Empty",
+            "history": f"📜 {len(snapshot.history)} entries",
+            "documents": f"📂 {len(DOCUMENTS)} stored",
+            "uptime": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "public_url": "✅ Available" if is_public_url(PUBLIC_URL) else "⚠️ Local only"
+        }
+        
+        health_text = "🏥 **Health Check:**\n\n"
+        for key, value in health_status.items():
+            health_text += f"• **{key.title()}:** {value}\n"
+        
+        health_text += f"\n🔗 **Server:** {PUBLIC_URL}"
+        
+        await update.message.reply_text(health_text, parse_mode="Markdown")
+    
+    async def use_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Switch the document this user is working on"""
+        user_id = update.effective_user.id
+        if not context.args:
+            doc, _ = await session_document(user_id)
+            await update.message.reply_text(
+                f"📂 Current document: `{doc.key}`\n\n"
+                "💡 *Usage: /use <name>*",
+                parse_mode="Markdown"
+            )
+            return
+        
+        key = context.args[0]
+        if not is_valid_key(key):
+            await update.message.reply_text(
+                "❌ Document names may only contain letters, digits, '.', '_' and '-' (max 60), "
+                "and 'watch' is reserved."
+            )
+            return
+        
+        await user_sessions.aupdate(user_id, key=key)
+        doc, _ = await DATA_SERVICE.aread(key, create=True)
+        await update.message.reply_text(
+            f"📂 Now using document `{doc.key}`\n"
+            f"🔗 `{doc.url}`",
+            parse_mode="Markdown"
+        )
+    
+    async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Cancel current operation"""
+        user_id = update.effective_user.id
+        session = await user_sessions.aget(user_id)
+        if session is not None:
+            await user_sessions.aupdate(user_id, waiting_for_data=False, confirm_clear=False)
+        await update.message.reply_text("❌ Current operation cancelled.")
+    
+    async def clear_confirmation_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle clear confirmation"""
+        query = update.callback_query
+        await query.answer()
+        
+        if query.data == "confirm_clear":
+            doc, _ = await session_document(query.from_user.id)
+            old_size = await DATA_SERVICE.aclear(doc.key)
+            
+            await query.edit_message_text(
+                f"🗑️ **All data cleared successfully!**\n\n"
+                f"📏 Cleared: {old_size:,} bytes\n"
+                f"⏰ Time: {time.strftime('%H:%M:%S')}\n\n"
+                f"💡 *Use /start to store new data.*",
+                parse_mode="Markdown"
+            )
+        
+        elif query.data == "cancel_clear":
+            await query.edit_message_text("❌ Clear operation cancelled.")
+
+# Restore the last committed state before serving anything
+STARTUP.phase("app setup")
+recover_state()
+STARTUP.phase("recovery")
+if WORKERS <= 1:
+    # Pre-forked processes start their own metrics folder, checkpointer (and
+    # re-encryptor) after the fork
+    threading.Thread(target=run_metrics_folder, daemon=True).start()
+    threading.Thread(target=run_views_checkpointer, daemon=True).start()
+    if CIPHER is not None:
+        threading.Thread(target=run_reencryptor, daemon=True).start()
+
+# ========================
+# MAIN ENTRY POINT
+# ========================
+def run_bot():
+    """Configure the Telegram bot and poll for (or, in webhook mode, wait for) updates (blocking)"""
+    import_telegram()
+    # Handlers no longer block on HTTP, so let updates run concurrently
+    builder = ApplicationBuilder().token(BOT_TOKEN).concurrent_updates(True)
+    if TELEGRAM_API_URL:
+        builder = builder.base_url(TELEGRAM_API_URL)
+    app_ = builder.build()
+    
+    # Command handlers
+    app_.add_handler(CommandHandler("start", start))
+    app_.add_handler(CommandHandler("link", link_command))
+    app_.add_handler(CommandHandler("stats", stats_command))
+    app_.add_handler(CommandHandler("clear", clear_command))
+    app_.add_handler(CommandHandler("health", health_command))
+    app_.add_handler(CommandHandler("cancel", cancel_command))
+    app_.add_handler(CommandHandler("use", use_command))
+    
+    # Callback query handlers
+    app_.add_handler(CallbackQueryHandler(button_handler, pattern="^(update_data|view_data|get_link|stats|help|history|menu|documents|doc:.+)$"))
+    app_.add_handler(CallbackQueryHandler(clear_confirmation_handler, pattern="^(confirm_clear|cancel_clear)$"))
+    
+    # Message handler
+    app_.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    
+    # Time every handler for /metrics
+    for handlers in app_.handlers.values():
+        for handler in handlers:
+            handler.callback = timed_handler(handler.callback)
+    
+    print("✅ Telegram bot configured successfully!")
+    print("📱 Bot is now running. Send /start to your bot to begin.")
+    if TELEGRAM_RELAY is not None:
+        try:
+            asyncio.run(serve_webhook(app_))
+        except KeyboardInterrupt:
+            print("\n👋 Shutting down...")
+    else:
+        app_.run_polling()
+
+async def serve_webhook(app_):
+    """Register the webhook and process the updates TELEGRAM_RELAY hands over until cancelled"""
+    url = f"{PUBLIC_URL}/telegram/{WEBHOOK_SECRET}"
+    if not is_public_url(PUBLIC_URL):
+        print("⚠️  PUBLIC_URL is not public; Telegram itself cannot reach this webhook")
+    
+    await app_.initialize()
+    await app_.start()
+    try:
+        TELEGRAM_RELAY.attach(app_, asyncio.get_running_loop())
+        await app_.bot.set_webhook(url=url, secret_token=WEBHOOK_SECRET, allowed_updates=Update.ALL_TYPES)
+        print(f"🪝 Webhook registered at {PUBLIC_URL}/telegram/<secret>")
+        await asyncio.Event().wait()
+    finally:
+        await app_.stop()
+        await app_.shutdown()
+
+def main():
+    """Main entry point - runs both server and bot"""
+    print("🚀 Starting RAW Data Service...")
+    print("=" * 50)
+    
+    # Check if we should run Telegram bot
+    run_telegram_bot = TELEGRAM_AVAILABLE and BOT_TOKEN
+    
+    if WORKERS > 1:
+        if STORAGE_BACKEND == "sqlite":
+            run_prefork(run_telegram_bot)
+            return
+        print("⚠️  WORKERS > 1 needs STORAGE_BACKEND=sqlite; serving from a single process")
+    
+    # In webhook mode the HTTP server receives updates for the bot in this process
+    global TELEGRAM_RELAY
+    if run_telegram_bot and BOT_MODE == "webhook":
+        TELEGRAM_RELAY = UpdateRelay()
+    
+    # Start Flask server in background thread, and the bot once it answers
+    run_server()
+    wait_until_ready()
+    
+    if run_telegram_bot:
+        print("🤖 Starting Telegram Bot...")
+        try:
+            # Run bot in main thread (this is blocking)
+            run_bot()
+            
+        except Exception as e:
+            print(f"❌ Failed to start Telegram bot: {e}")
+            print("ℹ️  Web interface and API are still available")
+            # Keep Flask server running
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                print("\n👋 Shutting down...")
+    else:
+        if not TELEGRAM_AVAILABLE:
+            print("ℹ️  Telegram bot not available (python-telegram-bot not installed)")
+        elif not BOT_TOKEN or BOT_TOKEN == "8419010897:AAFBf7NBkWcDk9JYvCCUsjyQpFy6RqW3Ozg":
+            print("⚠️  Telegram bot token not configured. Using web interface only.")
+        print("🌐 Web interface is running at:", PUBLIC_URL)
+        print("📊 Statistics:", f"{PUBLIC_URL}/stats")
+        
+        # Keep Flask server running
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("\n👋 Shutting down...")
+
+if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,385 @@
+"""HTTP load and latency benchmark for the RAW Data Service
+
+Starts app.py in-process on an ephemeral port (or targets --url) and
+drives a weighted mix of requests at each payload size and concurrency
+level, then reports throughput, latency percentiles and how far RSS rose
+during each scenario.
+
+    python benchmark.py --sizes 1KB,1MB --concurrency 1,64 --output base.json
+    python benchmark.py --sizes 1KB,1MB --concurrency 1,64 --compare base.json
+"""
+import argparse, json, os, sys, time, threading, random, platform, resource, logging, tempfile, shutil, atexit
+import http.client, urllib.parse
+from datetime import datetime, timezone
+
+# ========================
+# CONFIGURATION
+# ========================
+# Operation name -> (method, path, sends the payload)
+OPERATIONS = {
+    "get_text": ("GET", "/raw", False),
+    "get_json": ("GET", "/raw?format=json", False),
+    "get_html": ("GET", "/raw?format=html", False),
+    "post_raw": ("POST", "/raw", True),
+    "update": ("POST", "/update", True),
+    "home": ("GET", "/", False),
+    "stats": ("GET", "/stats", False),
+    "health": ("GET", "/health", False),
+}
+
+DEFAULT_MIX = "get_text=60,get_json=10,get_html=5,post_raw=5,update=5,home=5,stats=5,health=5"
+DEFAULT_SIZES = "1KB,64KB,1MB"
+DEFAULT_CONCURRENCY = "1,16,64"
+
+# Responses are read and discarded this many bytes at a time
+READ_CHUNK = 64 * 1024
+
+# Resident set size is sampled this often (seconds) while a scenario runs
+RSS_SAMPLE_INTERVAL = 0.05
+
+UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+# ========================
+# UTILITY FUNCTIONS
+# ========================
+def parse_size(text):
+    """Parse "1KB", "100MB" or a plain byte count"""
+    text = text.strip().upper()
+    for unit in ("GB", "MB", "KB", "B"):
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * UNITS[unit])
+    return int(text)
+
+def format_size(size):
+    """Inverse of parse_size for round sizes"""
+    for unit in ("GB", "MB", "KB"):
+        if size >= UNITS[unit] and size % UNITS[unit] == 0:
+            return f"{size // UNITS[unit]}{unit}"
+    return f"{size}B"
+
+def parse_mix(text):
+    """Parse "op=weight,..." into {op: weight}"""
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r} (choose from {', '.join(OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+def make_payload(size, seed=0):
+    """Config-like text of exactly `size` bytes"""
+    lines = []
+    total = 0
+    number = 0
+    while total < size:
+        line = f"setting_{seed}_{number:07d} = value {number * 7919 % 100003}\n"
+        lines.append(line)
+        total += len(line)
+        number += 1
+    return "".join(lines).encode("utf-8")[:size]
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def latency_summary(latencies):
+    """p50/p95/p99/max in milliseconds"""
+    ordered = sorted(latencies)
+    return {
+        name: round(value * 1000, 3) if value is not None else None
+        for name, value in (
+            ("p50", percentile(ordered, 0.50)),
+            ("p95", percentile(ordered, 0.95)),
+            ("p99", percentile(ordered, 0.99)),
+            ("max", ordered[-1] if ordered else None),
+        )
+    }
+
+def current_rss_kb():
+    """Resident set size of this process (server and load generator) in KB right now"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        # No /proc (e.g. macOS): fall back to the lifetime peak, which only ever grows
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak  # macOS reports bytes
+
+class RssSampler:
+    """Tracks the highest RSS seen between start() and stop()
+    
+    ru_maxrss is a high-water mark for the whole process, so it would
+    charge each scenario with every earlier scenario's peak. Sampling the
+    current RSS instead gives the peak within one scenario and how far it
+    rose above where the scenario started.
+    """
+    
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start_kb = self.peak_kb = 0
+        self._stopped = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        self.start_kb = self.peak_kb = current_rss_kb()
+        self._thread = threading.Thread(target=self._sample, name="benchmark-rss", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.peak_kb = max(self.peak_kb, current_rss_kb())
+    
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            self.peak_kb = max(self.peak_kb, current_rss_kb())
+
+# ========================
+# SERVER
+# ========================
+def start_server(storage, storage_path):
+    """Import app.py with the bot disabled and serve it on an ephemeral port"""
+    os.environ["BOT_TOKEN"] = ""
+    os.environ["STORAGE_BACKEND"] = storage
+    if storage_path:
+        os.environ["STORAGE_PATH"] = storage_path
+    
+    import app as service
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # No per-request log lines
+    
+    server = make_server(
+        "127.0.0.1", 0, service.app, threaded=True, request_handler=service.WatchRequestHandler
+    )
+    threading.Thread(target=server.serve_forever, name="benchmark-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+# ========================
+# LOAD GENERATOR
+# ========================
+class Target:
+    """Where requests go: host, port and a path prefix"""
+    
+    def __init__(self, url):
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.https = parts.scheme == "https"
+        self.prefix = parts.path.rstrip("/")
+    
+    def request(self, method, path, body=None):
+        """Send one request, read and discard the body; returns the status code"""
+        connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        connection = connection_class(self.host, self.port, timeout=300)
+        try:
+            headers = {"Content-Type": "text/plain", "X-Author": "benchmark"} if body is not None else {}
+            connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = connection.getresponse()
+            while response.read(READ_CHUNK):
+                pass
+            return response.status
+        finally:
+            connection.close()
+
+def run_scenario(target, mix, size, concurrency, duration, max_requests, seed):
+    """Drive the mix at one payload size and concurrency level and summarize it"""
+    payloads = [make_payload(size, seed=n) for n in range(2)]  # Alternate so writes change the data
+    status = target.request("POST", "/raw", payloads[0])
+    if status != 200:
+        raise RuntimeError(f"Seeding a {format_size(size)} document failed with HTTP {status}")
+    
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    issued = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        local = {name: [] for name in names}
+        local_errors = {name: 0 for name in names}
+        while time.perf_counter() < deadline:
+            if max_requests:
+                with lock:
+                    if issued[0] >= max_requests:
+                        break
+                    issued[0] += 1
+            name = rng.choices(names, weights)[0]
+            method, path, sends = OPERATIONS[name]
+            body = payloads[rng.randrange(2)] if sends else None
+            started = time.perf_counter()
+            try:
+                ok = target.request(method, path, body) < 400
+            except (OSError, http.client.HTTPException):
+                ok = False
+            elapsed = time.perf_counter() - started
+            if ok:
+                local[name].append(elapsed)
+            else:
+                local_errors[name] += 1
+        with lock:
+            for name in names:
+                latencies[name].extend(local[name])
+                errors[name] += local_errors[name]
+    
+    rss = RssSampler()
+    rss.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    rss.stop()
+    
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        "size": size,
+        "size_label": format_size(size),
+        "concurrency": concurrency,
+        "mix": mix,
+        "requests": len(everything),
+        "errors": sum(errors.values()),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(everything) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": latency_summary(everything),
+        "operations": {
+            name: dict(
+                requests=len(latencies[name]),
+                errors=errors[name],
+                latency_ms=latency_summary(latencies[name])
+            )
+            for name in names
+        },
+        "peak_rss_kb": rss.peak_kb,
+        "rss_growth_kb": rss.peak_kb - rss.start_kb,
+    }
+
+# ========================
+# REPORTING
+# ========================
+def scenario_key(scenario):
+    """Identifies the same scenario across runs"""
+    return (scenario["size"], scenario["concurrency"], json.dumps(scenario["mix"], sort_keys=True))
+
+def print_scenario(scenario):
+    latency = scenario["latency_ms"]
+    print(f"📊 {scenario['size_label']:>6} × {scenario['concurrency']:>3} clients: "
+          f"{scenario['throughput_rps']:>9.1f} req/s  "
+          f"p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms  max {latency['max']} ms  "
+          f"errors {scenario['errors']}  RSS +{scenario['rss_growth_kb'] / 1024:.0f} MB "
+          f"(peak {scenario['peak_rss_kb'] / 1024:.0f} MB)")
+
+def compare(results, baseline, threshold):
+    """Print the change against a baseline run; returns the regressed scenarios"""
+    previous = {scenario_key(scenario): scenario for scenario in baseline["scenarios"]}
+    regressions = []
+    print(f"\n🔍 Comparison with baseline (regression threshold {threshold:g}%)")
+    for scenario in results["scenarios"]:
+        before = previous.get(scenario_key(scenario))
+        label = f"{scenario['size_label']} × {scenario['concurrency']}"
+        if before is None:
+            print(f"   {label}: not in baseline")
+            continue
+        
+        changes = {"throughput": change(before["throughput_rps"], scenario["throughput_rps"])}
+        for name in ("p95", "p99"):
+            changes[name] = change(before["latency_ms"][name], scenario["latency_ms"][name])
+        regressed = (
+            changes["throughput"] is not None and changes["throughput"] < -threshold
+            or any(changes[name] is not None and changes[name] > threshold for name in ("p95", "p99"))
+        )
+        if regressed:
+            regressions.append(label)
+        print(f"   {'❌' if regressed else '✅'} {label}: " + "  ".join(
+            f"{name} {value:+.1f}%" if value is not None else f"{name} n/a"
+            for name, value in changes.items()
+        ))
+    return regressions
+
+def change(before, after):
+    """Relative change in percent, or None when either side is missing"""
+    if not before or after is None:
+        return None
+    return (after - before) / before * 100
+
+# ========================
+# MAIN ENTRY POINT
+# ========================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one in-process")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted operations (default: {DEFAULT_MIX})")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Payload sizes, 1KB to 100MB (default: %(default)s)")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY,
+                        help="Concurrent clients, 1 to 512 (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario (default: %(default)s)")
+    parser.add_argument("--requests", type=int, default=0, help="Stop a scenario after this many requests")
+    parser.add_argument("--storage", default="memory", choices=("memory", "sqlite"),
+                        help="Storage backend of the in-process server (default: %(default)s)")
+    parser.add_argument("--storage-path",
+                        help="SQLite file for --storage sqlite (default: a temporary file, removed on exit)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the request mix (default: %(default)s)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON to compare against; exits 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=10,
+                        help="Percent change that counts as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+    
+    mix = parse_mix(args.mix)
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    levels = [int(level) for level in args.concurrency.split(",")]
+    
+    if args.url:
+        url = args.url
+    else:
+        storage_path = args.storage_path
+        if args.storage == "sqlite" and not storage_path:
+            # Never benchmark against the app's default raw_data.db
+            scratch = tempfile.mkdtemp(prefix="rawdata-benchmark-")
+            atexit.register(shutil.rmtree, scratch, ignore_errors=True)
+            storage_path = os.path.join(scratch, "benchmark.db")
+        url, _server = start_server(args.storage, storage_path)
+    target = Target(url)
+    print(f"🚀 Benchmarking {url} ({'external' if args.url else 'in-process, ' + args.storage + ' storage'})")
+    
+    results = {
+        "started": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "target": "external" if args.url else "in-process",
+        "storage": None if args.url else args.storage,
+        "scenarios": [],
+    }
+    for size in sizes:
+        for concurrency in levels:
+            scenario = run_scenario(target, mix, size, concurrency, args.duration, args.requests, args.seed)
+            print_scenario(scenario)
+            results["scenarios"].append(scenario)
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved to {args.output}")
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} scenario(s) regressed: {', '.join(regressions)}")
+            return 1
+        print("✅ No regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
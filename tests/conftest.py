@@ -0,0 +1,27 @@
+import base64
+import os
+
+# app reads its configuration at import: serve from memory with the bot off
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("BOT_TOKEN", "")
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+@pytest.fixture
+def make_cipher(monkeypatch):
+    """Build the EnvelopeCipher that ENCRYPTION_KEYS would give for these key ids (the first one seals)"""
+    def build(*key_ids):
+        monkeypatch.setattr(app, "ENCRYPTION_KEYS", ",".join(
+            f"{key_id}:{base64.b64encode(key_id.encode('utf-8').ljust(32, b'-')).decode('ascii')}"
+            for key_id in key_ids
+        ))
+        return app.make_cipher()
+    return build
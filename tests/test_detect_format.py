@@ -0,0 +1,23 @@
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("padding", [0, 10, app.SNIFF_CHARS - 1, app.SNIFF_CHARS, app.SNIFF_CHARS * 2])
+def test_json_with_trailing_whitespace(padding):
+    assert app.detect_format('{"a": 1}' + " " * padding) == "json"
+
+
+def test_json_with_leading_whitespace():
+    assert app.detect_format("\n" * (app.SNIFF_CHARS + 1) + '[1, 2]') == "json"
+
+
+def test_whitespace_only():
+    assert app.detect_format(" " * (app.SNIFF_CHARS * 2)) == "text"
+
+
+def test_write_with_trailing_whitespace(client):
+    body = b'{"a": 1}' + b" " * 5000
+    assert client.post("/raw/padded", data=body).status_code == 200
+    assert client.post("/update/padded", data=body).status_code == 200
+    assert client.get("/raw/padded").data == body
@@ -0,0 +1,81 @@
+import io
+
+import pytest
+
+import app
+
+SEGMENT = app.EnvelopeCipher.SEGMENT_SIZE
+
+
+@pytest.fixture
+def cipher(make_cipher):
+    return make_cipher("k1")
+
+
+def open_envelope(cipher, envelope, context=b"doc"):
+    return cipher.open(bytes(envelope), context)
+
+
+@pytest.mark.parametrize("size", [0, 1, SEGMENT - 1, SEGMENT, SEGMENT + 1, 3 * SEGMENT])
+def test_round_trip(cipher, size):
+    raw = bytes(range(256)) * (size // 256) + b"x" * (size % 256)
+    envelope = cipher.seal(raw, b"doc")
+    assert len(envelope) == cipher.sealed_size(size)
+    assert cipher.plaintext_size(envelope) == size
+    assert open_envelope(cipher, envelope) == raw
+    
+    buffer = bytearray(size)
+    assert cipher.open_into(io.BytesIO(envelope).read, buffer, b"doc") == raw
+
+
+def test_flipped_byte_is_rejected(cipher):
+    envelope = bytearray(cipher.seal(b"secret" * 30000, b"doc"))
+    for offset in (3, len(envelope) // 2, len(envelope) - 1):  # Header, a segment, the last tag
+        tampered = bytearray(envelope)
+        tampered[offset] ^= 1
+        with pytest.raises(ValueError):
+            open_envelope(cipher, tampered)
+
+
+def test_truncated_envelope_is_rejected(cipher):
+    envelope = cipher.seal(b"a" * (2 * SEGMENT + 10), b"doc")
+    with pytest.raises(ValueError, match="authentication"):
+        open_envelope(cipher, envelope[:-(10 + cipher.TAG_SIZE)])
+
+
+def test_reordered_segments_are_rejected(cipher):
+    envelope = cipher.seal(b"a" * SEGMENT + b"b" * SEGMENT + b"c", b"doc")
+    header = cipher.sealed_size(0) - cipher.TAG_SIZE
+    size = SEGMENT + cipher.TAG_SIZE
+    first, second = envelope[header:header + size], envelope[header + size:header + 2 * size]
+    swapped = envelope[:header] + second + first + envelope[header + 2 * size:]
+    with pytest.raises(ValueError, match="authentication"):
+        open_envelope(cipher, swapped)
+
+
+def test_envelope_is_bound_to_its_context(cipher):
+    envelope = cipher.seal(b"for one document", b"doc")
+    with pytest.raises(ValueError, match="authentication"):
+        cipher.open(envelope, b"another")
+
+
+def test_unknown_key_is_named(cipher, make_cipher):
+    envelope = make_cipher("retired").seal(b"data", b"doc")
+    with pytest.raises(ValueError, match="'retired'"):
+        open_envelope(cipher, envelope)
+
+
+def test_rotated_cipher_opens_older_envelopes(make_cipher):
+    old = make_cipher("k1").seal(b"sealed before rotation", b"doc")
+    rotated = make_cipher("k2", "k1")
+    assert rotated.key_id == "k2"
+    assert rotated.blob_key_id(old) == "k1"
+    assert open_envelope(rotated, old) == b"sealed before rotation"
+
+
+@pytest.mark.parametrize("keys", ["k1:not-base64!", "k1:" + "QUFBQQ==", ":" + "A" * 44, "k1"])
+def test_bad_key_entries_are_rejected_without_echoing_them(monkeypatch, keys):
+    monkeypatch.setattr(app, "ENCRYPTION_KEYS", keys)
+    with pytest.raises(ValueError) as error:
+        app.make_cipher()
+    assert keys not in str(error.value)
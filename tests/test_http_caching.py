@@ -0,0 +1,61 @@
+import gzip
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("query", ["", "?format=json", "?format=html"])
+def test_if_none_match_answers_304(client, query):
+    client.post("/raw/cached", data="payload")
+    first = client.get(f"/raw/cached{query}")
+    assert first.status_code == 200
+    
+    response = client.get(f"/raw/cached{query}", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 304
+    assert response.data == b""
+
+
+def test_if_modified_since_answers_304(client):
+    client.post("/raw/dated", data="payload")
+    modified = client.get("/raw/dated").headers["Last-Modified"]
+    assert client.get("/raw/dated", headers={"If-Modified-Since": modified}).status_code == 304
+
+
+def test_write_changes_the_etag(client):
+    client.post("/raw/changing", data="one")
+    etag = client.get("/raw/changing").headers["ETag"]
+    client.post("/raw/changing", data="two")
+    response = client.get("/raw/changing", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.data == b"two"
+
+
+def test_byte_ranges(client):
+    client.post("/raw/ranged", data="0123456789")
+    response = client.get("/raw/ranged", headers={"Range": "bytes=2-4"})
+    assert response.status_code == 206
+    assert response.data == b"234"
+    assert response.headers["Content-Range"] == "bytes 2-4/10"
+    
+    assert client.get("/raw/ranged", headers={"Range": "bytes=-3"}).data == b"789"
+    assert client.get("/raw/ranged", headers={"Range": "bytes=20-"}).status_code == 416
+
+
+def test_stale_if_range_serves_the_whole_body(client):
+    client.post("/raw/ranged-stale", data="0123456789")
+    response = client.get("/raw/ranged-stale", headers={"Range": "bytes=0-1", "If-Range": '"old"'})
+    assert response.status_code == 200
+    assert response.data == b"0123456789"
+
+
+def test_gzip_variant(client):
+    body = b"line of text\n" * (app.COMPRESS_MIN_SIZE // 4)
+    client.post("/raw/squeezed", data=body)
+    app._COMPRESSOR.submit(lambda: None).result()  # Single worker: the variants are built
+    
+    response = client.get("/raw/squeezed", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(response.data) == body
+    assert response.headers["ETag"] != client.get("/raw/squeezed").headers["ETag"]
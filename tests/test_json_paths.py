@@ -0,0 +1,21 @@
+import json
+
+import app
+
+
+def test_validation_does_not_keep_a_tree(client):
+    client.post("/raw/tree-config", data=json.dumps({"db": {"port": 5432}}))
+    doc = app.DOCUMENTS["tree-config"]
+    client.get("/documents")
+    client.get("/stats?key=tree-config")
+    assert doc.format_check == (doc.snapshot.version, "json")
+    assert doc.json_tree[1] is None
+    
+    assert client.get("/raw/tree-config?path=db.port").data == b"5432"
+    assert doc.json_tree[1] is not None
+
+
+def test_invalid_json_path_query(client):
+    client.post("/raw/tree-broken", data='{"a": 1,}')
+    assert client.get("/raw/tree-broken?path=a").status_code == 422
+    assert json.loads(client.get("/documents").data)["documents"]["tree-broken"]["format"] == "text"
@@ -0,0 +1,26 @@
+import json
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("path", ["/stats", "/health?compact=0", "/raw?format=json"])
+def test_volatile_fields_match_indented_layout(client, path):
+    client.post("/raw", data="hello")
+    body = client.get(path).data.decode()
+    assert body == json.dumps(json.loads(body), indent=2, ensure_ascii=False)
+
+
+@pytest.mark.parametrize("path", ["/stats?compact=1", "/health", "/raw?format=json&compact=1"])
+def test_volatile_fields_match_compact_layout(client, path):
+    body = client.get(path).data.decode()
+    assert body == json.dumps(json.loads(body), separators=(",", ":"), ensure_ascii=False)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_stdlib_fallback_matches_orjson(monkeypatch, compact):
+    value = {"name": "naïve ☃", "list": [1, "日本"]}
+    with_orjson = app.encode_json(value, compact)
+    monkeypatch.setattr(app, "orjson", None)
+    assert app.encode_json(value, compact) == with_orjson
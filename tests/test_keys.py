@@ -0,0 +1,8 @@
+import app
+
+
+def test_watch_is_reserved(client):
+    assert client.post("/raw/watch", data="shadowed").status_code == 400
+    assert client.post("/update/watch", data="shadowed").status_code == 400
+    assert "watch" not in app.DOCUMENTS
+    assert app.is_valid_key("watcher")
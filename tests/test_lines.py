@@ -0,0 +1,15 @@
+import app
+
+
+def test_line_index_is_built_on_first_use(client):
+    client.post("/raw/lazy-lines", data="a\nb\nc\n")
+    doc = app.DOCUMENTS["lazy-lines"]
+    assert doc.line_index[0] != doc.snapshot.version
+
+    response = client.get("/raw/lazy-lines?lines=2-3")
+    assert response.data == b"b\nc\n"
+    assert response.headers["X-Total-Lines"] == "3"
+    assert doc.line_index[0] == doc.snapshot.version
+
+    client.post("/raw/lazy-lines", data="x\ny")
+    assert client.get("/raw/lazy-lines?tail=1").data == b"y"
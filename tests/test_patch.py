@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+
+def patch_lines(client, key, lines, text):
+    return client.patch(f"/raw/{key}?lines={lines}", data=text, content_type="text/plain")
+
+
+def test_delete_last_lines_keeps_trailing_newline(client):
+    client.post("/raw/lines-nl", data="l1\nl2\nl3\n")
+    patch_lines(client, "lines-nl", "1-1", "X")
+    assert patch_lines(client, "lines-nl", "3-3", "").status_code == 200
+    assert client.get("/raw/lines-nl").data == b"X\nl2\n"
+
+
+def test_delete_unterminated_last_line(client):
+    client.post("/raw/lines-bare", data="l1\nl2\nl3")
+    patch_lines(client, "lines-bare", "3-3", "")
+    assert client.get("/raw/lines-bare").data == b"l1\nl2"
+
+
+def json_patch(client, key, operations):
+    return client.patch(f"/raw/{key}", data=json.dumps(operations), content_type="application/json-patch+json")
+
+
+@pytest.mark.parametrize("stored, expected, passes", [
+    (1, True, False),
+    (0, False, False),
+    (True, True, True),
+    (1, 1.0, True),
+    ({"a": [1, True]}, {"a": [1, 1]}, False),
+    ({"a": [1, True]}, {"a": [1.0, True]}, True),
+])
+def test_json_patch_test_is_type_strict(client, stored, expected, passes):
+    client.post("/raw/json-test", data=json.dumps({"v": stored}))
+    response = json_patch(client, "json-test", [{"op": "test", "path": "/v", "value": expected}])
+    assert response.status_code == (200 if passes else 409)
+
+
+@pytest.mark.parametrize("original", [
+    '{\n    "a": 1,\n    "b": [\n        2\n    ]\n}\n',
+    '{\n\t"a": 1\n}',
+    '{"a":1,"b":2}\n',
+    '{"a": 1, "b": 2}',
+    '  {"a": 1}\n\n',
+])
+def test_json_patch_keeps_layout(client, original):
+    client.post("/raw/json-layout", data=original)
+    json_patch(client, "json-layout", [{"op": "replace", "path": "/a", "value": 1}])
+    assert client.get("/raw/json-layout").data.decode() == original
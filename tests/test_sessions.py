@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+import app
+
+
+class ForbiddenBacking:
+    def load_session(self, user_id, cutoff):
+        raise AssertionError("the backing store was read")
+
+
+def test_lru_cap():
+    sessions = app.SessionStore(ttl=60, max_size=2)
+    for user_id in (1, 2, 3):
+        sessions.update(user_id, key=f"doc{user_id}")
+    assert len(sessions) == 2
+    assert sessions.get(1) is None
+    assert sessions.key(3) == "doc3"
+
+
+def test_idle_sessions_expire():
+    sessions = app.SessionStore(ttl=0.05, max_size=10)
+    sessions.update(1, waiting_for_data=True)
+    time.sleep(0.1)
+    assert sessions.get(1) is None
+    assert sessions.key(1) == app.DEFAULT_KEY
+
+
+def test_evicted_session_is_reloaded(tmp_path):
+    backing = app.SQLiteStore(str(tmp_path / "sessions.db"))
+    app.SessionStore(ttl=60, max_size=10, backing=backing).update(1, key="notes", username="ann")
+    
+    restarted = app.SessionStore(ttl=60, max_size=10, backing=backing)
+    assert restarted.key(1) == "notes"
+    assert restarted.get(1).username == "ann"
+
+
+def test_membership_stays_in_memory():
+    sessions = app.SessionStore(ttl=60, max_size=10, backing=ForbiddenBacking())
+    assert 1 not in sessions
+
+
+def test_async_variants(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "asyncio", asyncio, raising=False)  # Loaded with the bot otherwise
+    backing = app.SQLiteStore(str(tmp_path / "sessions.db"))
+    
+    async def flow():
+        sessions = app.SessionStore(ttl=60, max_size=10, backing=backing)
+        assert await sessions.aget(1) is None
+        await sessions.aupdate(1, key="notes")
+        return await app.SessionStore(ttl=60, max_size=10, backing=backing).akey(1)
+    
+    assert asyncio.run(flow()) == "notes"
@@ -0,0 +1,119 @@
+import sqlite3
+
+import pytest
+
+import app
+
+SECRET = b"password=hunter2\n" * 10000  # Several cipher segments
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "raw_data.db")
+
+
+def stored(path, sql, *params):
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def on_disk(path):
+    """Database and WAL bytes as they sit in the files"""
+    stored(path, "PRAGMA wal_checkpoint(TRUNCATE)")
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_commit_and_reload(path):
+    store = app.SQLiteStore(path)
+    first, number = store.commit("notes", b"v1", {"size": 2})
+    assert number == 1
+    second, number = store.commit("notes", b"v2", {"size": 2}, {"data": "v1"})
+    assert (second, number) == (first + 1, 2)
+    
+    [(key, raw, metadata, history, seq, version)] = app.SQLiteStore(path).load()
+    assert (key, raw, seq, version) == ("notes", b"v2", second, 2)
+    assert metadata["size"] == 2
+    assert history == [{"data": "v1"}]
+    assert store.changed_since(first) == [("notes", second)]
+
+
+def test_history_keeps_last_ten(path):
+    store = app.SQLiteStore(path)
+    for n in range(15):
+        store.commit("notes", b"x", {}, {"n": n})
+    [row] = store.load()
+    assert [entry["n"] for entry in row[3]] == list(range(5, 15))
+
+
+def test_views_survive_commits_until_reset(path):
+    store = app.SQLiteStore(path)
+    store.commit("notes", b"x", {})
+    assert store.add_views("notes", 5) == 5
+    store.commit("notes", b"y", {})
+    assert store.load()[0][2]["views"] == 5
+    store.commit("notes", b"", {}, reset_views=True)
+    assert store.load()[0][2]["views"] == 0
+
+
+def test_sessions(path):
+    store = app.SQLiteStore(path)
+    store.save_session(7, {"key": "notes"}, touched=100)
+    assert store.load_session(7, cutoff=50) == {"key": "notes"}
+    assert store.load_session(7, cutoff=100) is None
+    store.expire_sessions(cutoff=100)
+    assert store.load_session(7, cutoff=0) is None
+
+
+def test_sealed_rows_hold_no_plaintext(path, make_cipher):
+    store = app.SQLiteStore(path, make_cipher("k1"))
+    store.commit("notes", SECRET, {}, {"data": "password=hunter2"})
+    assert b"hunter2" not in on_disk(path)
+    
+    [(key, raw, metadata, history, seq, version)] = app.SQLiteStore(path, make_cipher("k1")).load()
+    assert type(raw) is bytes and raw == SECRET
+    assert history == [{"data": "password=hunter2"}]
+
+
+def test_tampered_payload_is_rejected(path, make_cipher):
+    app.SQLiteStore(path, make_cipher("k1")).commit("notes", SECRET, {})
+    [(blob,)] = stored(path, "SELECT data FROM documents")
+    tampered = bytearray(blob)
+    tampered[len(tampered) // 2] ^= 1
+    stored(path, "UPDATE documents SET data = ?", bytes(tampered))
+    
+    with pytest.raises(ValueError, match="authentication"):
+        app.SQLiteStore(path, make_cipher("k1")).load()
+
+
+def test_payload_moved_to_another_document_is_rejected(path, make_cipher):
+    store = app.SQLiteStore(path, make_cipher("k1"))
+    store.commit("a", b"meant for a", {})
+    store.commit("b", b"meant for b", {})
+    stored(path, "UPDATE documents SET data = (SELECT data FROM documents WHERE key = 'a') WHERE key = 'b'")
+    with pytest.raises(ValueError, match="authentication"):
+        store.load(["b"])
+
+
+def test_key_rotation(path, make_cipher):
+    app.SQLiteStore(path).commit("notes", SECRET, {}, {"data": "plaintext era"})
+    app.SQLiteStore(path, make_cipher("k1")).commit("notes", SECRET + b"v2", {}, {"data": "k1 era"})
+    
+    rotated = app.SQLiteStore(path, make_cipher("k2", "k1"))
+    assert rotated.load()[0][1] == SECRET + b"v2"
+    assert rotated.reencrypt() > 0
+    for table in ("documents", "document_history"):
+        assert stored(path, f"SELECT DISTINCT key_id FROM {table}") == [("k2",)]
+    assert b"hunter2" not in on_disk(path)
+    
+    [row] = app.SQLiteStore(path, make_cipher("k2")).load()
+    assert row[1] == SECRET + b"v2"
+    assert row[3] == [{"data": "plaintext era"}, {"data": "k1 era"}]
+    with pytest.raises(ValueError, match="'k2'"):
+        app.SQLiteStore(path, make_cipher("k1")).load()
+    with pytest.raises(RuntimeError, match="ENCRYPTION_KEYS"):
+        app.SQLiteStore(path).load()
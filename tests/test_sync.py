@@ -0,0 +1,44 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def shared(tmp_path, monkeypatch):
+    """Pretend to be one of several pre-forked workers sharing a database"""
+    monkeypatch.setattr(app, "SHARED_VERSION", app.SharedVersion())
+    monkeypatch.setattr(app, "_synced_seq", 0)
+    path = str(tmp_path / "shared.db")
+    
+    def become_worker():
+        monkeypatch.setattr(app, "STORE", app.SQLiteStore(path))
+        monkeypatch.setattr(app, "DOCUMENTS", {app.DEFAULT_KEY: app.Document(app.DEFAULT_KEY)})
+    return become_worker
+
+
+def test_worker_picks_up_another_workers_write(shared, client):
+    shared()
+    written = app.DATA_SERVICE.write("synced", "from the other worker\n", "b")
+    
+    shared()  # This worker has not seen the write yet
+    response = client.get("/raw/synced")
+    assert response.data == b"from the other worker\n"
+    # Validators are the ones recorded at write time, not recomputed
+    assert response.headers["ETag"] == app.quote_etag(written.etag)
+    assert response.headers["Last-Modified"] == app.http_date(written.modified)
+
+
+def test_newer_write_replaces_a_synced_document(shared, client, monkeypatch):
+    shared()
+    app.DATA_SERVICE.write("synced", "one", "b")
+    other_documents = app.DOCUMENTS
+    
+    shared()
+    assert client.get("/raw/synced").data == b"one"
+    reader = app.DOCUMENTS
+    
+    monkeypatch.setattr(app, "DOCUMENTS", other_documents)  # Back on the writer, which has "one"
+    app.DATA_SERVICE.write("synced", "two", "b")
+    monkeypatch.setattr(app, "DOCUMENTS", reader)
+    assert client.get("/raw/synced").data == b"two"
+    assert app.DOCUMENTS["synced"].snapshot.version == 2
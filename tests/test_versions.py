@@ -0,0 +1,6 @@
+def test_memory_versions_are_revalidated(client):
+    client.post("/raw/numbered", data="first")
+    response = client.get("/raw/numbered?version=1")
+    assert response.data == b"first"
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert response.headers["ETag"]
@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("timeout", ["nan", "inf", "-inf", "soon"])
+def test_long_poll_rejects_bad_timeouts(client, timeout):
+    client.post("/raw/watched", data="v1")
+    assert client.get(f"/raw/watch/watched?wait=1&timeout={timeout}").status_code == 400
+
+
+def test_long_poll_clamps_negative_timeout(client):
+    client.post("/raw/watched", data="v1")
+    version = client.get("/raw/watch/watched?wait=0").headers["X-Version"]
+    response = client.get(f"/raw/watch/watched?wait={version}&timeout=-5")
+    assert response.status_code == 304
+
+
+def test_long_poll_answers_at_once_for_an_old_version(client):
+    client.post("/raw/watched", data="v1")
+    response = client.get("/raw/watch/watched?wait=0")
+    assert response.status_code == 200
+    assert response.json["version"] == int(response.headers["X-Version"]) > 0
+    assert response.json["etag"] == app.DOCUMENTS["watched"].snapshot.etag
+
+
+def test_long_poll_wakes_on_write(client):
+    client.post("/raw/watched", data="v1")
+    version = int(client.get("/raw/watch/watched?wait=0").headers["X-Version"])
+    writer = threading.Timer(0.2, lambda: app.app.test_client().post("/raw/watched", data="v2"))
+    writer.start()
+    started = time.monotonic()
+    response = client.get(f"/raw/watch/watched?wait={version}&timeout=10")
+    writer.join()
+    assert response.status_code == 200
+    assert response.json["version"] == version + 1
+    assert time.monotonic() - started < 5
+
+
+def test_event_stream(client):
+    client.post("/raw/streamed", data="v1")
+    version = app.DOCUMENTS["streamed"].snapshot.version
+    response = client.get("/raw/watch/streamed", buffered=False)
+    assert response.mimetype == "text/event-stream"
+    events = iter(response.response)
+    try:
+        assert next(events).startswith(b"retry:")
+        assert next(events).startswith(b"id: %d\nevent: change\n" % version)
+        client.post("/raw/streamed", data="v2")
+        assert next(events).startswith(b"id: %d\n" % (version + 1))
+    finally:
+        response.close()